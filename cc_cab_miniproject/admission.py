@@ -0,0 +1,289 @@
+"""
+Rate limiting and admission control, so a burst sheds load instead of
+queueing every request behind SQLite's single writer.
+
+Two checks run before a request reaches its handler:
+
+- A token bucket per client (the X-API-Key header, else the client address)
+  allows RATE_LIMIT_RPS requests per second with bursts up to
+  RATE_LIMIT_BURST; over the limit the answer is 429. Off unless
+  RATE_LIMIT_RPS is set. A batch POST takes one token; its sub-requests,
+  dispatched in-process (see batch.py), are not limited again.
+- Writes (POST, PUT, PATCH, DELETE, except the read-only fare and batch
+  POSTs) are admitted at most ADMISSION_MAX_WRITES at a time per worker.
+  Up to ADMISSION_MAX_QUEUE more wait, each for at most
+  ADMISSION_QUEUE_TIMEOUT seconds. A write that finds the queue full or
+  times out gets 503, and so does one that would have to queue while the
+  p99 of recent writes is over ADMISSION_SHED_P99_MS: with latency already
+  that high, waiting would only make it worse.
+
+Both answers carry Retry-After. Rejections are counted in
+http_requests_shed_total on /metrics.
+
+Buckets live in this process by default, and each of WEB_CONCURRENCY
+workers then allows its share of the rate. With RATE_LIMIT_SHARED_FILE set,
+workers on the same host keep their buckets in that memory-mapped file
+instead and share one limit; two clients whose keys hash to the same slot
+reset each other's bucket, which can only let a request through, never
+wrongly reject one.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+import metrics
+from batch import BATCH_EXTENSION
+
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "0"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", str(2 * RATE_LIMIT_RPS)))
+RATE_LIMIT_SHARED_FILE = os.getenv("RATE_LIMIT_SHARED_FILE")
+
+ADMISSION_MAX_WRITES = int(os.getenv("ADMISSION_MAX_WRITES", "8"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2.0"))
+ADMISSION_SHED_P99_MS = float(os.getenv("ADMISSION_SHED_P99_MS", "2000"))
+
+WRITE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+# POSTs that only read: fare quotes and batched GETs
+READ_ONLY_POSTS = ("/api/fares", "/api/batch")
+# Never limited: scrapes and the operator's own tools
+EXEMPT_PREFIXES = ("/metrics", "/api/admin/")
+
+API_KEY_HEADER = b"x-api-key"
+# In-process buckets kept; the least recently seen are evicted past this
+MAX_BUCKETS = 100_000
+# Recent write latencies the p99 is taken over
+LATENCY_WINDOW = 256
+
+
+class TokenBuckets:
+    """
+    In-process token buckets keyed by client.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self._lock = threading.Lock()
+        # key -> (tokens, updated at); insertion order doubles as LRU order
+        self._buckets = {}
+
+    def take(self, key: str) -> float:
+        """
+        Takes one token; returns 0 if granted, else seconds until one is.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if len(self._buckets) >= MAX_BUCKETS:
+                del self._buckets[next(iter(self._buckets))]
+            if tokens >= 1.0:
+                self._buckets[key] = (tokens - 1.0, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+        return (1.0 - tokens) / self.rate
+
+
+class SharedTokenBuckets(TokenBuckets):
+    """
+    Token buckets in a memory-mapped file shared by the workers on one host.
+    Each slot is (key hash, tokens, updated at), locked with a byte-range
+    lock for the read-modify-write.
+    """
+
+    SLOT = struct.Struct("<Qdd")
+    SLOTS = 8192
+
+    def __init__(self, rate: float, burst: float, path: str):
+        super().__init__(rate, burst)
+        size = self.SLOT.size * self.SLOTS
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+    def take(self, key: str) -> float:
+        digest = int.from_bytes(
+            hashlib.blake2b(key.encode(), digest_size=8).digest(), "little"
+        )
+        offset = (digest % self.SLOTS) * self.SLOT.size
+        # Wall clock: the monotonic clock is not comparable across processes
+        now = time.time()
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, self.SLOT.size, offset)
+        try:
+            owner, tokens, updated = self.SLOT.unpack_from(self._map, offset)
+            if owner != digest:
+                tokens, updated = self.burst, now
+            tokens = min(self.burst, tokens + max(now - updated, 0.0) * self.rate)
+            granted = tokens >= 1.0
+            if granted:
+                tokens -= 1.0
+            self.SLOT.pack_into(self._map, offset, digest, tokens, now)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self.SLOT.size, offset)
+        return 0.0 if granted else (1.0 - tokens) / self.rate
+
+
+class Rejected(Exception):
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class WriteAdmission:
+    """
+    Bounds the writes running at once, with a bounded, time-limited queue.
+    """
+
+    def __init__(
+        self,
+        max_running: int = ADMISSION_MAX_WRITES,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+        shed_p99_ms: float = ADMISSION_SHED_P99_MS,
+    ):
+        self.max_running = max_running
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.shed_p99 = shed_p99_ms / 1000
+        self.running = 0
+        self.waiting = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._completed = 0
+        self._p99 = 0.0
+
+    def _retry_after(self) -> float:
+        # Time for the queue ahead to drain at the recent pace
+        per_write = self._p99 or 0.1
+        return per_write * (self.waiting + 1) / max(self.max_running, 1)
+
+    async def acquire(self):
+        if self._semaphore is None:
+            # Created lazily so it binds to the serving event loop
+            self._semaphore = asyncio.Semaphore(self.max_running)
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                raise Rejected(503, "queue_full", self._retry_after())
+            if self.shed_p99 and self._p99 > self.shed_p99:
+                raise Rejected(503, "latency", self._retry_after())
+        self.waiting += 1
+        # Not wait_for: before 3.12 it can time out just as the acquire
+        # succeeds and leak the permit
+        acquiring = asyncio.create_task(self._semaphore.acquire())
+        try:
+            await asyncio.wait((acquiring,), timeout=self.queue_timeout)
+        except BaseException:
+            self._abandon(acquiring)
+            raise
+        finally:
+            self.waiting -= 1
+        if not acquiring.done():
+            self._abandon(acquiring)
+            raise Rejected(503, "queue_timeout", self._retry_after())
+        self.running += 1
+
+    def _abandon(self, acquiring: asyncio.Task):
+        # A cancelled acquire hands a permit granted meanwhile back itself;
+        # one that already completed holds it
+        if not acquiring.cancel() and not acquiring.cancelled():
+            self._semaphore.release()
+
+    def release(self, elapsed: float):
+        self.running -= 1
+        self._semaphore.release()
+        self._latencies.append(elapsed)
+        self._completed += 1
+        # Re-sorting on every write would cost more than the check saves
+        if self._completed % 16 == 0 or self._completed < 16:
+            ordered = sorted(self._latencies)
+            self._p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+
+def _rate_limiter() -> Optional[TokenBuckets]:
+    if RATE_LIMIT_RPS <= 0:
+        return None
+    if RATE_LIMIT_SHARED_FILE:
+        return SharedTokenBuckets(
+            RATE_LIMIT_RPS, RATE_LIMIT_BURST, RATE_LIMIT_SHARED_FILE
+        )
+    workers = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+    return TokenBuckets(RATE_LIMIT_RPS / workers, RATE_LIMIT_BURST / workers)
+
+
+def _client_key(scope) -> str:
+    for name, value in scope["headers"]:
+        if name == API_KEY_HEADER:
+            return "key:" + value.decode("latin-1")[:128]
+    client = scope.get("client")
+    return "addr:" + (client[0] if client else "unknown")
+
+
+async def _reject(send, rejected: Rejected):
+    messages = {
+        429: "Rate limit exceeded",
+        503: "Service is overloaded; retry later",
+    }
+    body = json.dumps({"detail": messages[rejected.status_code]}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": rejected.status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(rejected.retry_after))).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying the rate limit, then write admission.
+    """
+
+    def __init__(self, app, limiter=None, admission=None):
+        self.app = app
+        self.limiter = limiter if limiter is not None else _rate_limiter()
+        self.admission = admission if admission is not None else WriteAdmission()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PREFIXES):
+            return await self.app(scope, receive, send)
+        # Batch sub-requests: the batch POST was admitted and charged already
+        if BATCH_EXTENSION in scope.get("extensions", {}):
+            return await self.app(scope, receive, send)
+        if self.limiter is not None:
+            wait = self.limiter.take(_client_key(scope))
+            if wait:
+                metrics.requests_shed.inc(("rate_limited",))
+                return await _reject(send, Rejected(429, "rate_limited", wait))
+        if scope["method"] not in WRITE_METHODS or scope["path"].startswith(
+            READ_ONLY_POSTS
+        ):
+            return await self.app(scope, receive, send)
+
+        try:
+            await self.admission.acquire()
+        except Rejected as rejected:
+            metrics.requests_shed.inc((rejected.reason,))
+            return await _reject(send, rejected)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.release(time.perf_counter() - started)
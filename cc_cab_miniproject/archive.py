@@ -0,0 +1,298 @@
+"""
+Monthly archival of finished bookings (SQLite).
+
+Completed and cancelled bookings older than N days are moved, together with
+their booking_status_history and fare_calculations rows, into
+archive/bookings_YYYY_MM.db (by booking month), attached to the hot database
+with ATTACH. A small booking_archive_index table in the hot file remembers
+where each booking went, so reads can fall back to the right archive without
+opening every file.
+
+Reviews stay in the hot file (driver ratings are recomputed from them) and
+keep their booking_id, which then resolves through the archive index.
+
+    python archive.py --older-than-days 90 --vacuum
+"""
+
+import argparse
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import create_engine, text
+
+from database import is_sqlite
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+
+# Tables moved with each booking, parent first
+ARCHIVED_TABLES = ("bookings", "booking_status_history", "fare_calculations")
+
+ARCHIVE_INDEX_TABLE = """
+    CREATE TABLE IF NOT EXISTS booking_archive_index (
+        booking_id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        status TEXT NOT NULL,
+        created_at TIMESTAMP,
+        archive_name TEXT NOT NULL
+    )
+"""
+
+# Indexes created in each archive file (the copied tables have no constraints)
+ARCHIVE_INDEXES = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_bookings_booking_id "
+    "ON bookings(booking_id)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_bookings_user_id "
+    "ON bookings(user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_booking_status_history_booking_id "
+    "ON booking_status_history(booking_id)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_fare_calculations_booking_id "
+    "ON fare_calculations(booking_id)",
+)
+
+CANDIDATES_QUERY = """
+    SELECT booking_id, user_id, status, created_at,
+           strftime('%Y_%m', created_at) AS month
+    FROM bookings
+    WHERE status IN ('completed', 'cancelled')
+      AND created_at IS NOT NULL AND created_at < :cutoff
+    ORDER BY created_at
+    LIMIT :batch_size
+"""
+
+_archive_engines: Dict[str, object] = {}
+_archive_engines_lock = threading.Lock()
+
+
+def archive_path(archive_name: str) -> str:
+    return os.path.join(ARCHIVE_DIR, f"{archive_name}.db")
+
+
+def archive_bookings(
+    engine, older_than_days: int = 90, batch_size: int = 1000, vacuum: bool = False
+) -> dict:
+    """
+    Moves finished bookings older than older_than_days into monthly archives.
+
+    Each batch is copied into the attached archive and committed before the
+    hot rows are deleted. With WAL, a commit spanning attached files is only
+    atomic per file, so a crash can leave a booking in both places (the next
+    run copies it again) but never in neither.
+    """
+    if not is_sqlite(engine):
+        raise ValueError("Booking archival uses ATTACH and requires SQLite")
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=older_than_days)).strftime(
+        "%Y-%m-%d %H:%M:%S"
+    )
+
+    archived = 0
+    archives = set()
+    with engine.connect() as conn:
+        # Deleting a booking would cascade to its review; the FK is restored
+        # below. The pragma cannot change inside a transaction.
+        conn.exec_driver_sql("PRAGMA foreign_keys = OFF")
+        try:
+            while True:
+                rows = (
+                    conn.execute(
+                        text(CANDIDATES_QUERY),
+                        {"cutoff": cutoff, "batch_size": batch_size},
+                    )
+                    .mappings()
+                    .all()
+                )
+                conn.commit()
+                if not rows:
+                    break
+                by_month = defaultdict(list)
+                for row in rows:
+                    by_month[f"bookings_{row['month']}"].append(row)
+                for archive_name, batch in by_month.items():
+                    _move_batch(conn, archive_name, batch)
+                    archives.add(archive_name)
+                archived += len(rows)
+                if len(rows) < batch_size:
+                    break
+        finally:
+            conn.exec_driver_sql("PRAGMA foreign_keys = ON")
+
+        if vacuum and archived:
+            _compact(conn)
+
+    return {
+        "bookingsArchived": archived,
+        "archives": sorted(archives),
+        "cutoff": cutoff,
+    }
+
+
+def _move_batch(conn, archive_name: str, batch: List[dict]):
+    booking_ids = [row["booking_id"] for row in batch]
+    placeholders = ", ".join(f":id{i}" for i in range(len(booking_ids)))
+    params = {f"id{i}": booking_id for i, booking_id in enumerate(booking_ids)}
+
+    # ATTACH/DETACH are not allowed inside a transaction
+    conn.exec_driver_sql("ATTACH DATABASE ? AS archive", (archive_path(archive_name),))
+    try:
+        for table in ARCHIVED_TABLES:
+            # Plain copies of the hot tables: no FKs to tables the archive lacks
+            conn.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS archive.{table} AS "
+                    f"SELECT * FROM main.{table} WHERE 0"
+                )
+            )
+        for ddl in ARCHIVE_INDEXES:
+            conn.execute(text(ddl))
+
+        for table in ARCHIVED_TABLES:
+            columns = ", ".join(_sync_columns(conn, table))
+            # Drop leftovers of an interrupted earlier run, then copy
+            conn.execute(
+                text(
+                    f"DELETE FROM archive.{table} WHERE booking_id IN ({placeholders})"
+                ),
+                params,
+            )
+            conn.execute(
+                text(f"""
+                    INSERT INTO archive.{table} ({columns})
+                    SELECT {columns} FROM main.{table}
+                    WHERE booking_id IN ({placeholders})
+                """),
+                params,
+            )
+        conn.commit()
+
+        conn.execute(
+            text("""
+                INSERT OR REPLACE INTO booking_archive_index
+                    (booking_id, user_id, status, created_at, archive_name)
+                VALUES (:booking_id, :user_id, :status, :created_at, :archive_name)
+            """),
+            [
+                {
+                    "booking_id": row["booking_id"],
+                    "user_id": row["user_id"],
+                    "status": row["status"],
+                    "created_at": row["created_at"],
+                    "archive_name": archive_name,
+                }
+                for row in batch
+            ],
+        )
+        # Children first, then what ON DELETE SET NULL would have done
+        for table in reversed(ARCHIVED_TABLES):
+            conn.execute(
+                text(f"DELETE FROM main.{table} WHERE booking_id IN ({placeholders})"),
+                params,
+            )
+        conn.execute(
+            text(f"""
+                UPDATE driver_locations SET booking_id = NULL
+                WHERE booking_id IN ({placeholders})
+            """),
+            params,
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.exec_driver_sql("DETACH DATABASE archive")
+
+
+def _sync_columns(conn, table: str) -> List[str]:
+    """
+    Adds columns the hot table gained since the archive file was created;
+    returns the hot table's column names.
+    """
+    hot = [row[1] for row in conn.exec_driver_sql(f"PRAGMA main.table_info({table})")]
+    archived = {
+        row[1] for row in conn.exec_driver_sql(f"PRAGMA archive.table_info({table})")
+    }
+    for column in hot:
+        if column not in archived:
+            conn.exec_driver_sql(f"ALTER TABLE archive.{table} ADD COLUMN {column}")
+    return hot
+
+
+def _compact(conn):
+    """
+    Returns the freed pages to the filesystem so the hot file shrinks.
+    """
+    from migrations import rebuild_search_index
+
+    conn.exec_driver_sql("VACUUM")
+    # VACUUM may renumber rowids, which the FTS tables are keyed by
+    rebuild_search_index(conn)
+    conn.commit()
+    conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def archive_engine(archive_name: str):
+    with _archive_engines_lock:
+        engine = _archive_engines.get(archive_name)
+        if engine is None:
+            uri = f"file:{os.path.abspath(archive_path(archive_name))}?mode=ro"
+            engine = create_engine(
+                f"sqlite:///{uri}&uri=true",
+                connect_args={"check_same_thread": False},
+            )
+            _archive_engines[archive_name] = engine
+        return engine
+
+
+def find_archived_booking(db, booking_id: str, query: str) -> Optional[dict]:
+    """
+    Runs query (which reads bookings/fare_calculations by :booking_id)
+    against the archive holding booking_id; None if it was never archived.
+    """
+    rows = find_archived_rows(db, booking_id, query)
+    return rows[0] if rows else None
+
+
+def find_archived_rows(db, booking_id: str, query: str) -> Optional[List[dict]]:
+    """
+    Like find_archived_booking, but returns every row query yields.
+    """
+    if not is_sqlite(db):
+        return None
+    archive_name = db.execute(
+        text(
+            "SELECT archive_name FROM booking_archive_index "
+            "WHERE booking_id = :booking_id"
+        ),
+        {"booking_id": booking_id},
+    ).scalar()
+    if archive_name is None or not os.path.exists(archive_path(archive_name)):
+        return None
+    with archive_engine(archive_name).connect() as conn:
+        rows = conn.execute(text(query), {"booking_id": booking_id}).mappings().all()
+    return [dict(row) for row in rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Move finished bookings into monthly archive databases"
+    )
+    parser.add_argument("--older-than-days", type=int, default=90)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--vacuum", action="store_true", help="Shrink the hot file afterwards"
+    )
+    args = parser.parse_args()
+
+    from main import engine
+
+    print(
+        archive_bookings(
+            engine,
+            older_than_days=args.older_than_days,
+            batch_size=args.batch_size,
+            vacuum=args.vacuum,
+        )
+    )
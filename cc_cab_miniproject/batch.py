@@ -0,0 +1,98 @@
+"""
+Batched read requests: several GETs in one round trip.
+
+Each sub-request is dispatched through the ASGI app in-process, so it gets
+the same routing, validation, handlers and metrics as a direct call, and
+its database session comes from the same connection pool. Identical paths
+are run once and share the result. Distinct ones run one after another: the
+handlers make blocking database calls on the event loop, so running them
+together would gain nothing, and every one of them would hold a pooled
+connection at once (a full batch is larger than the default pool, and the
+handlers blocked waiting for a connection would stall the loop that has to
+release one). Responses keep the order of the requests. A sub-request that
+raises gets its own 500 instead of failing the batch.
+
+Sub-requests inherit the caller's read-consistency header, pin cookie and
+request ID, so a batch sent right after a write still reads its own writes
+and its log lines carry the caller's request ID. They are marked with the
+BATCH_EXTENSION scope extension: the batch POST was already rate limited
+as a whole, so admission.py lets its sub-requests through.
+"""
+
+import json
+import logging
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger("cab.batch")
+
+# Headers copied from the batch request onto each sub-request
+FORWARDED_HEADERS = (b"cookie", b"x-read-consistency", b"x-request-id")
+# Scope extension marking a sub-request dispatched in-process by a batch
+BATCH_EXTENSION = "cab.batch"
+
+
+async def dispatch(app, scope: dict, path: str) -> Tuple[int, Any]:
+    """
+    Runs GET `path` through `app` with the batch request's `scope` as the
+    template. Returns (status, decoded body).
+    """
+    path, _, query = path.partition("?")
+    sub_scope = {
+        "type": "http",
+        "asgi": scope.get("asgi", {"version": "3.0"}),
+        "http_version": scope.get("http_version", "1.1"),
+        "method": "GET",
+        "scheme": scope.get("scheme", "http"),
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": scope.get("root_path", ""),
+        "headers": [
+            (name, value)
+            for name, value in scope["headers"]
+            if name in FORWARDED_HEADERS or name == b"host"
+        ],
+        "client": scope.get("client"),
+        "server": scope.get("server"),
+        "extensions": {BATCH_EXTENSION: {}},
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    status_code = 500
+    content_type = b""
+    chunks: List[bytes] = []
+
+    async def send(message):
+        nonlocal status_code, content_type
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+            for name, value in message.get("headers", ()):
+                if name.lower() == b"content-type":
+                    content_type = value
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await app(sub_scope, receive, send)
+    except Exception:
+        logger.exception("Batch sub-request failed", extra={"path": path})
+        return 500, {"detail": "Internal server error"}
+    body = b"".join(chunks)
+    if not body:
+        return status_code, None
+    if content_type.startswith(b"application/json"):
+        return status_code, json.loads(body)
+    return status_code, body.decode("utf-8", "replace")
+
+
+async def run_batch(app, scope: dict, paths: List[str]) -> List[Tuple[int, Any]]:
+    """
+    Dispatches every distinct path once, in turn; returns one (status,
+    body) per entry of `paths`, in order.
+    """
+    by_path: Dict[str, Tuple[int, Any]] = {}
+    for path in dict.fromkeys(paths):
+        by_path[path] = await dispatch(app, scope, path)
+    return [by_path[path] for path in paths]
@@ -0,0 +1,436 @@
+"""
+Benchmark: a mixed API workload against a synthetic database, with a baseline.
+
+Generates a database with generate_data.py (or reuses --db), then has
+concurrent clients run a booking-app mix for --duration seconds: partner
+listing, booking detail polling, booking creation, destination updates and
+cancellation of the client's own bookings. --mode inprocess drives the ASGI
+app directly in this process (no sockets, so the numbers are the app's own
+cost); --mode http starts `main.py --workers N` and uses HTTP clients.
+
+Prints throughput and p50/p95/p99 latency per operation. With --baseline the
+run is compared with the entry for the same mode and scale in baseline.json
+and exits 1 if throughput fell or any p95 rose by more than --tolerance;
+--save-baseline records the run instead. Baselines are machine-specific:
+record them on the machine (or CI runner class) that checks them.
+
+    python benchmarks/bench_api.py --mode inprocess --scale small --baseline
+    python benchmarks/bench_api.py --mode http --workers 4 --clients 32 \\
+        --scale medium --save-baseline
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_workers import ROOT, wait_until_ready
+from generate_data import add_scale_arguments, build_database, scale_from_args
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "baseline.json"
+)
+
+# Operation -> share of the mix
+MIX = {
+    "booking_detail": 40,
+    "list_partners": 25,
+    "create_booking": 15,
+    "update_destination": 10,
+    "cancel_booking": 10,
+}
+EXPECTED_STATUS = {"create_booking": 201}
+
+# Latency rises below this many milliseconds are noise, whatever the tolerance
+LATENCY_SLACK_MS = 2.0
+
+
+class Workload:
+    """
+    Picks the next request for one client. Bookings the client created are
+    remembered so it can cancel them later; without one to cancel it books.
+    """
+
+    def __init__(
+        self, seed: int, users: int, partner_pages: int, bookings: int, active
+    ):
+        self.rng = random.Random(seed)
+        self.users = users
+        self.partner_pages = partner_pages
+        self.bookings = bookings
+        self.active = active
+        self.created = []
+        self.operations = list(MIX)
+        self.weights = list(MIX.values())
+
+    def next_request(self):
+        """
+        Returns (operation, method, path, body).
+        """
+        operation = self.rng.choices(self.operations, self.weights)[0]
+        if operation == "cancel_booking" and not self.created:
+            operation = "create_booking"
+        if operation == "update_destination" and not self.active:
+            operation = "booking_detail"
+
+        if operation == "list_partners":
+            page = self.rng.randint(1, self.partner_pages)
+            return operation, "GET", f"/api/partners?page={page}&limit=10", None
+        if operation == "booking_detail":
+            if self.created and self.rng.random() < 0.5:
+                booking_id = self.rng.choice(self.created)
+            else:
+                booking_id = f"bench_booking_{self.rng.randrange(self.bookings):08d}"
+            return operation, "GET", f"/api/bookings/{booking_id}", None
+        if operation == "create_booking":
+            user = self.rng.randrange(self.users)
+            latitude = 12.9716 + self.rng.uniform(-0.05, 0.05)
+            longitude = 77.5946 + self.rng.uniform(-0.05, 0.05)
+            body = {
+                "userId": f"bench_user_{user:07d}",
+                "pickupLocation": {"latitude": latitude, "longitude": longitude},
+                "dropoffLocation": {
+                    "latitude": latitude + self.rng.uniform(-0.1, 0.1),
+                    "longitude": longitude + self.rng.uniform(-0.1, 0.1),
+                },
+                "vehicleType": self.rng.choice(["Sedan", "SUV", "Hatchback"]),
+                "paymentMethodId": f"bench_pay_{user:07d}",
+            }
+            return operation, "POST", "/api/bookings", body
+        if operation == "update_destination":
+            booking_id = self.rng.choice(self.active)
+            body = {
+                "latitude": 12.9716 + self.rng.uniform(-0.1, 0.1),
+                "longitude": 77.5946 + self.rng.uniform(-0.1, 0.1),
+            }
+            return operation, "PUT", f"/api/bookings/{booking_id}/destination", body
+        booking_id = self.created.pop(self.rng.randrange(len(self.created)))
+        body = {"reason": "benchmark"}
+        return operation, "POST", f"/api/bookings/{booking_id}/cancel", body
+
+    def record(self, operation: str, status_code: int, payload: bytes) -> bool:
+        ok = status_code == EXPECTED_STATUS.get(operation, 200)
+        if ok and operation == "create_booking":
+            self.created.append(json.loads(payload)["bookingId"])
+        return ok
+
+
+def workload_params(db_path: str, scale: dict) -> dict:
+    """
+    What the clients need to know about the generated data.
+    """
+    conn = sqlite3.connect(db_path)
+    active = [
+        booking_id
+        for (booking_id,) in conn.execute(
+            "SELECT booking_id FROM bookings "
+            "WHERE status IN ('confirmed', 'ongoing') AND booking_id LIKE 'bench_%' "
+            "LIMIT 5000"
+        )
+    ]
+    conn.close()
+    return {
+        "users": scale["users"],
+        "partner_pages": max(1, scale["partners"] // 10),
+        "bookings": scale["bookings"],
+        "active": active,
+    }
+
+
+# --- In-process ---
+
+
+async def _call(app, method: str, path: str, body, extra_headers=()):
+    """
+    One request through the ASGI app; returns (status, body bytes).
+    """
+    path, _, query = path.partition("?")
+    payload = json.dumps(body).encode() if body is not None else b""
+    headers = [(b"host", b"bench"), *extra_headers]
+    if body is not None:
+        headers += [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode()),
+        ]
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": headers,
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        # The client never disconnects
+        await asyncio.Event().wait()
+
+    response = {"status": 0, "body": []}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return response["status"], b"".join(response["body"])
+
+
+async def _inprocess_client(app, workload, deadline, warmup_until, samples):
+    while time.monotonic() < deadline:
+        operation, method, path, body = workload.next_request()
+        started = time.perf_counter()
+        status_code, payload = await _call(app, method, path, body)
+        latency = (time.perf_counter() - started) * 1000
+        ok = workload.record(operation, status_code, payload)
+        if time.monotonic() >= warmup_until:
+            samples.append((operation, latency, ok))
+
+
+async def _run_inprocess(params, clients, duration, warmup):
+    import main
+
+    samples = []
+    async with main.app.router.lifespan_context(main.app):
+        warmup_until = time.monotonic() + warmup
+        deadline = warmup_until + duration
+        await asyncio.gather(
+            *(
+                _inprocess_client(
+                    main.app, Workload(n, **params), deadline, warmup_until, samples
+                )
+                for n in range(clients)
+            )
+        )
+    return samples
+
+
+def run_inprocess(workdir, params, clients, duration, warmup):
+    os.environ["DATABASE_URL"] = "sqlite:///./data.db"
+    os.chdir(workdir)
+    sys.path.insert(0, workdir)
+    return asyncio.run(_run_inprocess(params, clients, duration, warmup))
+
+
+# --- HTTP ---
+
+
+def _http_client(port, params, seed, deadline, warmup_until, results):
+    workload = Workload(seed, **params)
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    samples = []
+    while time.monotonic() < deadline:
+        operation, method, path, body = workload.next_request()
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        started = time.perf_counter()
+        conn.request(
+            method, path, json.dumps(body) if body is not None else None, headers
+        )
+        response = conn.getresponse()
+        payload = response.read()
+        latency = (time.perf_counter() - started) * 1000
+        ok = workload.record(operation, response.status, payload)
+        if time.monotonic() >= warmup_until:
+            samples.append((operation, latency, ok))
+    conn.close()
+    results.put(samples)
+
+
+def run_http(workdir, params, clients, duration, warmup, workers, port):
+    server = subprocess.Popen(
+        [sys.executable, "main.py", "--workers", str(workers), "--port", str(port)],
+        cwd=workdir,
+        env=dict(os.environ, DATABASE_URL="sqlite:///./data.db"),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_ready(port)
+        results = multiprocessing.Queue()
+        warmup_until = time.monotonic() + warmup
+        deadline = warmup_until + duration
+        processes = [
+            multiprocessing.Process(
+                target=_http_client,
+                args=(port, params, n, deadline, warmup_until, results),
+            )
+            for n in range(clients)
+        ]
+        for process in processes:
+            process.start()
+        samples = [sample for _ in processes for sample in results.get()]
+        for process in processes:
+            process.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return samples
+
+
+# --- Report ---
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def summarize(samples, duration: float) -> dict:
+    operations = {}
+    for operation in MIX:
+        latencies = sorted(latency for op, latency, _ in samples if op == operation)
+        if not latencies:
+            continue
+        operations[operation] = {
+            "count": len(latencies),
+            "errors": sum(1 for op, _, ok in samples if op == operation and not ok),
+            "p50": round(percentile(latencies, 0.50), 2),
+            "p95": round(percentile(latencies, 0.95), 2),
+            "p99": round(percentile(latencies, 0.99), 2),
+        }
+    return {
+        "throughput": round(len(samples) / duration, 1),
+        "errors": sum(1 for _, _, ok in samples if not ok),
+        "operations": operations,
+    }
+
+
+def print_report(result: dict):
+    print(f"{'operation':<20}{'count':>8}{'errors':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for operation, stats in result["operations"].items():
+        print(
+            f"{operation:<20}{stats['count']:>8}{stats['errors']:>8}"
+            f"{stats['p50']:>9.2f}{stats['p95']:>9.2f}{stats['p99']:>9.2f}"
+        )
+    print(f"throughput {result['throughput']:.1f} req/s, errors {result['errors']}")
+
+
+def regressions(result: dict, baseline: dict, tolerance: float):
+    """
+    Human-readable list of metrics worse than baseline beyond tolerance.
+    """
+    found = []
+    floor = baseline["throughput"] * (1 - tolerance)
+    if result["throughput"] < floor:
+        found.append(
+            f"throughput {result['throughput']:.1f} req/s < {floor:.1f} "
+            f"(baseline {baseline['throughput']:.1f})"
+        )
+    for operation, base in baseline["operations"].items():
+        current = result["operations"].get(operation)
+        if current is None:
+            continue
+        ceiling = base["p95"] * (1 + tolerance) + LATENCY_SLACK_MS
+        if current["p95"] > ceiling:
+            found.append(
+                f"{operation} p95 {current['p95']:.2f} ms > {ceiling:.2f} ms "
+                f"(baseline {base['p95']:.2f} ms)"
+            )
+    if result["errors"] > baseline.get("errors", 0):
+        found.append(
+            f"{result['errors']} errors (baseline {baseline.get('errors', 0)})"
+        )
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--db", help="Reuse a database from generate_data.py")
+    add_scale_arguments(parser)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--baseline", action="store_true", help="Compare with baseline")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    scale = scale_from_args(args)
+    key = f"{args.mode}-{args.scale}"
+    print(
+        f"cpu_count={os.cpu_count()} mode={args.mode} scale={args.scale} "
+        f"clients={args.clients} duration={args.duration}s"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in os.listdir(ROOT):
+            if name.endswith(".py") or name == "source.sql":
+                shutil.copy(os.path.join(ROOT, name), tmp)
+        db_path = os.path.join(tmp, "data.db")
+        if args.db:
+            shutil.copy(args.db, db_path)
+        else:
+            started = time.perf_counter()
+            build_database(db_path, seed=args.seed, **scale)
+            print(f"generated data.db in {time.perf_counter() - started:.1f}s")
+        params = workload_params(db_path, scale)
+
+        if args.mode == "inprocess":
+            samples = run_inprocess(
+                tmp, params, args.clients, args.duration, args.warmup
+            )
+        else:
+            samples = run_http(
+                tmp,
+                params,
+                args.clients,
+                args.duration,
+                args.warmup,
+                args.workers,
+                args.port,
+            )
+        os.chdir(ROOT)
+
+    result = summarize(samples, args.duration)
+    print_report(result)
+
+    baselines = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baselines = json.load(f)
+    if args.save_baseline:
+        baselines[key] = dict(
+            result, clients=args.clients, workers=args.workers, cpuCount=os.cpu_count()
+        )
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"saved baseline {key}")
+    elif args.baseline:
+        if key not in baselines:
+            sys.exit(f"no baseline for {key} in {BASELINE_PATH}")
+        found = regressions(result, baselines[key], args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+        print(f"no regressions against baseline {key}")
+
+
+if __name__ == "__main__":
+    main()
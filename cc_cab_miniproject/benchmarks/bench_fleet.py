@@ -0,0 +1,140 @@
+"""
+Benchmark: fleet group-by counts, SQL against the in-memory snapshot.
+
+Builds a database of --partners x --vehicles-per-partner vehicles with
+generate_data.py (or reuses --db), then times "available vehicles by type
+per partner" and "vehicles by type and status" as a GROUP BY over
+vehicles joined to partners and as fleet_snapshot group counts. Also
+reports the snapshot's full load and the incremental refresh after one
+vehicle write. --extra-vehicles adds in-memory rows to the snapshot to time
+the counts at millions of vehicles without building a database that size.
+
+    python benchmarks/bench_fleet.py --partners 2000 --vehicles-per-partner 100 \\
+        --extra-vehicles 2000000
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+
+from bench_workers import ROOT
+from generate_data import build_database
+
+sys.path.insert(0, ROOT)
+
+from fleet_snapshot import FleetSnapshot  # noqa: E402
+
+QUERIES = {
+    "available by partner, type": (
+        """
+        SELECT p.partner_id, v.type, COUNT(*)
+        FROM vehicles v JOIN partners p ON p.partner_id = v.partner_id
+        WHERE v.status = 'available'
+        GROUP BY p.partner_id, v.type
+        """,
+        dict(group_by=["partner", "type"], vehicle_status="available"),
+    ),
+    "by type, status": (
+        "SELECT type, status, COUNT(*) FROM vehicles GROUP BY type, status",
+        dict(group_by=["type", "status"]),
+    ),
+}
+
+
+def _median_ms(call, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", help="Reuse a database from generate_data.py")
+    parser.add_argument("--partners", type=int, default=500)
+    parser.add_argument("--vehicles-per-partner", type=int, default=100)
+    parser.add_argument("--extra-vehicles", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "data.db")
+        if args.db:
+            shutil.copy(args.db, db_path)
+        else:
+            build_database(
+                db_path,
+                partners=args.partners,
+                vehicles_per_partner=args.vehicles_per_partner,
+                users=1,
+                bookings=0,
+                seed=args.seed,
+            )
+        engine = create_engine(f"sqlite:///{db_path}")
+        snapshot = FleetSnapshot()
+        with engine.connect() as conn:
+            started = time.perf_counter()
+            snapshot.load(conn)
+            load_ms = (time.perf_counter() - started) * 1000
+            vehicles = len(snapshot)
+            print(f"vehicles={vehicles:,} snapshot load {load_ms:.0f} ms")
+
+            print(f"{'query':<30}{'SQL ms':>10}{'snapshot ms':>14}")
+            for name, (sql, counts) in QUERIES.items():
+                sql_ms = _median_ms(lambda: conn.execute(text(sql)).all(), args.repeat)
+                snapshot_ms = _median_ms(
+                    lambda: snapshot.group_counts(**counts), args.repeat
+                )
+                print(f"{name:<30}{sql_ms:>10.2f}{snapshot_ms:>14.2f}")
+
+        vehicle_id = random.Random(args.seed).choice(snapshot._vehicle_ids)
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    "UPDATE vehicles SET status = 'offline' "
+                    "WHERE vehicle_id = :vehicle_id"
+                ),
+                {"vehicle_id": vehicle_id},
+            )
+        with engine.connect() as conn:
+            started = time.perf_counter()
+            reloaded = snapshot.refresh(conn)
+            refresh_ms = (time.perf_counter() - started) * 1000
+        print(
+            f"refresh after one vehicle write: {refresh_ms:.1f} ms ({reloaded} partner)"
+        )
+        engine.dispose()
+
+    if args.extra_vehicles:
+        rng = random.Random(args.seed)
+        types = ["Sedan", "SUV", "Hatchback", "Auto"]
+        statuses = ["available", "on_ride", "offline"]
+        partners = max(args.partners, 1)
+        with snapshot._lock:
+            for i in range(args.extra_vehicles):
+                snapshot._insert(
+                    f"extra_{i}",
+                    f"extra_partner_{i % partners}",
+                    rng.choice(types),
+                    rng.choice(statuses),
+                )
+        print(f"with extra in-memory rows: vehicles={len(snapshot):,}")
+        for name, (_, counts) in QUERIES.items():
+            snapshot_ms = _median_ms(
+                lambda: snapshot.group_counts(**counts), args.repeat
+            )
+            print(f"{name:<30}{'':>10}{snapshot_ms:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: cost of a log call on the calling thread, against its budget.
+
+Times logger calls through the logs.py pipeline (queue handler, request
+context, warning sampling) as a request handler would make them, next to the
+synchronous print() to a pipe the old error paths used: print() is cheaper
+while the reader keeps up, but blocks the event loop once the pipe fills,
+where the queue drops instead. JSON formatting and the write happen on the
+listener thread and are not part of the budget; their throughput is reported
+separately. Exits 1 if a case is over budget.
+
+    python benchmarks/bench_logging.py --calls 100000
+"""
+
+import argparse
+import io
+import logging
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import logs  # noqa: E402
+
+# Microseconds per call on the calling thread
+BUDGET_US = {
+    "error (emitted)": 25.0,
+    "warning (sampled out)": 10.0,
+    "debug (below level)": 1.0,
+}
+
+
+class _Sink(io.TextIOBase):
+    def __init__(self):
+        self.lines = 0
+
+    def write(self, text):
+        self.lines += text.count("\n")
+        return len(text)
+
+
+def _per_call_us(call, calls: int) -> float:
+    started = time.perf_counter()
+    for i in range(calls):
+        call(i)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=50_000)
+    args = parser.parse_args(argv)
+
+    sink = _Sink()
+    logs.configure(sink)
+    logger = logging.getLogger("cab.bench")
+    token = logs._request_id.set("bench-request")
+
+    cases = {
+        "error (emitted)": lambda i: logger.error("Booking %s failed", i),
+        "warning (sampled out)": lambda i: logger.warning("Noisy warning %s", i),
+        "debug (below level)": lambda i: logger.debug("Debug detail %s", i),
+    }
+    results = {}
+    for name, call in cases.items():
+        # Enqueueing outpaces the listener, so calls are timed in rounds
+        # that fit the queue; a full queue would time drops instead
+        rounds = max(1, args.calls // logs.QUEUE_SIZE)
+        per_round = min(args.calls, logs.QUEUE_SIZE // 2)
+        timings = []
+        for _ in range(rounds):
+            timings.append(_per_call_us(call, per_round))
+            # Let the listener drain before the next round
+            while not logs._listener.queue.empty():
+                time.sleep(0.01)
+        results[name] = min(timings)
+
+    started = time.perf_counter()
+    written = sink.lines
+    for i in range(logs.QUEUE_SIZE // 2):
+        logger.error("Booking %s failed", i)
+    while not logs._listener.queue.empty():
+        time.sleep(0.001)
+    drain = (sink.lines - written) / (time.perf_counter() - started)
+    logs._request_id.reset(token)
+
+    # The old error paths: a synchronous print() to a pipe
+    reader = subprocess.Popen(
+        [sys.executable, "-c", "import sys; sys.stdin.buffer.read()"],
+        stdin=subprocess.PIPE,
+    )
+    pipe = io.TextIOWrapper(reader.stdin, line_buffering=True)
+    results["print() to a pipe"] = _per_call_us(
+        lambda i: print(f"Error: booking {i} failed", file=pipe), args.calls
+    )
+    pipe.close()
+    reader.wait()
+
+    print(f"{'case':<24}{'us/call':>10}{'budget':>10}")
+    over = []
+    for name, per_call in results.items():
+        budget = BUDGET_US.get(name)
+        print(f"{name:<24}{per_call:>10.2f}{budget or float('nan'):>10.1f}")
+        if budget is not None and per_call > budget:
+            over.append(name)
+    print(f"listener: {drain:,.0f} records/s formatted and written")
+    if over:
+        sys.exit(f"over budget: {', '.join(over)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: bytes and time per partner-list page, full vs sparse vs compressed.
+
+Requests /api/partners?limit=100 in-process against a synthetic database as
+the full response, with ?fields=partnerId,name,status, and each of those
+gzip-compressed (and brotli, when the brotli package is installed). Prints
+the body size on the wire and the mean time per request.
+
+    python benchmarks/bench_payload.py --scale medium --requests 200
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from bench_api import _call
+from bench_workers import ROOT
+from generate_data import add_scale_arguments, build_database, scale_from_args
+
+PATH = "/api/partners?limit=100"
+SPARSE_FIELDS = "partnerId,name,status"
+
+
+async def _measure(app, path: str, headers, requests: int):
+    status_code, body = await _call(app, "GET", path, None, headers)
+    assert status_code == 200, (path, status_code)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await _call(app, "GET", path, None, headers)
+    return len(body), (time.perf_counter() - started) / requests * 1000
+
+
+async def _run(requests: int):
+    import compression
+    import main
+
+    encodings = ["identity", *compression.SUPPORTED_ENCODINGS]
+    results = []
+    async with main.app.router.lifespan_context(main.app):
+        for label, path in (
+            ("full", PATH),
+            ("sparse", f"{PATH}&fields={SPARSE_FIELDS}"),
+        ):
+            for encoding in encodings:
+                headers = [(b"accept-encoding", encoding.encode())]
+                size, ms = await _measure(main.app, path, headers, requests)
+                results.append((f"{label} {encoding}", size, ms))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    add_scale_arguments(parser)
+    parser.add_argument("--requests", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in os.listdir(ROOT):
+            if name.endswith(".py") or name == "source.sql":
+                shutil.copy(os.path.join(ROOT, name), tmp)
+        build_database(
+            os.path.join(tmp, "data.db"), seed=args.seed, **scale_from_args(args)
+        )
+        os.environ["DATABASE_URL"] = "sqlite:///./data.db"
+        os.chdir(tmp)
+        sys.path.insert(0, tmp)
+        results = asyncio.run(_run(args.requests))
+        os.chdir(ROOT)
+
+    full_size = results[0][1]
+    print(f"{'response':<18}{'bytes':>10}{'of full':>10}{'ms/req':>10}")
+    for name, size, ms in results:
+        print(f"{name:<18}{size:>10,}{size / full_size:>10.1%}{ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
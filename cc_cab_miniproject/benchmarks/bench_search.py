@@ -0,0 +1,133 @@
+"""
+Benchmark: leading-wildcard LIKE scan vs FTS5 MATCH on the partners table.
+
+Builds a throwaway database from source.sql, bulk-loads synthetic partners
+and times the two access paths for a handful of search terms. LIKE can stop
+early on a common term but must scan the whole table for a rare one or for a
+COUNT(*); FTS cost follows the number of hits, so bm25() ranking of a very
+common term is the expensive case.
+
+    python benchmarks/bench_search.py --rows 1000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CITIES = ["Mumbai", "Delhi", "Bangalore", "Pune", "Chennai", "Kolkata", "Hyderabad"]
+STREETS = ["Main Street", "Park Avenue", "Lake Road", "MG Road", "Ring Road"]
+WORDS = ["City", "Quick", "Metro", "Royal", "Green", "Star", "Urban", "Swift"]
+SUFFIXES = ["Cabs", "Rides", "Taxis", "Travels", "Mobility"]
+
+QUERIES = {
+    # First page, as a search box would fetch it
+    "LIKE top10": """
+        SELECT partner_id, name, address FROM partners
+        WHERE address LIKE :pattern OR name LIKE :pattern
+        LIMIT 10
+    """,
+    "FTS top10": """
+        SELECT p.partner_id, p.name, p.address
+        FROM partners_fts JOIN partners p ON p.rowid = partners_fts.rowid
+        WHERE partners_fts MATCH :match
+        LIMIT 10
+    """,
+    "FTS ranked": """
+        SELECT p.partner_id, p.name, p.address
+        FROM partners_fts JOIN partners p ON p.rowid = partners_fts.rowid
+        WHERE partners_fts MATCH :match
+        ORDER BY bm25(partners_fts, 10.0, 1.0)
+        LIMIT 10
+    """,
+    # Total hit count, as the paginated list endpoint computes it
+    "LIKE count": """
+        SELECT COUNT(*) FROM partners
+        WHERE address LIKE :pattern OR name LIKE :pattern
+    """,
+    "FTS count": """
+        SELECT COUNT(*) FROM partners_fts WHERE partners_fts MATCH :match
+    """,
+}
+
+# A rare term forces the LIKE scan to walk most of the table
+TERMS = ["Kolkata", "Swift Mobility", "Zyzzyva"]
+
+
+def build_database(path: str, rows: int, seed: int):
+    conn = sqlite3.connect(path)
+    with open(os.path.join(ROOT, "source.sql")) as f:
+        conn.executescript(f.read())
+
+    # Load without the per-row FTS triggers, then build the index in one pass
+    conn.execute("DROP TRIGGER trigger_partners_fts_insert")
+    rng = random.Random(seed)
+    batch = []
+    started = time.perf_counter()
+    for i in range(rows):
+        name = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(SUFFIXES)}"
+        address = f"{rng.randint(1, 999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}"
+        if i % 100000 == 0:
+            address += ", near Zyzzyva Tower"
+        batch.append((f"bench_{i}", name, f"9{i:09d}", f"p{i}@bench.test", address))
+        if len(batch) == 10000:
+            conn.executemany(
+                "INSERT INTO partners (partner_id, name, phone, email, address) "
+                "VALUES (?, ?, ?, ?, ?)",
+                batch,
+            )
+            batch.clear()
+    if batch:
+        conn.executemany(
+            "INSERT INTO partners (partner_id, name, phone, email, address) "
+            "VALUES (?, ?, ?, ?, ?)",
+            batch,
+        )
+    conn.execute("INSERT INTO partners_fts(partners_fts) VALUES ('rebuild')")
+    conn.commit()
+    print(f"loaded {rows:,} partners in {time.perf_counter() - started:.1f}s")
+    return conn
+
+
+def time_query(conn, sql: str, params: dict, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    from search import build_match_expression
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = build_database(os.path.join(tmp, "bench.db"), args.rows, args.seed)
+        print(f"{'term':<16}" + "".join(f"{name:>13}" for name in QUERIES))
+        for term in TERMS:
+            params = {
+                "pattern": f"%{term}%",
+                "match": build_match_expression(term, prefix=False),
+            }
+            timings = [
+                time_query(conn, sql, params, args.repeat) for sql in QUERIES.values()
+            ]
+            print(f"{term:<16}" + "".join(f"{ms:>10.2f} ms" for ms in timings))
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Benchmark: cold start, up to the first successful request.
+
+Copies the app and a generated database (or --db) to a temp directory, then
+for each STARTUP_WARMUP mode starts `uvicorn main:app` --runs times, the
+way the container does, and polls a booking detail until it answers 200.
+Reports the time from launching the process to that answer, the worker's
+own startup phases (from its "Startup finished" log line) and the latency
+of the first request to each of the other hot endpoints.
+
+Before every start the database file is evicted from the OS page cache
+(posix_fadvise DONTNEED, Linux), like a fresh container on a cold disk.
+--no-bytecode also deletes the app's compiled bytecode each time, as for
+an image built without `python -m compileall`.
+
+    python benchmarks/bench_startup.py --scale medium --runs 5
+    python benchmarks/bench_startup.py --modes off blocking --no-bytecode
+"""
+
+import argparse
+import glob
+import http.client
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_workers import ROOT
+from generate_data import add_scale_arguments, build_database, scale_from_args
+
+MODES = ("off", "blocking", "background")
+# Seconds between attempts while the server is not listening yet
+POLL_INTERVAL = 0.005
+
+
+def hot_paths(db_path: str):
+    conn = sqlite3.connect(db_path)
+    booking_id, user_id = conn.execute(
+        "SELECT booking_id, user_id FROM bookings LIMIT 1"
+    ).fetchone()
+    partner_id = conn.execute("SELECT partner_id FROM partners LIMIT 1").fetchone()[0]
+    conn.close()
+    return [
+        f"/api/bookings/{booking_id}",
+        f"/api/bookings/{booking_id}/history",
+        f"/api/users/{user_id}/bookings?page=1&limit=10",
+        "/api/partners?page=1&limit=10",
+        f"/api/partners/{partner_id}",
+        "/api/drivers/supply",
+        "/api/search?q=city",
+    ]
+
+
+def evict(paths):
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def _get(port: int, path: str):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def _startup_phases(log_path: str) -> dict:
+    with open(log_path) as f:
+        for line in f:
+            if '"Startup finished"' in line:
+                return json.loads(line).get("phasesMs", {})
+    return {}
+
+
+def start_once(workdir, mode, port, paths, no_bytecode, timeout=60.0):
+    """
+    One cold start; returns (ms to first 200, phases, first latency per path).
+    """
+    if no_bytecode:
+        shutil.rmtree(os.path.join(workdir, "__pycache__"), ignore_errors=True)
+    evict(glob.glob(os.path.join(workdir, "data.db*")))
+    log_path = os.path.join(workdir, f"startup-{mode}.log")
+    with open(log_path, "w") as log:
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+            cwd=workdir,
+            env=dict(
+                os.environ, DATABASE_URL="sqlite:///./data.db", STARTUP_WARMUP=mode
+            ),
+            stdout=subprocess.DEVNULL,
+            stderr=log,
+        )
+        try:
+            while True:
+                try:
+                    if _get(port, paths[0]) == 200:
+                        break
+                except OSError:
+                    pass
+                if server.poll() is not None:
+                    raise RuntimeError(f"server exited; see {log_path}")
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError(f"no 200 within {timeout}s; see {log_path}")
+                time.sleep(POLL_INTERVAL)
+            first_ok = (time.perf_counter() - started) * 1000
+
+            latencies = {}
+            for path in paths[1:]:
+                request_started = time.perf_counter()
+                _get(port, path)
+                latencies[path] = (time.perf_counter() - request_started) * 1000
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    return first_ok, _startup_phases(log_path), latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", help="Reuse a database from generate_data.py")
+    add_scale_arguments(parser)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--no-bytecode", action="store_true")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in os.listdir(ROOT):
+            if name.endswith(".py") or name == "source.sql":
+                shutil.copy(os.path.join(ROOT, name), tmp)
+        db_path = os.path.join(tmp, "data.db")
+        if args.db:
+            shutil.copy(args.db, db_path)
+        else:
+            build_database(db_path, seed=args.seed, **scale_from_args(args))
+        paths = hot_paths(db_path)
+        # Migrate once up front so no mode pays for the schema upgrade
+        start_once(tmp, "off", args.port, paths, no_bytecode=False)
+
+        print(
+            f"cpu_count={os.cpu_count()} db={os.path.getsize(db_path) / 1e6:.0f}MB "
+            f"runs={args.runs} bytecode={'no' if args.no_bytecode else 'yes'}"
+        )
+        print(
+            f"{'mode':<12}{'first 200 ms':>14}{'import':>9}{'migrate':>9}"
+            f"{'load':>8}{'warmup':>8}{'next requests ms':>18}"
+        )
+        for mode in args.modes:
+            runs = [
+                start_once(tmp, mode, args.port, paths, args.no_bytecode)
+                for _ in range(args.runs)
+            ]
+            first_ok = statistics.median(run[0] for run in runs)
+            phases = {
+                name: statistics.median(run[1].get(name, 0.0) for run in runs)
+                for name in ("import", "migrate", "load_state", "warmup")
+            }
+            # First hit on each of the other hot endpoints, summed
+            following = statistics.median(sum(run[2].values()) for run in runs)
+            print(
+                f"{mode:<12}{first_ok:>14.0f}{phases['import']:>9.0f}"
+                f"{phases['migrate']:>9.0f}{phases['load_state']:>8.0f}"
+                f"{phases['warmup']:>8.0f}{following:>18.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark: request throughput as the number of uvicorn workers grows.
+
+Copies data.db to a temp directory, starts `main.py --workers N` against it
+for each N and drives a read-heavy mix (supply, partner list, search) from
+parallel client processes. Throughput only scales while there are idle CPU
+cores, so compare the curve with os.cpu_count().
+
+    python benchmarks/bench_workers.py --workers 1 2 4 8 --clients 16
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PATHS = [
+    "/api/drivers/supply",
+    "/api/partners?page=1&limit=10",
+    "/api/search?q=city",
+]
+
+
+def wait_until_ready(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", PATHS[0])
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def client(port: int, duration: float, results):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    completed = errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        conn.request("GET", PATHS[completed % len(PATHS)])
+        response = conn.getresponse()
+        response.read()
+        if response.status >= 500:
+            errors += 1
+        completed += 1
+    conn.close()
+    results.put((completed, errors))
+
+
+def run_level(workdir: str, workers: int, port: int, clients: int, duration: float):
+    server = subprocess.Popen(
+        [sys.executable, "main.py", "--workers", str(workers), "--port", str(port)],
+        cwd=workdir,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_ready(port)
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=client, args=(port, duration, results))
+            for _ in range(clients)
+        ]
+        for process in processes:
+            process.start()
+        totals = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    completed = sum(done for done, _ in totals)
+    errors = sum(failed for _, failed in totals)
+    return completed / duration, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    print(f"cpu_count={os.cpu_count()} clients={args.clients}")
+    print(f"{'workers':>8}{'req/s':>12}{'speedup':>10}{'5xx':>8}")
+    baseline = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in os.listdir(ROOT):
+            if name.endswith(".py") or name in ("data.db", "source.sql"):
+                shutil.copy(os.path.join(ROOT, name), tmp)
+        for workers in args.workers:
+            throughput, errors = run_level(
+                tmp, workers, args.port, args.clients, args.duration
+            )
+            baseline = baseline or throughput
+            print(
+                f"{workers:>8}{throughput:>12.1f}{throughput / baseline:>9.2f}x"
+                f"{errors:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+"""
+Generates a synthetic data.db at a configurable scale from source.sql.
+
+Partners get service areas, vehicles and one driver per vehicle; users get a
+payment method each; bookings span the last 180 days in every status, with
+status history, fare calculations and reviews for about half of the completed
+rides. Driver ratings and partner stats rollups are then rebuilt with the
+repo's own jobs, so the file looks like one the API wrote itself.
+
+    python benchmarks/generate_data.py --out /tmp/bench.db --scale medium
+    python benchmarks/generate_data.py --out /tmp/bench.db --bookings 2000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCALES = {
+    "small": {
+        "partners": 20,
+        "vehicles_per_partner": 10,
+        "users": 500,
+        "bookings": 5_000,
+    },
+    "medium": {
+        "partners": 200,
+        "vehicles_per_partner": 25,
+        "users": 20_000,
+        "bookings": 200_000,
+    },
+    "large": {
+        "partners": 1_000,
+        "vehicles_per_partner": 50,
+        "users": 200_000,
+        "bookings": 2_000_000,
+    },
+}
+
+# (city, region, latitude, longitude)
+CITIES = [
+    ("Mumbai", "Maharashtra", 19.0760, 72.8777),
+    ("Pune", "Maharashtra", 18.5204, 73.8567),
+    ("Delhi", "Delhi", 28.6139, 77.2090),
+    ("Gurgaon", "Haryana", 28.4595, 77.0266),
+    ("Bangalore", "Karnataka", 12.9716, 77.5946),
+    ("Chennai", "Tamil Nadu", 13.0827, 80.2707),
+    ("Hyderabad", "Telangana", 17.3850, 78.4867),
+    ("Kolkata", "West Bengal", 22.5726, 88.3639),
+]
+WORDS = ["City", "Quick", "Metro", "Royal", "Green", "Star", "Urban", "Swift"]
+SUFFIXES = ["Cabs", "Rides", "Taxis", "Travels", "Mobility"]
+VEHICLE_MODELS = {
+    "Sedan": [("Toyota", "Corolla"), ("Hyundai", "Verna"), ("Honda", "City")],
+    "SUV": [("Honda", "CR-V"), ("Mahindra", "XUV500"), ("Toyota", "Innova")],
+    "Hatchback": [("Maruti", "Swift"), ("Hyundai", "i20"), ("Tata", "Altroz")],
+}
+COLORS = ["White", "Black", "Silver", "Red", "Blue", "Grey"]
+DRIVER_STATUSES = ["online", "online", "available", "offline", "on_break"]
+
+# Final booking status distribution
+BOOKING_STATUSES = [
+    ("completed", 70),
+    ("cancelled", 15),
+    ("searching", 3),
+    ("confirmed", 5),
+    ("driver_arrived", 2),
+    ("ongoing", 5),
+]
+
+BATCH_SIZE = 10_000
+
+
+def _insert(conn, sql: str, rows):
+    """
+    executemany in batches from any iterable of row tuples.
+    """
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            conn.executemany(sql, batch)
+            batch.clear()
+    if batch:
+        conn.executemany(sql, batch)
+
+
+def _timestamp(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def build_database(
+    path: str,
+    partners: int,
+    vehicles_per_partner: int,
+    users: int,
+    bookings: int,
+    seed: int = 42,
+) -> dict:
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    with open(os.path.join(ROOT, "source.sql")) as f:
+        conn.executescript(f.read())
+
+    partner_ids = [f"bench_partner_{i:06d}" for i in range(partners)]
+    _insert(
+        conn,
+        "INSERT INTO partners (partner_id, name, phone, email, address) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (
+            (
+                partner_id,
+                f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(SUFFIXES)}",
+                f"7{i:09d}",
+                f"{partner_id}@bench.test",
+                f"{rng.randint(1, 999)} Ring Road, {rng.choice(CITIES)[0]}",
+            )
+            for i, partner_id in enumerate(partner_ids)
+        ),
+    )
+    _insert(
+        conn,
+        "INSERT INTO partner_service_areas (partner_id, city, region, country, "
+        "center_latitude, center_longitude, radius_km) VALUES (?, ?, ?, 'India', ?, ?, ?)",
+        (
+            (partner_id, city, region, latitude, longitude, 25.0)
+            for partner_id in partner_ids
+            for city, region, latitude, longitude in rng.sample(
+                CITIES, rng.randint(1, 3)
+            )
+        ),
+    )
+
+    # One driver per vehicle: (driver_id, vehicle_id, vehicle_type)
+    fleet = []
+    vehicle_rows = []
+    driver_rows = []
+    for partner_id in partner_ids:
+        for _ in range(vehicles_per_partner):
+            n = len(fleet)
+            vehicle_type = rng.choice(list(VEHICLE_MODELS))
+            make, model = rng.choice(VEHICLE_MODELS[vehicle_type])
+            vehicle_id = f"bench_veh_{n:07d}"
+            driver_id = f"bench_drv_{n:07d}"
+            vehicle_rows.append(
+                (
+                    vehicle_id,
+                    partner_id,
+                    vehicle_type,
+                    make,
+                    model,
+                    rng.choice(COLORS),
+                    f"BN{n:08d}",
+                )
+            )
+            driver_rows.append(
+                (
+                    driver_id,
+                    partner_id,
+                    vehicle_id,
+                    "Driver",
+                    f"No{n}",
+                    f"6{n:09d}",
+                    f"{driver_id}@bench.test",
+                    f"LIC{n:09d}",
+                    rng.choice(DRIVER_STATUSES),
+                )
+            )
+            fleet.append((driver_id, vehicle_id, vehicle_type))
+    _insert(
+        conn,
+        "INSERT INTO vehicles (vehicle_id, partner_id, type, make, model, color, "
+        "registration) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        vehicle_rows,
+    )
+    _insert(
+        conn,
+        "INSERT INTO drivers (driver_id, partner_id, vehicle_id, first_name, "
+        "last_name, phone, email, license_number, status) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        driver_rows,
+    )
+
+    _insert(
+        conn,
+        "INSERT INTO users (user_id, name, phone, email) VALUES (?, ?, ?, ?)",
+        (
+            (f"bench_user_{i:07d}", f"User {i}", f"5{i:09d}", f"u{i}@bench.test")
+            for i in range(users)
+        ),
+    )
+    _insert(
+        conn,
+        "INSERT INTO payment_methods (payment_method_id, user_id, method_type, "
+        "details, is_default) VALUES (?, ?, 'upi', ?, 1)",
+        (
+            (f"bench_pay_{i:07d}", f"bench_user_{i:07d}", f'{{"upi_id": "u{i}@upi"}}')
+            for i in range(users)
+        ),
+    )
+
+    statuses = [status for status, _ in BOOKING_STATUSES]
+    weights = [weight for _, weight in BOOKING_STATUSES]
+    now = datetime.now(timezone.utc)
+    booking_rows = []
+    history_rows = []
+    fare_rows = []
+    review_rows = []
+    for n in range(bookings):
+        booking_id = f"bench_booking_{n:08d}"
+        user = rng.randrange(users)
+        status = rng.choices(statuses, weights)[0]
+        created = now - timedelta(seconds=rng.randrange(180 * 24 * 3600))
+        city, _, latitude, longitude = rng.choice(CITIES)
+        distance = round(rng.uniform(1.0, 30.0), 2)
+        duration = int(distance * 2.5)
+        fare = round((50 + distance * 12 + duration * 1.5) * 1.05, 2)
+        driver_id = vehicle_id = None
+        vehicle_type = rng.choice(list(VEHICLE_MODELS))
+        if status != "searching":
+            driver_id, vehicle_id, vehicle_type = rng.choice(fleet)
+        completed = status == "completed"
+        booking_rows.append(
+            (
+                booking_id,
+                f"bench_user_{user:07d}",
+                driver_id,
+                vehicle_id,
+                status,
+                latitude + rng.uniform(-0.1, 0.1),
+                longitude + rng.uniform(-0.1, 0.1),
+                f"Pickup {n}, {city}",
+                latitude + rng.uniform(-0.1, 0.1),
+                longitude + rng.uniform(-0.1, 0.1),
+                f"Dropoff {n}, {city}",
+                vehicle_type,
+                f"bench_pay_{user:07d}",
+                fare,
+                fare if completed else None,
+                50.0 if status == "cancelled" and rng.random() < 0.3 else None,
+                distance,
+                duration,
+                distance if completed else None,
+                duration + rng.randint(-3, 10) if completed else None,
+                _timestamp(created),
+                _timestamp(created + timedelta(minutes=duration + 5)),
+            )
+        )
+        history_rows.append((booking_id, "searching", _timestamp(created)))
+        if status != "searching":
+            history_rows.append(
+                (booking_id, status, _timestamp(created + timedelta(minutes=duration)))
+            )
+        fare_rows.append(
+            (
+                booking_id,
+                50.0,
+                round(distance * 12, 2),
+                duration * 1.5,
+                round(fare / 1.05 * 0.05, 2),
+                fare,
+            )
+        )
+        if completed and rng.random() < 0.5:
+            review_rows.append(
+                (
+                    f"bench_review_{n:08d}",
+                    booking_id,
+                    f"bench_user_{user:07d}",
+                    driver_id,
+                    rng.choices([1, 2, 3, 4, 5], [2, 3, 10, 35, 50])[0],
+                )
+            )
+        if len(booking_rows) == BATCH_SIZE or n == bookings - 1:
+            _flush_bookings(conn, booking_rows, history_rows, fare_rows, review_rows)
+    conn.commit()
+    conn.close()
+
+    # Aggregates the API maintains incrementally, rebuilt with its own jobs
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import create_engine
+
+    from partner_stats import rebuild_partner_stats
+    from ratings import recompute_driver_ratings
+
+    engine = create_engine(f"sqlite:///{path}")
+    recompute_driver_ratings(engine)
+    rebuild_partner_stats(engine)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    engine.dispose()
+
+    return {"partners": partner_ids, "fleet": fleet, "users": users}
+
+
+def _flush_bookings(conn, booking_rows, history_rows, fare_rows, review_rows):
+    conn.executemany(
+        """
+        INSERT INTO bookings (
+            booking_id, user_id, driver_id, vehicle_id, status,
+            pickup_latitude, pickup_longitude, pickup_address,
+            dropoff_latitude, dropoff_longitude, dropoff_address,
+            vehicle_type, payment_method_id, estimated_fare_amount,
+            actual_fare_amount, cancellation_fee_amount,
+            estimated_distance, estimated_duration, actual_distance,
+            actual_duration, created_at, updated_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        booking_rows,
+    )
+    conn.executemany(
+        "INSERT INTO booking_status_history (booking_id, status, created_at) "
+        "VALUES (?, ?, ?)",
+        history_rows,
+    )
+    conn.executemany(
+        "INSERT INTO fare_calculations (booking_id, base_fare, distance_charge, "
+        "time_charge, tax_amount, total_amount) VALUES (?, ?, ?, ?, ?, ?)",
+        fare_rows,
+    )
+    conn.executemany(
+        "INSERT INTO reviews (review_id, booking_id, user_id, driver_id, rating) "
+        "VALUES (?, ?, ?, ?, ?)",
+        review_rows,
+    )
+    for rows in (booking_rows, history_rows, fare_rows, review_rows):
+        rows.clear()
+
+
+def add_scale_arguments(parser):
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    for name in SCALES["small"]:
+        parser.add_argument(
+            f"--{name.replace('_', '-')}", type=int, help="Overrides --scale"
+        )
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def scale_from_args(args) -> dict:
+    scale = dict(SCALES[args.scale])
+    for name in scale:
+        value = getattr(args, name)
+        if value is not None:
+            scale[name] = value
+    return scale
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--out", default=os.path.join(ROOT, "bench.db"))
+    add_scale_arguments(parser)
+    args = parser.parse_args(argv)
+
+    scale = scale_from_args(args)
+    started = time.perf_counter()
+    build_database(args.out, seed=args.seed, **scale)
+    print(
+        f"wrote {args.out} ({', '.join(f'{k}={v:,}' for k, v in scale.items())}) "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
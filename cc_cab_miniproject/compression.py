@@ -0,0 +1,207 @@
+"""
+Negotiated response compression (brotli or gzip) above a size threshold.
+
+The encoding is picked from Accept-Encoding by q-value, brotli first on a
+tie. Brotli needs the optional `brotli` package; without it only gzip is
+offered. Only text and JSON bodies of at least COMPRESSION_MIN_BYTES are
+compressed, and every such response carries Vary: Accept-Encoding so shared
+caches keep the encodings apart.
+
+A compressed body is no longer byte-identical to the uncompressed one, so
+strong ETags are weakened (as nginx does); If-None-Match still matches them
+because it uses the weak comparison. Bodies over THREAD_MIN_BYTES are
+compressed in a worker thread to keep the event loop responsive.
+"""
+
+import asyncio
+import os
+import zlib
+from typing import List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+THREAD_MIN_BYTES = 256 * 1024
+GZIP_LEVEL = 6
+# Brotli's fast qualities suit dynamic responses; 11 is for static assets
+BROTLI_QUALITY = 4
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+# Preferred first when Accept-Encoding gives them the same q-value
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    The supported encoding with the highest q-value, or None.
+    """
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[coding.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for coding in SUPPORTED_ENCODINGS:
+        quality = weights.get(coding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class _Compressor:
+    """
+    Incremental compressor for one response body.
+    """
+
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self.compress = compressor.process
+            self.finish = compressor.finish
+        else:
+            # wbits=31 writes the gzip container
+            compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self.compress = compressor.compress
+            self.finish = compressor.flush
+
+
+def compress_body(encoding: str, body: bytes) -> bytes:
+    compressor = _Compressor(encoding)
+    return compressor.compress(body) + compressor.finish()
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        accept_encoding = _header(scope["headers"], b"accept-encoding")
+        encoding = (
+            choose_encoding(accept_encoding.decode("latin-1"))
+            if accept_encoding
+            else None
+        )
+
+        start = None
+        compressor = None
+        # Body chunks held back until the encoding decision can be made
+        pending: List[bytes] = []
+        pending_size = 0
+        expected_size = None
+
+        async def passthrough(headers, message):
+            nonlocal start
+            start["headers"] = headers
+            await send(start)
+            start = None
+            if pending:
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": b"".join(pending),
+                        "more_body": True,
+                    }
+                )
+                pending.clear()
+            await send(message)
+
+        async def compressing_send(message):
+            nonlocal start, compressor, pending_size, expected_size
+            if message["type"] == "http.response.start":
+                # Held back until the body shows whether it is worth compressing
+                start = message
+                length = _header(start.get("headers", ()), b"content-length")
+                expected_size = int(length) if length is not None else None
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+            if compressor is not None:
+                # Later chunks of a compressed streaming response
+                chunk = compressor.compress(message.get("body", b""))
+                if not message.get("more_body", False):
+                    chunk += compressor.finish()
+                return await send(dict(message, body=chunk))
+            if start is None:
+                return await send(message)
+
+            headers = list(start.get("headers", ()))
+            content_type = (_header(headers, b"content-type") or b"").decode("latin-1")
+            compressible = content_type.startswith(COMPRESSIBLE_TYPES) and (
+                _header(headers, b"content-encoding") is None
+            )
+            if compressible and not pending:
+                headers.append((b"vary", b"Accept-Encoding"))
+                start["headers"] = headers
+            if (
+                not compressible
+                or encoding is None
+                or (expected_size is not None and expected_size < self.minimum_size)
+            ):
+                return await passthrough(headers, message)
+
+            pending.append(message.get("body", b""))
+            pending_size += len(pending[-1])
+            more_body = message.get("more_body", False)
+            if more_body and (
+                # The full body's size is known: wait for all of it
+                expected_size is not None
+                or pending_size < self.minimum_size
+            ):
+                return
+            if not more_body and pending_size < self.minimum_size:
+                last = pending.pop()
+                return await passthrough(headers, dict(message, body=last))
+
+            etag = _header(headers, b"etag")
+            headers = [
+                (key, value)
+                for key, value in headers
+                if key.lower() not in (b"content-length", b"etag")
+            ]
+            if etag is not None:
+                headers.append(
+                    (b"etag", etag if etag.startswith(b"W/") else b"W/" + etag)
+                )
+            headers.append((b"content-encoding", encoding.encode()))
+            body = b"".join(pending)
+            pending.clear()
+
+            if more_body:
+                # Streaming response of unknown size: compressed chunk by chunk
+                compressor = _Compressor(encoding)
+                start["headers"] = headers
+                await send(start)
+                start = None
+                return await send(dict(message, body=compressor.compress(body)))
+
+            if len(body) >= THREAD_MIN_BYTES:
+                compressed = await asyncio.to_thread(compress_body, encoding, body)
+            else:
+                compressed = compress_body(encoding, body)
+            headers.append((b"content-length", str(len(compressed)).encode()))
+            start["headers"] = headers
+            await send(start)
+            start = None
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, compressing_send)
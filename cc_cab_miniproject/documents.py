@@ -0,0 +1,355 @@
+"""
+Compliance documents for partners, vehicles and drivers, and the scheduler
+that takes owners offline when their verified documents expire.
+
+expiry_date is stored as an ISO 'YYYY-MM-DD' string (valid through that day)
+so it sorts and range-scans correctly on the
+(verification_status, expiry_date) indexes.
+"""
+
+import asyncio
+import heapq
+import logging
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger("cab.documents")
+
+
+class DocumentKind(NamedTuple):
+    table: str
+    owner_column: str
+    document_types: Tuple[str, ...]
+
+
+DOCUMENT_KINDS: Dict[str, DocumentKind] = {
+    "partner": DocumentKind(
+        "partner_documents",
+        "partner_id",
+        ("business_license", "insurance", "tax_certificate", "other"),
+    ),
+    "vehicle": DocumentKind(
+        "vehicle_documents",
+        "vehicle_id",
+        ("registration", "insurance", "fitness_certificate", "permit", "other"),
+    ),
+    "driver": DocumentKind(
+        "driver_documents",
+        "driver_id",
+        ("driving_license", "identity", "background_check", "other"),
+    ),
+}
+
+# Formats seen in legacy free-text expiry_date values, tried in order
+LEGACY_DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%d-%m-%Y", "%d/%m/%Y", "%d %b %Y")
+
+# Longest the scheduler sleeps before re-checking the calendar date
+MAX_SLEEP_SECONDS = 3600
+# How often owners left on a ride at expiry are tried again
+RIDE_RETRY_SECONDS = 60
+
+
+def today_utc() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def normalize_expiry(value) -> Optional[str]:
+    """
+    Converts a date/datetime/legacy string to 'YYYY-MM-DD'; None if unparseable.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    value = str(value).strip()
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).date().isoformat()
+    except ValueError:
+        pass
+    for fmt in LEGACY_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def normalize_stored_expiry_dates(conn):
+    """
+    Rewrites non-ISO expiry_date values in place (used by migrations).
+    """
+    for kind in DOCUMENT_KINDS.values():
+        rows = conn.execute(text(f"""
+                SELECT document_id, expiry_date FROM {kind.table}
+                WHERE expiry_date IS NOT NULL
+                  AND expiry_date NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+            """)).all()
+        for document_id, raw in rows:
+            normalized = normalize_expiry(raw)
+            if normalized is None:
+                logger.warning(
+                    "Could not parse expiry_date %r of %s %s",
+                    raw,
+                    kind.table,
+                    document_id,
+                )
+                continue
+            conn.execute(
+                text(
+                    f"UPDATE {kind.table} SET expiry_date = :expiry_date "
+                    "WHERE document_id = :document_id"
+                ),
+                {"expiry_date": normalized, "document_id": document_id},
+            )
+
+
+def expire_owner(conn, kind: str, owner_id: str) -> Tuple[List[str], bool]:
+    """
+    Takes the owner of an expired document offline.
+
+    Vehicle documents take the vehicle (and its driver) offline, driver
+    documents the driver, and partner documents the partner's whole fleet.
+    Drivers and vehicles in the middle of a ride are left alone. Returns the
+    IDs of drivers whose status changed, and whether any were left on a ride
+    (the caller tries again once the ride is over).
+    """
+    if kind == "vehicle":
+        vehicle_filter = "vehicle_id = :owner_id"
+        driver_filter = "vehicle_id = :owner_id"
+    elif kind == "driver":
+        vehicle_filter = None
+        driver_filter = "driver_id = :owner_id"
+    else:
+        vehicle_filter = "partner_id = :owner_id"
+        driver_filter = "partner_id = :owner_id"
+
+    params = {"owner_id": owner_id}
+    if vehicle_filter:
+        conn.execute(
+            text(
+                f"UPDATE vehicles SET status = 'offline' "
+                f"WHERE {vehicle_filter} AND status = 'available'"
+            ),
+            params,
+        )
+    driver_ids = [
+        row[0]
+        for row in conn.execute(
+            text(f"""
+                SELECT driver_id FROM drivers
+                WHERE {driver_filter} AND status NOT IN ('offline', 'on_ride')
+            """),
+            params,
+        )
+    ]
+    if driver_ids:
+        conn.execute(
+            text("UPDATE drivers SET status = 'offline' WHERE driver_id = :driver_id"),
+            [{"driver_id": driver_id} for driver_id in driver_ids],
+        )
+    riding = conn.execute(
+        text(f"SELECT 1 FROM drivers WHERE {driver_filter} AND status = 'on_ride'"),
+        params,
+    ).first()
+    if vehicle_filter and not riding:
+        riding = conn.execute(
+            text(
+                f"SELECT 1 FROM vehicles WHERE {vehicle_filter} AND status = 'on_ride'"
+            ),
+            params,
+        ).first()
+    return driver_ids, riding is not None
+
+
+def expired_document_type(conn, kind: str, owner_id: str, today: date) -> Optional[str]:
+    """
+    A document type whose latest verified document expired before today, if
+    the owner has one (the scheduler's view of the owner, read from the
+    table).
+    """
+    kind_info = DOCUMENT_KINDS[kind]
+    return conn.execute(
+        text(f"""
+            SELECT document_type FROM {kind_info.table}
+            WHERE {kind_info.owner_column} = :owner_id
+              AND verification_status = 'verified' AND expiry_date IS NOT NULL
+            GROUP BY document_type
+            HAVING MAX(expiry_date) < :today
+            LIMIT 1
+        """),
+        {"owner_id": owner_id, "today": today.isoformat()},
+    ).scalar()
+
+
+class ExpiryScheduler:
+    """
+    Min-heap of upcoming document expiries.
+
+    Tracks the latest verified expiry per (kind, owner, document type), so a
+    renewed document supersedes the old one. Heap entries are invalidated
+    lazily: a popped entry only fires if it still matches the current expiry.
+    An expiry that found its owner on a ride, or failed to apply, stays in
+    _riding and fires again every RIDE_RETRY_SECONDS until it takes effect
+    or is renewed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[str, str, str, str]] = []
+        self._current: Dict[Tuple[str, str, str], str] = {}
+        self._riding: Dict[Tuple[str, str, str], str] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def load(self, conn):
+        with self._lock:
+            self._heap.clear()
+            self._current.clear()
+            self._riding.clear()
+        for kind_name, kind in DOCUMENT_KINDS.items():
+            rows = conn.execute(text(f"""
+                    SELECT {kind.owner_column}, document_type, MAX(expiry_date)
+                    FROM {kind.table}
+                    WHERE verification_status = 'verified' AND expiry_date IS NOT NULL
+                    GROUP BY {kind.owner_column}, document_type
+                """)).all()
+            for owner_id, document_type, expiry_date in rows:
+                self.set_expiry(kind_name, owner_id, document_type, expiry_date)
+
+    def set_expiry(
+        self, kind: str, owner_id: str, document_type: str, expiry_date: Optional[str]
+    ):
+        """
+        Sets the latest verified expiry for (kind, owner, document type);
+        None stops tracking it (e.g. its only verified document was rejected).
+        """
+        key = (kind, owner_id, document_type)
+        with self._lock:
+            if self._riding.get(key, expiry_date) != expiry_date:
+                # Renewed or rejected while waiting for a ride to end
+                del self._riding[key]
+            if not expiry_date:
+                self._current.pop(key, None)
+                return
+            if self._current.get(key) == expiry_date:
+                return
+            self._current[key] = expiry_date
+            is_earliest = not self._heap or expiry_date < self._heap[0][0]
+            heapq.heappush(self._heap, (expiry_date, kind, owner_id, document_type))
+        # Also called from worker threads (state sync), and asyncio.Event is
+        # not thread-safe: set it on its own loop
+        if is_earliest and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def __len__(self) -> int:
+        return len(self._current)
+
+    def next_expiry(self) -> Optional[str]:
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, today: date) -> List[Tuple[str, str, str, str]]:
+        """
+        Removes and returns (kind, owner_id, document_type, expiry_date) for
+        every document that expired before today, plus those waiting for a
+        ride to end. Only the heap head is inspected, never the full set.
+        """
+        today_iso = today.isoformat()
+        with self._lock:
+            due = [key + (expiry_date,) for key, expiry_date in self._riding.items()]
+            self._riding.clear()
+            while self._heap and self._heap[0][0] < today_iso:
+                expiry_date, kind, owner_id, document_type = heapq.heappop(self._heap)
+                key = (kind, owner_id, document_type)
+                if self._current.get(key) != expiry_date:
+                    continue  # superseded by a renewal or a rejection
+                del self._current[key]
+                due.append((kind, owner_id, document_type, expiry_date))
+        return due
+
+    def retry_after_ride(self, expiries: List[Tuple[str, str, str, str]]):
+        """
+        Fires these expiries again later, unless renewed in the meantime.
+        """
+        with self._lock:
+            for kind, owner_id, document_type, expiry_date in expiries:
+                key = (kind, owner_id, document_type)
+                # A renewal since it fired is tracked in _current again
+                if key not in self._current:
+                    self._riding[key] = expiry_date
+
+    def seconds_until_next(self, now: datetime) -> float:
+        next_expiry = self.next_expiry()
+        if next_expiry is None:
+            return MAX_SLEEP_SECONDS
+        # A document is valid through its expiry date (UTC)
+        expires_at = datetime.combine(
+            date.fromisoformat(next_expiry) + timedelta(days=1),
+            datetime.min.time(),
+            tzinfo=timezone.utc,
+        )
+        return min(max((expires_at - now).total_seconds(), 0), MAX_SLEEP_SECONDS)
+
+    async def run(self, engine, on_expired: Callable[[List[str]], None]):
+        """
+        Sleeps until the next expiry (or a newly tracked earlier one), then
+        takes the affected owners offline.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        while True:
+            due = self.pop_due(today_utc())
+            if due:
+                try:
+                    driver_ids, riding = await asyncio.to_thread(
+                        self._expire, engine, due
+                    )
+                except Exception:
+                    # e.g. "database is locked": already popped, so queue the
+                    # whole lot for the next retry instead of dropping it
+                    logger.exception("Document expiry failed; will retry")
+                    self.retry_after_ride(due)
+                else:
+                    self.retry_after_ride(riding)
+                    try:
+                        on_expired(driver_ids)
+                    except Exception:
+                        logger.exception("Publishing expired drivers failed")
+            timeout = self.seconds_until_next(datetime.now(timezone.utc))
+            if self._riding:
+                timeout = min(timeout, RIDE_RETRY_SECONDS)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    @staticmethod
+    def _expire(
+        engine, due: List[Tuple[str, str, str, str]]
+    ) -> Tuple[List[str], List[Tuple[str, str, str, str]]]:
+        """
+        Takes the owners of due expiries offline; returns the drivers taken
+        offline and the expiries whose owner is still on a ride.
+        """
+        driver_ids = []
+        riding = []
+        with engine.begin() as conn:
+            for expiry in due:
+                kind, owner_id = expiry[0], expiry[1]
+                logger.info(
+                    "Document expired for %s %s; taking it offline", kind, owner_id
+                )
+                changed, on_ride = expire_owner(conn, kind, owner_id)
+                driver_ids.extend(changed)
+                if on_ride:
+                    riding.append(expiry)
+        return driver_ids, riding
+
+
+expiry_scheduler = ExpiryScheduler()
@@ -0,0 +1,196 @@
+"""
+In-memory driver availability registry.
+
+Keeps one compact record per driver, indexed by (vehicle type, status), so
+matching and supply counts never have to query SQLite. Handlers refresh it
+through state_sync right after committing a driver/vehicle/partner write.
+"""
+
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+# Driver statuses that count as free for a new ride
+MATCHABLE_STATUSES = ("online", "available")
+
+LOAD_QUERY = """
+    SELECT d.driver_id, d.partner_id, d.vehicle_id, v.type AS vehicle_type, d.status
+    FROM drivers d
+    LEFT JOIN vehicles v ON v.vehicle_id = d.vehicle_id
+"""
+
+
+class DriverRecord:
+    __slots__ = ("driver_id", "partner_id", "vehicle_id", "vehicle_type", "status")
+
+    def __init__(self, driver_id, partner_id, vehicle_id, vehicle_type, status):
+        self.driver_id = driver_id
+        self.partner_id = partner_id
+        self.vehicle_id = vehicle_id
+        self.vehicle_type = vehicle_type
+        self.status = status
+
+
+class DriverRegistry:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._drivers: Dict[str, DriverRecord] = {}
+        self._by_type_status: Dict[Tuple[Optional[str], str], Set[str]] = defaultdict(
+            set
+        )
+        self._by_vehicle: Dict[str, Set[str]] = defaultdict(set)
+        self._by_partner: Dict[str, Set[str]] = defaultdict(set)
+
+    # --- Maintenance ---
+
+    def load(self, conn):
+        """
+        Rebuilds the registry from the drivers table.
+        """
+        rows = conn.execute(text(LOAD_QUERY)).mappings().all()
+        with self._lock:
+            self._drivers.clear()
+            self._by_type_status.clear()
+            self._by_vehicle.clear()
+            self._by_partner.clear()
+            for row in rows:
+                self._insert(DriverRecord(**row))
+
+    def refresh_driver(self, conn, driver_id: str):
+        """
+        Re-reads one driver after a write (or drops it if it no longer exists).
+        """
+        row = (
+            conn.execute(
+                text(LOAD_QUERY + " WHERE d.driver_id = :driver_id"),
+                {"driver_id": driver_id},
+            )
+            .mappings()
+            .first()
+        )
+        with self._lock:
+            self._discard(driver_id)
+            if row:
+                self._insert(DriverRecord(**row))
+
+    def remove_driver(self, driver_id: str):
+        with self._lock:
+            self._discard(driver_id)
+
+    def remove_partner(self, partner_id: str):
+        with self._lock:
+            for driver_id in list(self._by_partner.get(partner_id, ())):
+                self._discard(driver_id)
+
+    def set_status(self, driver_id: str, status: str):
+        with self._lock:
+            record = self._drivers.get(driver_id)
+            if record is None or record.status == status:
+                return
+            self._unindex(record)
+            record.status = status
+            self._index(record)
+
+    def refresh_partner(self, conn, partner_id: str):
+        """
+        Re-reads every driver of a partner (or drops them after a delete).
+        """
+        rows = (
+            conn.execute(
+                text(LOAD_QUERY + " WHERE d.partner_id = :partner_id"),
+                {"partner_id": partner_id},
+            )
+            .mappings()
+            .all()
+        )
+        with self._lock:
+            for driver_id in list(self._by_partner.get(partner_id, ())):
+                self._discard(driver_id)
+            for row in rows:
+                self._insert(DriverRecord(**row))
+
+    def refresh_vehicle(self, conn, vehicle_id: str):
+        """
+        Re-reads the drivers linked to a vehicle after its type changed or it
+        was deleted (drivers.vehicle_id is then SET NULL by the schema).
+        """
+        assigned = conn.execute(
+            text("SELECT driver_id FROM drivers WHERE vehicle_id = :vehicle_id"),
+            {"vehicle_id": vehicle_id},
+        ).scalars()
+        with self._lock:
+            driver_ids = set(self._by_vehicle.get(vehicle_id, ())) | set(assigned)
+        for driver_id in driver_ids:
+            self.refresh_driver(conn, driver_id)
+
+    def _insert(self, record: DriverRecord):
+        self._drivers[record.driver_id] = record
+        self._by_partner[record.partner_id].add(record.driver_id)
+        if record.vehicle_id:
+            self._by_vehicle[record.vehicle_id].add(record.driver_id)
+        self._index(record)
+
+    def _discard(self, driver_id: str):
+        record = self._drivers.pop(driver_id, None)
+        if record is None:
+            return
+        self._unindex(record)
+        self._discard_from(self._by_partner, record.partner_id, driver_id)
+        if record.vehicle_id:
+            self._discard_from(self._by_vehicle, record.vehicle_id, driver_id)
+
+    def _index(self, record: DriverRecord):
+        self._by_type_status[(record.vehicle_type, record.status)].add(record.driver_id)
+
+    def _unindex(self, record: DriverRecord):
+        key = (record.vehicle_type, record.status)
+        self._discard_from(self._by_type_status, key, record.driver_id)
+
+    @staticmethod
+    def _discard_from(mapping, key, driver_id):
+        bucket = mapping.get(key)
+        if bucket is not None:
+            bucket.discard(driver_id)
+            if not bucket:
+                del mapping[key]
+
+    # --- Reads ---
+
+    def __len__(self) -> int:
+        return len(self._drivers)
+
+    def get(self, driver_id: str) -> Optional[DriverRecord]:
+        return self._drivers.get(driver_id)
+
+    def available_drivers(self, vehicle_type: str, limit: int = 10) -> List[str]:
+        """
+        IDs of drivers free to take a ride in a vehicle of the given type.
+        """
+        with self._lock:
+            found = []
+            for status in MATCHABLE_STATUSES:
+                for driver_id in self._by_type_status.get((vehicle_type, status), ()):
+                    found.append(driver_id)
+                    if len(found) >= limit:
+                        return found
+            return found
+
+    def supply_counts(
+        self, vehicle_type: Optional[str] = None
+    ) -> Dict[str, Dict[str, int]]:
+        """
+        Driver counts per vehicle type and status, e.g. {"Sedan": {"online": 3}}.
+        Drivers without a vehicle are reported under "unassigned".
+        """
+        with self._lock:
+            counts: Dict[str, Dict[str, int]] = defaultdict(dict)
+            for (v_type, status), driver_ids in self._by_type_status.items():
+                if vehicle_type is not None and v_type != vehicle_type:
+                    continue
+                counts[v_type or "unassigned"][status] = len(driver_ids)
+            return dict(counts)
+
+
+driver_registry = DriverRegistry()
@@ -0,0 +1,90 @@
+"""
+Strong ETags and conditional GETs for the reads front-ends poll.
+
+A handler runs one cheap version lookup, builds the tag from it and answers
+If-None-Match with 304 before running its full queries and serialisation.
+Versions start from updated_at, but SQLite's CURRENT_TIMESTAMP has
+one-second resolution, so they also include the row's other rendered
+columns; two writes in the same second still change the tag.
+
+A partner's response lists its vehicles, so its version also includes the
+partner's fleet version: a counter in partner_fleet_versions that triggers
+on vehicles bump on every insert, update and delete.
+"""
+
+import hashlib
+from typing import Optional
+
+from fastapi import Response
+
+FLEET_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS partner_fleet_versions (
+        partner_id TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+_BUMP_FLEET_VERSION = """
+            INSERT INTO partner_fleet_versions (partner_id, version)
+            VALUES ({partner}.partner_id, 1)
+            ON CONFLICT (partner_id) DO UPDATE SET version = version + 1;"""
+
+FLEET_VERSION_TRIGGERS = {
+    "trigger_vehicles_fleet_version_insert": f"""
+        CREATE TRIGGER trigger_vehicles_fleet_version_insert
+        AFTER INSERT ON vehicles
+        BEGIN{_BUMP_FLEET_VERSION.format(partner="NEW")}
+        END
+    """,
+    "trigger_vehicles_fleet_version_update": f"""
+        CREATE TRIGGER trigger_vehicles_fleet_version_update
+        AFTER UPDATE ON vehicles
+        BEGIN{_BUMP_FLEET_VERSION.format(partner="OLD")}
+            INSERT INTO partner_fleet_versions (partner_id, version)
+            SELECT NEW.partner_id, 1 WHERE NEW.partner_id <> OLD.partner_id
+            ON CONFLICT (partner_id) DO UPDATE SET version = version + 1;
+        END
+    """,
+    "trigger_vehicles_fleet_version_delete": f"""
+        CREATE TRIGGER trigger_vehicles_fleet_version_delete
+        AFTER DELETE ON vehicles
+        BEGIN{_BUMP_FLEET_VERSION.format(partner="OLD")}
+        END
+    """,
+}
+
+
+def etag(*version) -> str:
+    """
+    Strong entity tag for a version tuple (row values as read).
+    """
+    digest = hashlib.blake2b(repr(version).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def matches(if_none_match: Optional[str], tag: str) -> bool:
+    """
+    If-None-Match uses the weak comparison, so W/ prefixes are ignored.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == tag:
+            return True
+    return False
+
+
+def not_modified(tag: str, cache_control: str) -> Response:
+    return Response(
+        status_code=304, headers={"ETag": tag, "Cache-Control": cache_control}
+    )
+
+
+def set_headers(response: Response, tag: str, cache_control: str):
+    response.headers["ETag"] = tag
+    response.headers["Cache-Control"] = cache_control
@@ -0,0 +1,75 @@
+"""
+Fare estimation shared by booking creation, destination changes and the fare
+quote endpoints, so a quoted fare is the fare a booking is created with.
+
+A fare is linear in the route: a base fare, a per-km distance charge and a
+per-minute time charge on the estimated duration, times the surge
+multiplier, plus tax. It does not depend on the vehicle type, so a batch of
+routes is quoted once per route and the quote is shared by every type.
+"""
+
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from geo import haversine_km
+
+BASE_FARE = 50.0
+DISTANCE_CHARGE_PER_KM = 12.0
+TIME_CHARGE_PER_MIN = 1.5
+# Rough duration estimate from the straight-line distance
+MINUTES_PER_KM = 2.5
+TAX_RATE = 0.05
+CURRENCY = "INR"
+
+
+class FareQuote(NamedTuple):
+    distance_km: float
+    duration_min: int
+    base_fare: float
+    distance_charge: float
+    time_charge: float
+    surge_multiplier: float
+    tax_amount: float
+    total: float
+
+    def breakdown(self) -> Dict[str, float]:
+        return {
+            "baseFare": round(self.base_fare, 2),
+            "distanceCharge": round(self.distance_charge, 2),
+            "timeCharge": round(self.time_charge, 2),
+            "surgeMultiplier": self.surge_multiplier,
+            "tax": round(self.tax_amount, 2),
+        }
+
+
+def quote(distance_km: float, surge_multiplier: float = 1.0) -> FareQuote:
+    duration_min = int(distance_km * MINUTES_PER_KM)
+    distance_charge = distance_km * DISTANCE_CHARGE_PER_KM
+    time_charge = duration_min * TIME_CHARGE_PER_MIN
+    before_tax = (BASE_FARE + distance_charge + time_charge) * surge_multiplier
+    tax_amount = before_tax * TAX_RATE
+    return FareQuote(
+        distance_km,
+        duration_min,
+        BASE_FARE,
+        distance_charge,
+        time_charge,
+        surge_multiplier,
+        tax_amount,
+        before_tax + tax_amount,
+    )
+
+
+def quote_route(
+    lat1: float, lon1: float, lat2: float, lon2: float, surge_multiplier: float = 1.0
+) -> FareQuote:
+    return quote(haversine_km(lat1, lon1, lat2, lon2), surge_multiplier)
+
+
+def quote_routes(
+    routes: Iterable[Tuple[float, float, float, float]],
+    surge_multiplier: float = 1.0,
+) -> List[FareQuote]:
+    """
+    Quotes many (pickup lat, lon, dropoff lat, lon) routes in one pass.
+    """
+    return [quote_route(*route, surge_multiplier) for route in routes]
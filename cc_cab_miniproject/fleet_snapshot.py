@@ -0,0 +1,275 @@
+"""
+In-memory columnar snapshot of fleet state for group-by counts.
+
+Every vehicle is one row in three typed arrays: partner code, vehicle type
+code and status code, each a small integer into a dictionary of the
+distinct values (about 9 bytes per vehicle instead of a Python object).
+Counts per (type, status), and per partner per (type, status), are kept
+up to date as rows change. A group-by therefore reads those counters,
+never the vehicles: by type and status it touches only a handful of
+entries, and by partner one small dict per partner.
+
+The snapshot follows the partner_fleet_versions counters that the vehicle
+triggers bump (see etags.py). Every FLEET_SNAPSHOT_INTERVAL seconds it
+reads the counters and reloads only the partners whose fleet changed, so
+writes from any code path and any worker show up within one interval.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from array import array
+from collections import defaultdict
+from datetime import datetime, timezone
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, text
+
+logger = logging.getLogger("cab.fleet_snapshot")
+
+FLEET_SNAPSHOT_INTERVAL = float(os.getenv("FLEET_SNAPSHOT_INTERVAL", "1.0"))
+# Partners reloaded per query when many fleets changed at once
+RELOAD_BATCH = 500
+
+VEHICLES_QUERY = "SELECT vehicle_id, partner_id, type, status FROM vehicles"
+VERSIONS_QUERY = "SELECT partner_id, version FROM partner_fleet_versions"
+
+GROUP_DIMENSIONS = ("partner", "type", "status")
+
+
+def _group_key(group_by: Sequence[str]):
+    """
+    Picks the grouped codes, as a tuple, out of a (partner, type, status) key.
+    """
+    positions = [GROUP_DIMENSIONS.index(name) for name in group_by]
+    if len(positions) == 1:
+        position = positions[0]
+        return lambda codes: (codes[position],)
+    if not positions:
+        return lambda codes: ()
+    return itemgetter(*positions)
+
+
+class _Dictionary:
+    """
+    Dense integer codes for the distinct values of one column.
+    """
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class FleetSnapshot:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._versions: Dict[str, int] = {}
+        self.refreshed_at: Optional[datetime] = None
+        self._reset()
+
+    def _reset(self):
+        self._partners = _Dictionary()
+        self._types = _Dictionary()
+        self._statuses = _Dictionary()
+        # Columns; row i is vehicle self._vehicle_ids[i]. vehicles.type is
+        # free text, so its codes get as many bytes as partners'; the status
+        # CHECK allows a handful of values, so one byte holds their codes
+        self._partner_col = array("i")
+        self._type_col = array("i")
+        self._status_col = array("B")
+        self._vehicle_ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        # Aggregates kept in step with the columns
+        self._by_type_status: Dict[Tuple[int, int], int] = defaultdict(int)
+        self._by_partner: Dict[int, Dict[Tuple[int, int], int]] = defaultdict(
+            lambda: defaultdict(int)
+        )
+        self._partner_vehicles: Dict[int, set] = defaultdict(set)
+
+    # --- Maintenance ---
+
+    def load(self, conn):
+        """
+        Rebuilds the snapshot from the vehicles table.
+        """
+        # Versions first: a write landing in between only causes a reload
+        versions = dict(conn.execute(text(VERSIONS_QUERY)).all())
+        rows = conn.execute(text(VEHICLES_QUERY)).all()
+        with self._lock:
+            self._reset()
+            for vehicle_id, partner_id, v_type, v_status in rows:
+                self._insert(vehicle_id, partner_id, v_type, v_status)
+            self._versions = versions
+            self.refreshed_at = datetime.now(timezone.utc)
+
+    def refresh(self, conn) -> int:
+        """
+        Reloads the partners whose fleet version moved; returns how many.
+        """
+        versions = dict(conn.execute(text(VERSIONS_QUERY)).all())
+        changed = [
+            partner_id
+            for partner_id, version in versions.items()
+            if self._versions.get(partner_id) != version
+        ]
+        for start in range(0, len(changed), RELOAD_BATCH):
+            batch = changed[start : start + RELOAD_BATCH]
+            rows = conn.execute(
+                text(VEHICLES_QUERY + " WHERE partner_id IN :partner_ids").bindparams(
+                    bindparam("partner_ids", expanding=True)
+                ),
+                {"partner_ids": batch},
+            ).all()
+            with self._lock:
+                for partner_id in batch:
+                    self._remove_partner(partner_id)
+                for vehicle_id, partner_id, v_type, v_status in rows:
+                    self._insert(vehicle_id, partner_id, v_type, v_status)
+        with self._lock:
+            self._versions = versions
+            self.refreshed_at = datetime.now(timezone.utc)
+        return len(changed)
+
+    def _insert(self, vehicle_id: str, partner_id: str, v_type: str, v_status: str):
+        if vehicle_id in self._rows:
+            # Moved from another partner not reloaded yet
+            self._remove(vehicle_id)
+        p = self._partners.encode(partner_id)
+        t = self._types.encode(v_type)
+        s = self._statuses.encode(v_status)
+        # Columns first, so a code that does not fit leaves every column and
+        # the row index as they were
+        row = len(self._vehicle_ids)
+        try:
+            self._partner_col.append(p)
+            self._type_col.append(t)
+            self._status_col.append(s)
+        except OverflowError:
+            del self._partner_col[row:], self._type_col[row:], self._status_col[row:]
+            raise
+        self._rows[vehicle_id] = row
+        self._vehicle_ids.append(vehicle_id)
+        self._by_type_status[(t, s)] += 1
+        self._by_partner[p][(t, s)] += 1
+        self._partner_vehicles[p].add(vehicle_id)
+
+    def _remove(self, vehicle_id: str):
+        row = self._rows.pop(vehicle_id)
+        p, t, s = self._partner_col[row], self._type_col[row], self._status_col[row]
+        self._decrement(self._by_type_status, (t, s))
+        self._decrement(self._by_partner[p], (t, s))
+        if not self._by_partner[p]:
+            del self._by_partner[p]
+        self._partner_vehicles[p].discard(vehicle_id)
+        # Swap the last row into the hole so the columns stay dense
+        last = len(self._vehicle_ids) - 1
+        if row != last:
+            moved = self._vehicle_ids[last]
+            self._vehicle_ids[row] = moved
+            self._partner_col[row] = self._partner_col[last]
+            self._type_col[row] = self._type_col[last]
+            self._status_col[row] = self._status_col[last]
+            self._rows[moved] = row
+        self._vehicle_ids.pop()
+        self._partner_col.pop()
+        self._type_col.pop()
+        self._status_col.pop()
+
+    def _remove_partner(self, partner_id: str):
+        p = self._partners.codes.get(partner_id)
+        if p is None:
+            return
+        for vehicle_id in list(self._partner_vehicles.get(p, ())):
+            self._remove(vehicle_id)
+        self._partner_vehicles.pop(p, None)
+
+    @staticmethod
+    def _decrement(counts, key):
+        counts[key] -= 1
+        if not counts[key]:
+            del counts[key]
+
+    async def run(self, engine):
+        while True:
+            await asyncio.sleep(FLEET_SNAPSHOT_INTERVAL)
+            try:
+                await asyncio.to_thread(self._refresh_with, engine)
+            except Exception:
+                logger.exception("Fleet snapshot refresh failed; will retry")
+
+    def _refresh_with(self, engine):
+        with engine.connect() as conn:
+            self.refresh(conn)
+
+    # --- Reads ---
+
+    def __len__(self) -> int:
+        return len(self._vehicle_ids)
+
+    def group_counts(
+        self,
+        group_by: Sequence[str],
+        partner_id: Optional[str] = None,
+        vehicle_type: Optional[str] = None,
+        vehicle_status: Optional[str] = None,
+    ) -> List[Tuple[Dict[str, str], int]]:
+        """
+        Vehicle counts grouped by any of "partner", "type" and "status",
+        optionally filtered on each, largest groups first.
+        """
+        with self._lock:
+            t_filter = self._code_or_missing(self._types, vehicle_type)
+            s_filter = self._code_or_missing(self._statuses, vehicle_status)
+            if partner_id is not None:
+                p = self._partners.codes.get(partner_id)
+                partners: Iterable = (
+                    [(p, self._by_partner[p])] if p in self._by_partner else []
+                )
+            elif "partner" in group_by:
+                partners = self._by_partner.items()
+            else:
+                partners = [(None, self._by_type_status)]
+
+            group_key = _group_key(group_by)
+            groups: Dict[tuple, int] = defaultdict(int)
+            for p, counts in partners:
+                for (t, s), count in counts.items():
+                    if t_filter is not None and t != t_filter:
+                        continue
+                    if s_filter is not None and s != s_filter:
+                        continue
+                    groups[group_key((p, t, s))] += count
+
+            decoders = {
+                "partner": self._partners.values,
+                "type": self._types.values,
+                "status": self._statuses.values,
+            }
+            result = [
+                (
+                    {name: decoders[name][code] for name, code in zip(group_by, key)},
+                    count,
+                )
+                for key, count in groups.items()
+            ]
+        result.sort(key=lambda group: -group[1])
+        return result
+
+    @staticmethod
+    def _code_or_missing(dictionary: _Dictionary, value: Optional[str]):
+        if value is None:
+            return None
+        # An unknown value matches nothing
+        return dictionary.codes.get(value, -1)
+
+
+fleet_snapshot = FleetSnapshot()
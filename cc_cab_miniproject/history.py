@@ -0,0 +1,298 @@
+"""
+Write-behind booking status history.
+
+Status history rows are the most numerous writes the API makes and nothing
+reads them while a request runs, so handlers no longer insert them inline.
+A transition is queued when its booking write commits and a background
+task inserts the queued rows in batches with one executemany, every
+HISTORY_FLUSH_INTERVAL seconds or as soon as HISTORY_BATCH_SIZE are queued.
+
+Durability comes from a local journal. A transition's row is appended as
+one JSON line to this worker's current segment in HISTORY_JOURNAL_DIR just
+before its booking write commits, and fsynced unless HISTORY_FSYNC=0 (which
+only survives a crashed process, not power loss). A failed journal write
+fails the commit, so no booking write commits without its row. A rollback
+appends a discard line for the row instead of queueing it. A flush starts a
+new segment and deletes the old ones once every row journaled in them is
+committed or discarded.
+
+Segments left behind by a worker that died are replayed at the next
+startup. Replay skips rows already in the table, so a segment whose flush
+committed just before the crash is not inserted twice, and rows whose
+booking never reached their status, which a crash between journal write
+and commit leaves behind. Every segment is flock()ed by the worker writing
+it, so a worker never replays a live one.
+
+Rows carry the time of the transition, not of the flush, with microseconds,
+so a timeline ordered by created_at is right even when workers flush out
+of order. A timeline read merges in this worker's rows that are still
+queued; other workers' queued rows appear within one flush interval.
+"""
+
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger("cab.history")
+
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "0.5"))
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "500"))
+HISTORY_JOURNAL_DIR = os.getenv("HISTORY_JOURNAL_DIR", "history_journal")
+HISTORY_FSYNC = os.getenv("HISTORY_FSYNC", "1") == "1"
+
+# Bookings can be deleted (user or partner removal) before their rows flush
+INSERT_HISTORY = """
+    INSERT INTO booking_status_history (booking_id, status, created_at)
+    SELECT :booking_id, :status, :created_at
+    WHERE EXISTS (SELECT 1 FROM bookings WHERE booking_id = :booking_id)
+"""
+# A journaled row may belong to a commit the crash interrupted. The API
+# records only the first status, written with its booking, and terminal
+# ones a booking never leaves, so the booking's status tells which committed.
+REPLAY_HISTORY = INSERT_HISTORY + """
+      AND EXISTS (
+        SELECT 1 FROM bookings
+        WHERE booking_id = :booking_id
+          AND (status = :status OR :status = 'searching')
+      )
+      AND NOT EXISTS (
+        SELECT 1 FROM booking_status_history
+        WHERE booking_id = :booking_id AND status = :status
+          AND created_at = :created_at
+      )
+"""
+
+
+def history_entry(booking_id: str, status: str) -> Dict[str, str]:
+    created_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+    return {"booking_id": booking_id, "status": status, "created_at": created_at}
+
+
+def _entry_key(entry: Dict[str, str]) -> Tuple[str, str, str]:
+    return entry["booking_id"], entry["status"], entry["created_at"]
+
+
+class _Segment:
+    """
+    One journal file, locked by the worker appending to it.
+    """
+
+    def __init__(self, path: str, fd: int):
+        self.path = path
+        self.fd = fd
+        # Rows journaled here whose transaction has not ended yet
+        self.pending = 0
+
+    @classmethod
+    def create(cls, directory: str) -> "_Segment":
+        path = os.path.join(directory, f"{os.getpid()}-{uuid.uuid4().hex[:12]}")
+        fd = os.open(path + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        # Only visible to replay once locked
+        os.rename(path + ".tmp", path + ".jsonl")
+        return cls(path + ".jsonl", fd)
+
+    def append(self, entries: List[Dict[str, str]]):
+        os.write(self.fd, "".join(json.dumps(e) + "\n" for e in entries).encode())
+        if HISTORY_FSYNC:
+            os.fsync(self.fd)
+
+    def delete(self):
+        os.unlink(self.path)
+        os.close(self.fd)
+
+
+class StatusHistoryWriter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engine = None
+        self._directory = HISTORY_JOURNAL_DIR
+        self._segment: Optional[_Segment] = None
+        # Rows not yet flushed, oldest first, and the closed segments they
+        # are journaled in (the current segment holds the rest)
+        self._queued: List[Dict[str, str]] = []
+        self._closed_segments: List[_Segment] = []
+        # Rows a flush has taken but not committed yet
+        self._flushing: List[Dict[str, str]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        # One flush at a time (the shutdown flush may overlap the task's)
+        self._flush_lock = threading.Lock()
+
+    def configure(self, engine, directory: str = HISTORY_JOURNAL_DIR) -> int:
+        """
+        Replays segments orphaned by dead workers, then opens this worker's
+        own. Returns the number of rows replayed.
+        """
+        self._engine = engine
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+        replayed = self.replay()
+        self._segment = _Segment.create(directory)
+        return replayed
+
+    def replay(self) -> int:
+        replayed = 0
+        for path in sorted(glob.glob(os.path.join(self._directory, "*.jsonl"))):
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue  # replayed by another worker meanwhile
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue  # a live worker's segment
+            try:
+                if not os.path.exists(path):
+                    continue
+                with open(path) as f:
+                    rows, discarded = [], set()
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # A line torn by the crash was never acknowledged
+                            logger.warning("Skipping torn journal line in %s", path)
+                            continue
+                        if entry.pop("discarded", False):
+                            discarded.add(_entry_key(entry))
+                        else:
+                            rows.append(entry)
+                    rows = [row for row in rows if _entry_key(row) not in discarded]
+                if rows:
+                    with self._engine.begin() as conn:
+                        conn.execute(text(REPLAY_HISTORY), rows)
+                    replayed += len(rows)
+                os.unlink(path)
+            finally:
+                os.close(fd)
+        if replayed:
+            logger.info("Replayed %s journaled status history rows", replayed)
+        return replayed
+
+    def journal(self, entries: List[Dict[str, str]]) -> _Segment:
+        """
+        Journals the rows of a transaction about to commit; raises if the
+        journal cannot be written. Pass the returned segment to queue() once
+        the transaction commits, or to discard() if it rolls back.
+        """
+        with self._lock:
+            segment = self._segment
+            segment.append(entries)
+            segment.pending += len(entries)
+            return segment
+
+    def queue(self, segment: _Segment, entries: List[Dict[str, str]]):
+        with self._lock:
+            segment.pending -= len(entries)
+            self._queued.extend(entries)
+            full = len(self._queued) >= HISTORY_BATCH_SIZE
+        if full and self._wakeup is not None:
+            self._wakeup.set()
+
+    def discard(self, segment: _Segment, entries: List[Dict[str, str]]):
+        with self._lock:
+            try:
+                segment.append([dict(entry, discarded=True) for entry in entries])
+            finally:
+                segment.pending -= len(entries)
+
+    def queued_for(self, booking_id: str) -> List[Dict[str, str]]:
+        """
+        This worker's rows for booking_id that may not be in the table yet.
+        """
+        with self._lock:
+            return [
+                entry
+                for entry in self._flushing + self._queued
+                if entry["booking_id"] == booking_id
+            ]
+
+    def _take(self) -> Tuple[List[Dict[str, str]], List[_Segment]]:
+        with self._lock:
+            if not self._queued:
+                return [], []
+            rows, self._queued = self._queued, []
+            self._flushing = rows
+            # New rows go to a fresh segment; the old ones can go once
+            # everything journaled in them is committed. Rows of a
+            # transaction still open are not queued yet, so keep their
+            # segments for a later flush.
+            self._closed_segments.append(self._segment)
+            self._segment = _Segment.create(self._directory)
+            done = [s for s in self._closed_segments if not s.pending]
+            return rows, done
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        rows, segments = self._take()
+        if not rows:
+            return 0
+        try:
+            with self._engine.begin() as conn:
+                conn.execute(text(INSERT_HISTORY), rows)
+        except Exception:
+            with self._lock:
+                # Retried first on the next flush; still journaled meanwhile
+                self._queued = rows + self._queued
+                self._flushing = []
+            raise
+        with self._lock:
+            self._flushing = []
+            self._closed_segments = [
+                s for s in self._closed_segments if s not in segments
+            ]
+        for segment in segments:
+            segment.delete()
+        return len(rows)
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=HISTORY_FLUSH_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception:
+                logger.exception("Status history flush failed; will retry")
+
+    def close(self):
+        """
+        Flushes what is queued and removes this worker's empty segment.
+        """
+        if self._segment is None:
+            return
+        try:
+            self.flush()
+        except Exception:
+            # Left in the journal for the next startup to replay
+            logger.exception("Final status history flush failed")
+            return
+        with self._lock:
+            if (
+                not self._queued
+                and not self._closed_segments
+                and not self._segment.pending
+            ):
+                self._segment.delete()
+                self._segment = None
+
+
+status_history = StatusHistoryWriter()
@@ -0,0 +1,207 @@
+"""
+Structured JSON logging that never blocks the event loop.
+
+Loggers under "cab" ("cab.api", "cab.documents", "cab.slow_query", ...) hand
+their records to an in-memory queue; a listener thread formats them as one
+JSON object per line on stderr:
+
+    {"ts": "2025-01-01T12:00:00.123+00:00", "level": "ERROR", "logger": "cab.api",
+     "message": "Error creating partner", "requestId": "3f2c...", "route":
+     "/api/partners", "exception": "Traceback ..."}
+
+The calling thread only merges the message arguments and enqueues; if the
+queue is full the record is dropped rather than waited on. Every record
+carries the request ID (the X-Request-ID request header, else a generated
+one, echoed back on the response) and the route of the request that logged
+it. Warnings and below are sampled per message template: after
+SAMPLE_BURST records in SAMPLE_WINDOW_SECONDS the rest of the window is
+dropped and the next record that gets through reports how many were
+suppressed. Drops are counted in log_records_dropped_total on /metrics.
+benchmarks/bench_logging.py checks the per-call cost against its budget.
+
+LOG_LEVEL sets the level of the "cab" loggers (default INFO).
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+import metrics
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Records waiting for the listener; beyond this they are dropped
+QUEUE_SIZE = 10_000
+# Per message template, at most SAMPLE_BURST warnings per window are kept
+SAMPLE_WINDOW_SECONDS = 10.0
+SAMPLE_BURST = 10
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRIBUTES = frozenset(
+    vars(logging.LogRecord("", logging.INFO, "", 0, "", None, None))
+) | {"message", "asctime", "request_id", "route", "suppressed"}
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware binding each request's ID for the log records it emits.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                # Client-supplied IDs end up in log lines; keep them short
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        header = (REQUEST_ID_HEADER, request_id.encode("latin-1"))
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", ())) + [header]
+            await send(message)
+
+        token = _request_id.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            _request_id.reset(token)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "requestId": getattr(record, "request_id", None),
+            "route": getattr(record, "route", None),
+        }
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _ContextFilter(logging.Filter):
+    """
+    Stamps the request context on the record, in the thread that logs it.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        record.route = metrics.current_route()
+        return True
+
+
+class WarningSampler(logging.Filter):
+    """
+    Keeps the first `burst` records per message template and window at
+    WARNING and below; errors always pass.
+    """
+
+    def __init__(
+        self, burst: int = SAMPLE_BURST, window: float = SAMPLE_WINDOW_SECONDS
+    ):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._lock = threading.Lock()
+        # (logger, template) -> [window start, records kept, records dropped]
+        self._windows = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                dropped = state[2] if state else 0
+                self._windows[key] = [now, 1, 0]
+            elif state[1] < self.burst:
+                state[1] += 1
+                dropped, state[2] = state[2], 0
+            else:
+                state[2] += 1
+                metrics.log_records_dropped.inc(("sampled",))
+                return False
+        record.suppressed = dropped
+        return True
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now (they may change before the listener runs);
+        # formatting, tracebacks included, is left to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.log_records_dropped.inc(("queue_full",))
+
+
+_listener: Optional[QueueListener] = None
+
+
+def configure(stream=None):
+    """
+    Routes the "cab" loggers through the queue to a JSON stream handler
+    (stderr by default). Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    records = queue.Queue(QUEUE_SIZE)
+    handler = _NonBlockingQueueHandler(records)
+    handler.addFilter(WarningSampler())
+    handler.addFilter(_ContextFilter())
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter())
+    _listener = QueueListener(records, output)
+    _listener.start()
+    # Flush what is still queued when the process exits
+    atexit.register(_listener.stop)
+
+    # The JSON lines carry neither; skip collecting them on every record
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    logger = logging.getLogger("cab")
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(handler)
+    logger.propagate = False
@@ -1,34 +1,98 @@
 # --- START OF FILE main.py ---
-import math
+from startup import STARTUP_WARMUP, startup_timer, warm_up
+
+# With STARTUP_PROFILE=1, times every import below (see startup.py)
+startup_timer.profile_imports()
+
+import asyncio
+import base64
+import json
+import logging
 import os
 import uuid
-from datetime import datetime
-from typing import Any, List, Optional
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from fastapi import (
+    Body,
+    Depends,
+    FastAPI,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
 
-import uvicorn
-from fastapi import Body, Depends, FastAPI, HTTPException, Path, Query, status
 # Database imports
-from sqlalchemy import create_engine, text
+from sqlalchemy import bindparam, event, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session, sessionmaker
 
 # Assuming schema.py is in the same directory and contains the Pydantic models
 from schema import *
+from database import (
+    DATABASE_URL,
+    create_database_engine,
+    create_replica_engine,
+    describe_url,
+    is_sqlite,
+)
+from admission import AdmissionMiddleware
+from archive import archive_bookings, find_archived_booking, find_archived_rows
+from batch import run_batch
+from compression import CompressionMiddleware
+from documents import (
+    DOCUMENT_KINDS,
+    expired_document_type,
+    expiry_scheduler,
+    normalize_expiry,
+    today_utc,
+)
+from driver_registry import MATCHABLE_STATUSES, driver_registry
+from fares import CURRENCY, quote_route, quote_routes
+from fleet_snapshot import GROUP_DIMENSIONS, fleet_snapshot
+from history import history_entry, status_history
+import etags
+import logs
+import metrics
+import profiling
+from migrations import upgrade_schema
+from partner_stats import METRIC_COLUMNS, rebuild_partner_stats
+from payment_validation import (
+    PAYMENT_METHOD_NOT_FOUND,
+    USER_NOT_FOUND,
+    payment_validation,
+)
+from ratings import apply_review, recompute_driver_ratings
+from search import build_match_expression, search_partners, search_vehicles
+from service_areas import service_area_index
+from snapshots import SnapshotError, create_snapshot
+from state_sync import state_sync
 
-app = FastAPI(title="Cab Management API - SQLite Version")
+app = FastAPI(title="Cab Management API")
 
-# --- !!! CHANGE HERE: Database connection setup for SQLite !!! ---
-# Use the .db file created previously. Assumes it's in the same directory.
-# Use './' to indicate the current directory explicitly.
-SQLALCHEMY_DATABASE_URL = "sqlite:///./data.db"
+logs.configure()
+logger = logging.getLogger("cab.api")
+
+# Backend, pool tuning and SQLite pragmas are configured in database.py;
+# set DATABASE_URL to run against PostgreSQL instead of ./data.db
+SQLALCHEMY_DATABASE_URL = DATABASE_URL
+engine = create_database_engine(SQLALCHEMY_DATABASE_URL)
+# Read-only handlers use the replica (or SQLite read pool) when there is one
+read_engine = create_replica_engine(SQLALCHEMY_DATABASE_URL) or engine
+
+# Number of uvicorn worker processes sharing the database (uvicorn reads the
+# same variable for its --workers default)
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
 
-# Add connect_args for SQLite compatibility with multi-threaded access (FastAPI)
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-# --- End of CHANGE ---
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()  # Keep for potential future ORM mapping
 
 
@@ -36,15 +100,286 @@ Base = declarative_base()  # Keep for potential future ORM mapping
 def get_db():
     db = SessionLocal()
     try:
-        db.execute(text("PRAGMA foreign_keys = ON;"))
+        yield db
+        # Safety net; handlers commit their own writes before returning
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# Read-your-writes: after a successful mutation the client is pinned to the
+# primary for this many seconds (a replica may not have caught up yet)
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+PRIMARY_PIN_COOKIE = "read_primary"
+READ_CONSISTENCY_HEADER = "X-Read-Consistency"
+
+
+# Dependency for read-only handlers
+def get_read_db(request: Request):
+    """
+    Replica session, unless the client asks for read-your-writes
+    (X-Read-Consistency: primary) or still carries the pin cookie set
+    after its own write.
+    """
+    pinned = (
+        request.headers.get(READ_CONSISTENCY_HEADER, "").lower() == "primary"
+        or PRIMARY_PIN_COOKIE in request.cookies
+    )
+    db = SessionLocal() if pinned else ReadSessionLocal()
+    try:
         yield db
     finally:
         db.close()
 
 
+@app.middleware("http")
+async def pin_reads_after_writes(request: Request, call_next):
+    response = await call_next(request)
+    if (
+        READ_YOUR_WRITES_SECONDS > 0
+        and request.method in ("POST", "PUT", "PATCH", "DELETE")
+        and response.status_code < 400
+    ):
+        response.set_cookie(
+            PRIMARY_PIN_COOKIE,
+            "1",
+            max_age=READ_YOUR_WRITES_SECONDS,
+            httponly=True,
+            samesite="lax",
+        )
+    return response
+
+
+# Compresses large text/JSON responses (see compression.py); inside the
+# latency middleware so compression time is part of the recorded latency
+app.add_middleware(CompressionMiddleware)
+# Rate limits and sheds writes under overload before any handler work
+# (see admission.py); inside the latency middleware so rejections are counted
+app.add_middleware(AdmissionMiddleware)
+# Request latency per route template (see metrics.py)
+app.middleware("http")(metrics.record_request)
+# Outermost: binds the request ID every log line carries (see logs.py)
+app.add_middleware(logs.RequestIdMiddleware)
+
+
+def after_commit(db: Session, callback):
+    """
+    Runs callback once the session's transaction commits; dropped on rollback.
+    Used to mirror writes into in-memory state only when they are durable.
+    """
+    db.info.setdefault("after_commit", []).append(callback)
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _journal_status_changes(session):
+    entries = session.info.get("status_history")
+    if entries and "status_history_segment" not in session.info:
+        # Raising here fails the commit, so the write never outlives its row
+        session.info["status_history_segment"] = status_history.journal(entries)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _run_after_commit_callbacks(session):
+    entries = session.info.pop("status_history", None)
+    segment = session.info.pop("status_history_segment", None)
+    if segment is not None:
+        status_history.queue(segment, entries)
+    for callback in session.info.pop("after_commit", []):
+        callback()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _drop_after_commit_callbacks(session):
+    session.info.pop("after_commit", None)
+    entries = session.info.pop("status_history", None)
+    segment = session.info.pop("status_history_segment", None)
+    if segment is not None:
+        try:
+            status_history.discard(segment, entries)
+        except Exception:
+            # Replay still skips the rows: their booking never got the status
+            logger.exception("Journaling discarded status history failed")
+
+
+def record_status_change(db: Session, booking_id: str, booking_status: str):
+    """
+    Records the booking_status_history row for a transition in db's unit of
+    work: it is journaled just before db commits and inserted in a later
+    batch (see history.py).
+    """
+    entry = history_entry(booking_id, booking_status)
+    db.info.setdefault("status_history", []).append(entry)
+
+
+# ==================================
+# In-process state shared across workers
+# ==================================
+
+
+def _load_state(conn):
+    service_area_index.load(conn)
+    driver_registry.load(conn)
+    expiry_scheduler.load(conn)
+    fleet_snapshot.load(conn)
+    payment_validation.load(conn)
+
+
+def _refresh_partner_state(conn, partner_id: str):
+    service_area_index.refresh_partner(conn, partner_id)
+    driver_registry.refresh_partner(conn, partner_id)
+
+
+def _refresh_document_expiry(conn, key: str):
+    owner_type, owner_id, document_type = key.split("|", 2)
+    kind = DOCUMENT_KINDS[owner_type]
+    # Latest verified expiry for this owner and document type
+    latest_expiry = conn.execute(
+        text(f"""
+            SELECT MAX(expiry_date) FROM {kind.table}
+            WHERE {kind.owner_column} = :owner_id AND document_type = :document_type
+              AND verification_status = 'verified'
+        """),
+        {"owner_id": owner_id, "document_type": document_type},
+    ).scalar()
+    expiry_scheduler.set_expiry(owner_type, owner_id, document_type, latest_expiry)
+
+
+metrics.register_index("driver_registry", driver_registry.__len__)
+metrics.register_index("service_areas", service_area_index.__len__)
+metrics.register_index("document_expiries", expiry_scheduler.__len__)
+metrics.register_index("fleet_snapshot", fleet_snapshot.__len__)
+metrics.register_index("payment_validation", payment_validation.__len__)
+
+state_sync.subscribe("partner", _refresh_partner_state)
+state_sync.subscribe("service_areas", service_area_index.refresh_partner)
+state_sync.subscribe("driver", driver_registry.refresh_driver)
+state_sync.subscribe("vehicle", driver_registry.refresh_vehicle)
+state_sync.subscribe("document", _refresh_document_expiry)
+
+
+def _on_documents_expired(driver_ids):
+    for driver_id in driver_ids:
+        state_sync.changed("driver", driver_id)
+
+
+@app.on_event("startup")
+async def prepare_database():
+    startup_timer.imported()
+    # Each worker process opens its own pools; drop anything inherited on fork
+    engine.dispose()
+    read_engine.dispose()
+    # Bring older data.db files up to date, then warm the in-memory indexes
+    with startup_timer.phase("migrate"):
+        upgrade_schema(engine)
+    state_sync.configure(
+        engine,
+        enabled=WORKERS > 1 or os.getenv("STATE_SYNC") == "1",
+        reload=_load_state,
+    )
+    with startup_timer.phase("load_state"), engine.connect() as conn:
+        _load_state(conn)
+        state_sync.prime(conn)
+    # Inserts status history a crashed worker journaled but never flushed
+    status_history.configure(engine)
+
+    app.state.background_tasks = [
+        asyncio.create_task(
+            expiry_scheduler.run(engine, on_expired=_on_documents_expired)
+        ),
+        asyncio.create_task(status_history.run()),
+        asyncio.create_task(fleet_snapshot.run(engine)),
+        asyncio.create_task(payment_validation.run(engine)),
+    ]
+    if state_sync.enabled:
+        app.state.background_tasks.append(asyncio.create_task(state_sync.run()))
+
+    # Reads go through read_engine, so that is the pool whose pages to warm
+    if STARTUP_WARMUP == "background":
+        app.state.background_tasks.append(asyncio.create_task(warm_up(read_engine)))
+    elif STARTUP_WARMUP == "off":
+        startup_timer.report()
+    else:
+        await warm_up(read_engine)
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in app.state.background_tasks:
+        task.cancel()
+    await asyncio.gather(*app.state.background_tasks, return_exceptions=True)
+    await asyncio.to_thread(status_history.close)
+    engine.dispose()
+    read_engine.dispose()
+
+
+# Partner response fields selectable with ?fields=, and the partners columns
+# each needs ("vehicles" is a separate query)
+PARTNER_FIELD_COLUMNS = {
+    "partnerId": ("partner_id",),
+    "name": ("name",),
+    "contact": ("phone", "email"),
+    "address": ("address",),
+    "vehicles": (),
+    "status": ("status",),
+    "createdAt": ("created_at",),
+    "updatedAt": ("updated_at",),
+}
+
+
+def parse_fields(fields: Optional[str], allowed) -> Optional[List[str]]:
+    """
+    Parses a comma-separated sparse fieldset; None when not given.
+    """
+    if fields is None:
+        return None
+    selected = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in allowed]
+    if not selected or unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid fields: {', '.join(unknown) or fields!r}. "
+            f"Allowed: {', '.join(allowed)}",
+        )
+    return list(dict.fromkeys(selected))
+
+
+def _vehicle_from_row(v) -> Vehicle:
+    return Vehicle(
+        vehicleId=v["vehicle_id"],
+        type=v["type"],
+        registration=v["registration"],
+        status=v["status"],
+        make=v["make"],
+        model=v["model"],
+        color=v["color"],
+    )
+
+
+def _sparse_partner(
+    partner_dict, vehicles: List[Vehicle], selected_fields: List[str]
+) -> Dict[str, Any]:
+    payload = {}
+    for name in selected_fields:
+        if name == "contact":
+            payload[name] = {
+                "phone": partner_dict["phone"],
+                "email": partner_dict["email"],
+            }
+        elif name == "vehicles":
+            payload[name] = [vehicle.model_dump() for vehicle in vehicles]
+        elif name in ("createdAt", "updatedAt"):
+            payload[name] = str(partner_dict[PARTNER_FIELD_COLUMNS[name][0]])
+        else:
+            payload[name] = partner_dict[PARTNER_FIELD_COLUMNS[name][0]]
+    return payload
+
+
 @app.get("/api/partners", response_model=CabPartnerListResponse)
 async def list_cab_partners(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     page: int = Query(
         1, ge=1, description="Page number for pagination"
     ),  # Added ge=1 validation
@@ -56,14 +391,28 @@ async def list_cab_partners(
     ),
     location: Optional[str] = Query(
         None,
-        description="Filter by text search in the address field",  # Clarified description
+        description="Filter by service area (city, region or country name)",
+    ),
+    fields: Optional[str] = Query(
+        None,
+        description="Comma-separated partner fields to return, e.g. "
+        "'partnerId,name,status'; omitted fields are neither queried nor sent",
     ),
 ):
     """
     Retrieves a list of registered cab partners with optional filtering and pagination.
     """
+    selected_fields = parse_fields(fields, PARTNER_FIELD_COLUMNS)
+
     # --- Base query and params ---
-    select_query_base = "SELECT * FROM partners"
+    if selected_fields is None:
+        select_query_base = "SELECT * FROM partners"
+    else:
+        # Whitelisted column names only; partner_id is needed for vehicles
+        columns = ["partner_id"]
+        for name in selected_fields:
+            columns.extend(PARTNER_FIELD_COLUMNS[name])
+        select_query_base = f"SELECT {', '.join(dict.fromkeys(columns))} FROM partners"
     count_query_base = "SELECT COUNT(*) as total FROM partners"
     where_clauses = []
     params = {}
@@ -74,9 +423,21 @@ async def list_cab_partners(
         params["status"] = status
 
     if location:
-        # Using LIKE for basic text search in address
-        where_clauses.append("address LIKE :location")
-        params["location"] = f"%{location}%"
+        # Resolve the location through the service-area index instead of
+        # scanning the address column with a leading-wildcard LIKE
+        matching_partner_ids = service_area_index.partners_matching(location)
+        if not matching_partner_ids:
+            return {
+                "data": [],
+                "pagination": {
+                    "currentPage": page,
+                    "totalPages": 0,
+                    "totalItems": 0,
+                    "itemsPerPage": limit,
+                },
+            }
+        where_clauses.append("partner_id IN :partner_ids")
+        params["partner_ids"] = list(matching_partner_ids)
 
     # --- Construct WHERE part ---
     where_sql = ""
@@ -85,7 +446,8 @@ async def list_cab_partners(
 
     # --- Count total items for pagination (with filters) ---
     count_query = count_query_base + where_sql
-    total_result = db.execute(text(count_query), params)
+    expanding = [bindparam("partner_ids", expanding=True)] if location else []
+    total_result = db.execute(text(count_query).bindparams(*expanding), params)
     total_items = (
         total_result.scalar_one_or_none() or 0
     )  # Use scalar_one_or_none for safety
@@ -99,33 +461,46 @@ async def list_cab_partners(
     params["offset"] = offset
 
     # --- Execute select query ---
-    result = db.execute(text(select_query), params)
+    result = db.execute(text(select_query).bindparams(*expanding), params)
     # Use .mappings().all() to get dict-like rows easily
     partners_data = result.mappings().all()
 
-    # --- Format response ---
-    partners_response_list = []
-    for partner_dict in partners_data:
-        # Get vehicles for this partner
-        vehicles_query = "SELECT * FROM vehicles WHERE partner_id = :partner_id"
+    # --- Get the page's vehicles in one query ---
+    vehicles_by_partner: Dict[str, List[Vehicle]] = {}
+    if partners_data and (selected_fields is None or "vehicles" in selected_fields):
         vehicles_result = db.execute(
-            text(vehicles_query), {"partner_id": partner_dict["partner_id"]}
-        )
-        vehicles_data = vehicles_result.mappings().all()
-
-        vehicles_list = [
-            Vehicle(
-                vehicleId=v["vehicle_id"],
-                type=v["type"],
-                registration=v["registration"],
-                status=v["status"],
-                make=v["make"],
-                model=v["model"],
-                color=v["color"],
+            text("SELECT * FROM vehicles WHERE partner_id IN :partner_ids").bindparams(
+                bindparam("partner_ids", expanding=True)
+            ),
+            {"partner_ids": [p["partner_id"] for p in partners_data]},
+        )
+        for v in vehicles_result.mappings():
+            vehicles_by_partner.setdefault(v["partner_id"], []).append(
+                _vehicle_from_row(v)
+            )
+
+    pagination = {
+        "currentPage": page,
+        "totalPages": total_pages,
+        "totalItems": total_items,
+        "itemsPerPage": limit,
+    }
+
+    # --- Format response ---
+    if selected_fields is not None:
+        # A sparse fieldset is not a full CabPartnerResponse; send it as is
+        data = [
+            _sparse_partner(
+                partner_dict,
+                vehicles_by_partner.get(partner_dict["partner_id"], []),
+                selected_fields,
             )
-            for v in vehicles_data
+            for partner_dict in partners_data
         ]
+        return JSONResponse({"data": data, "pagination": pagination})
 
+    partners_response_list = []
+    for partner_dict in partners_data:
         partners_response_list.append(
             CabPartnerResponse(
                 partnerId=partner_dict["partner_id"],
@@ -134,7 +509,7 @@ async def list_cab_partners(
                     phone=partner_dict["phone"], email=partner_dict["email"]
                 ),
                 address=partner_dict["address"],
-                vehicles=vehicles_list,
+                vehicles=vehicles_by_partner.get(partner_dict["partner_id"], []),
                 status=partner_dict["status"],
                 # Convert DB datetime/text to string for JSON compatibility if needed
                 createdAt=str(partner_dict["created_at"]),
@@ -142,15 +517,7 @@ async def list_cab_partners(
             )
         )
 
-    return {
-        "data": partners_response_list,
-        "pagination": {
-            "currentPage": page,
-            "totalPages": total_pages,
-            "totalItems": total_items,
-            "itemsPerPage": limit,
-        },
-    }
+    return {"data": partners_response_list, "pagination": pagination}
 
 
 @app.post(
@@ -199,29 +566,44 @@ async def create_cab_partner(partner: CabPartnerCreate, db: Session = Depends(ge
             },
         )
         db.commit()
-    except Exception as e:
+    except Exception:
         db.rollback()
-        # Log the error e
-        print(f"Error creating partner: {e}")
+        logger.exception("Error creating partner")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to create partner due to a database error.",
+            detail="Failed to create partner due to a database error.",
         )
 
     return {"partnerId": partner_id, "message": "Cab partner created successfully"}
 
 
+# Partner details are public; shared caches may serve them briefly
+PARTNER_CACHE_CONTROL = "public, max-age=5, must-revalidate"
+
+# The partner row plus its fleet version: everything its ETag depends on
+PARTNER_VERSION_QUERY = """
+    SELECT p.*, fv.version AS fleet_version
+    FROM partners p
+    LEFT JOIN partner_fleet_versions fv ON fv.partner_id = p.partner_id
+    WHERE p.partner_id = :partner_id
+"""
+
+
 @app.get("/api/partners/{partner_id}", response_model=CabPartnerResponse)
 async def get_cab_partner_details(
+    request: Request,
+    response: Response,
     partner_id: str = Path(..., description="The ID of the cab partner to retrieve"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """
     Retrieves detailed information about a specific cab partner, including their vehicles.
+
+    If-None-Match is answered with 304 after the partner row lookup alone;
+    the vehicles are only read when the ETag changed (see etags.py).
     """
     # Get partner details
-    query = "SELECT * FROM partners WHERE partner_id = :partner_id"
-    result = db.execute(text(query), {"partner_id": partner_id})
+    result = db.execute(text(PARTNER_VERSION_QUERY), {"partner_id": partner_id})
     partner = result.mappings().first()  # Use .first() which returns None or a mapping
 
     if not partner:
@@ -230,6 +612,11 @@ async def get_cab_partner_details(
             detail=f"Cab partner with ID {partner_id} not found",
         )
 
+    tag = etags.etag(*partner.values())
+    if etags.matches(request.headers.get("if-none-match"), tag):
+        return etags.not_modified(tag, PARTNER_CACHE_CONTROL)
+    etags.set_headers(response, tag, PARTNER_CACHE_CONTROL)
+
     # Get vehicles for this partner
     vehicles_query = "SELECT * FROM vehicles WHERE partner_id = :partner_id"
     vehicles_result = db.execute(text(vehicles_query), {"partner_id": partner_id})
@@ -359,9 +746,9 @@ async def update_cab_partner(
         )
         db.execute(text(query), params)
         db.commit()
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"Error updating partner {partner_id}: {e}")
+        logger.exception("Error updating partner %s", partner_id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update partner due to a database error.",
@@ -405,15 +792,18 @@ async def delete_cab_partner(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Cab partner with ID {partner_id} not found during delete attempt.",
             )
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"Error deleting partner {partner_id}: {e}")
+        logger.exception("Error deleting partner %s", partner_id)
         # Could be a constraint violation if CASCADE isn't working as expected
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete partner due to a database error or constraint issue.",
         )
 
+    # Service areas and drivers were removed by ON DELETE CASCADE
+    state_sync.changed("partner", partner_id)
+
     return {"partnerId": partner_id, "message": "Cab partner deleted successfully"}
 
 
@@ -485,9 +875,9 @@ async def add_vehicle_to_partner(
             },
         )
         db.commit()
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"Error adding vehicle for partner {partner_id}: {e}")
+        logger.exception("Error adding vehicle for partner %s", partner_id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to add vehicle due to a database error.",
@@ -596,14 +986,17 @@ async def update_partner_vehicle(
     try:
         db.execute(text(query), params)
         db.commit()
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"Error updating vehicle {vehicle_id}: {e}")
+        logger.exception("Error updating vehicle %s", vehicle_id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update vehicle due to a database error.",
         )
 
+    if update_data.type is not None:
+        state_sync.changed("vehicle", vehicle_id)
+
     return {
         "partnerId": partner_id,
         "message": f"Vehicle {vehicle_id} updated successfully",
@@ -651,15 +1044,18 @@ async def delete_partner_vehicle(
                 status_code=status.HTTP_404_NOT_FOUND,  # Should have been caught above
                 detail=f"Vehicle with ID {vehicle_id} not found during delete attempt.",
             )
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"Error deleting vehicle {vehicle_id}: {e}")
+        logger.exception("Error deleting vehicle %s", vehicle_id)
         # Check for constraint issues if CASCADE/SET NULL isn't working
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete vehicle due to a database error or constraint issue.",
         )
 
+    # drivers.vehicle_id was SET NULL by the schema
+    state_sync.changed("vehicle", vehicle_id)
+
     return {
         "partnerId": partner_id,
         "message": f"Vehicle {vehicle_id} deleted successfully",
@@ -669,7 +1065,7 @@ async def delete_partner_vehicle(
 @app.get("/api/partners/{partner_id}/vehicles", response_model=List[Vehicle])
 async def list_partner_vehicles(
     partner_id: str = Path(..., description="The ID of the cab partner"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     status: Optional[str] = Query(
         None, description="Filter vehicles by status (e.g., 'available', 'on_ride')"
     ),
@@ -722,300 +1118,1553 @@ async def list_partner_vehicles(
     return vehicles_list
 
 
-@app.post(
-    "/api/bookings", response_model=BookingResponse, status_code=status.HTTP_201_CREATED
-)
-async def create_booking(booking: BookingRequest, db: Session = Depends(get_db)):
-    """
-    Create a new cab booking request.
+# ==================================
+# Driver Management Endpoints
+# ==================================
 
-    This endpoint accepts booking details including pickup and dropoff locations.
-    It creates a booking record and initiates the search for available drivers.
-    Checks for valid user and payment method. Calculates and stores an estimated fare.
-    NOTE: Assumes transaction commit/rollback is handled externally (e.g., by middleware),
-    so the 'with db.begin():' block has been removed from this function.
-    """
-    # Generate a unique booking ID
-    booking_id = f"booking_{uuid.uuid4().hex[:12]}"  # Slightly longer ID
 
-    # Verify that the user exists
-    user_exists = (
-        db.execute(
-            text("SELECT 1 FROM users WHERE user_id = :user_id"),
-            {"user_id": booking.userId},
-        ).scalar()
-        is not None
+def _driver_from_row(d) -> Driver:
+    return Driver(
+        driverId=d["driver_id"],
+        partnerId=d["partner_id"],
+        vehicleId=d["vehicle_id"],
+        firstName=d["first_name"],
+        lastName=d["last_name"],
+        phone=d["phone"],
+        email=d["email"],
+        licenseNumber=d["license_number"],
+        rating=float(d["average_rating"] or 0.0),
+        totalReviews=int(d["total_reviews"] or 0),
+        status=d["status"],
+        createdAt=str(d["created_at"]),
+        updatedAt=str(d["updated_at"]),
     )
 
-    if not user_exists:
+
+def _fetch_partner_driver(db: Session, partner_id: str, driver_id: str):
+    query = """
+    SELECT * FROM drivers
+    WHERE driver_id = :driver_id AND partner_id = :partner_id
+    """
+    driver = (
+        db.execute(text(query), {"driver_id": driver_id, "partner_id": partner_id})
+        .mappings()
+        .first()
+    )
+    if not driver:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"User with ID {booking.userId} not found",
+            detail=f"Driver with ID {driver_id} not found or does not belong to partner {partner_id}",
         )
+    return driver
 
-    # Verify that the payment method exists and belongs to the user
-    payment_method_exists = (
-        db.execute(
-            text(
-                """SELECT 1 FROM payment_methods
-                   WHERE payment_method_id = :payment_method_id AND user_id = :user_id"""
-            ),
-            {"payment_method_id": booking.paymentMethodId, "user_id": booking.userId},
-        ).scalar()
-        is not None
-    )
 
-    if not payment_method_exists:
+def _check_driver_vehicle(
+    db: Session, partner_id: str, vehicle_id: str, driver_id: Optional[str] = None
+):
+    # The vehicle must be in the partner's fleet and not driven by someone else
+    vehicle_query = """
+    SELECT 1 FROM vehicles
+    WHERE vehicle_id = :vehicle_id AND partner_id = :partner_id
+    LIMIT 1
+    """
+    if not db.execute(
+        text(vehicle_query), {"vehicle_id": vehicle_id, "partner_id": partner_id}
+    ).scalar_one_or_none():
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Payment method with ID {booking.paymentMethodId} not found or does not belong to user {booking.userId}",
+            detail=f"Vehicle with ID {vehicle_id} not found or does not belong to partner {partner_id}",
         )
 
-    # --- Fare Calculation Logic ---
-    lat1, lon1 = booking.pickupLocation.latitude, booking.pickupLocation.longitude
-    lat2, lon2 = booking.dropoffLocation.latitude, booking.dropoffLocation.longitude
+    assigned_query = """
+    SELECT driver_id FROM drivers
+    WHERE vehicle_id = :vehicle_id AND driver_id IS DISTINCT FROM :driver_id
+    LIMIT 1
+    """
+    assigned_to = db.execute(
+        text(assigned_query), {"vehicle_id": vehicle_id, "driver_id": driver_id}
+    ).scalar_one_or_none()
+    if assigned_to:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Vehicle {vehicle_id} is already assigned to driver {assigned_to}",
+        )
 
-    # Haversine formula for distance
-    R = 6371  # Earth radius in km
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = (
-        math.sin(dlat / 2) ** 2
-        + math.cos(math.radians(lat1))
-        * math.cos(math.radians(lat2))
-        * math.sin(dlon / 2) ** 2
-    )
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    distance_km = R * c  # Distance in km
-
-    # Simple fare components
-    base_fare = 50.0
-    distance_charge_per_km = 12.0
-    time_charge_per_min = 1.5
-    estimated_duration_min = int(distance_km * 2.5)  # Rough estimate
-
-    distance_charge = distance_km * distance_charge_per_km
-    time_charge = estimated_duration_min * time_charge_per_min
-    surge_multiplier = 1.0
-    tax_rate = 0.05
-
-    subtotal = base_fare + distance_charge + time_charge
-    estimated_fare_before_tax = subtotal * surge_multiplier
-    tax_amount = estimated_fare_before_tax * tax_rate
-    estimated_fare_total = estimated_fare_before_tax + tax_amount
-    currency = "INR"
 
-    # Perform database operations within the existing transaction scope
-    try:
-        # Insert the booking record
-        db.execute(
-            text("""
-                INSERT INTO bookings (
-                    booking_id, user_id, status,
-                    pickup_latitude, pickup_longitude, pickup_address,
-                    dropoff_latitude, dropoff_longitude, dropoff_address,
-                    vehicle_type, payment_method_id, estimated_fare_amount,
-                    estimated_fare_currency, estimated_distance, estimated_duration
-                ) VALUES (
-                    :booking_id, :user_id, :status,
-                    :pickup_latitude, :pickup_longitude, :pickup_address,
-                    :dropoff_latitude, :dropoff_longitude, :dropoff_address,
-                    :vehicle_type, :payment_method_id, :estimated_fare_amount,
-                    :estimated_fare_currency, :estimated_distance, :estimated_duration
-                )
-            """),
-            {
-                "booking_id": booking_id,
-                "user_id": booking.userId,
-                "status": BookingStatus.SEARCHING,
-                "pickup_latitude": booking.pickupLocation.latitude,
-                "pickup_longitude": booking.pickupLocation.longitude,
-                "pickup_address": booking.pickupLocation.address,
-                "dropoff_latitude": booking.dropoffLocation.latitude,
-                "dropoff_longitude": booking.dropoffLocation.longitude,
-                "dropoff_address": booking.dropoffLocation.address,
-                "vehicle_type": booking.vehicleType,
-                "payment_method_id": booking.paymentMethodId,
-                "estimated_fare_amount": round(estimated_fare_total, 2),
-                "estimated_fare_currency": currency,
-                "estimated_distance": round(distance_km, 2),
-                "estimated_duration": estimated_duration_min,
-            },
+def _check_driver_conflicts(
+    db: Session,
+    phone: Optional[str],
+    email: Optional[str],
+    license_number: Optional[str],
+    driver_id: Optional[str] = None,
+):
+    conflict_checks = []
+    params = {"driver_id": driver_id}
+    if phone:
+        conflict_checks.append("phone = :phone")
+        params["phone"] = phone
+    if email:
+        conflict_checks.append("email = :email")
+        params["email"] = email
+    if license_number:
+        conflict_checks.append("license_number = :license_number")
+        params["license_number"] = license_number
+    if not conflict_checks:
+        return
+
+    conflict_query = f"""
+    SELECT driver_id FROM drivers
+    WHERE driver_id IS DISTINCT FROM :driver_id AND ({" OR ".join(conflict_checks)})
+    LIMIT 1
+    """
+    if db.execute(text(conflict_query), params).scalar_one_or_none():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A driver with this phone, email or license number already exists.",
         )
 
-        # Insert initial status in booking history
-        db.execute(
-            text("""
-                INSERT INTO booking_status_history (booking_id, status)
-                VALUES (:booking_id, :status)
-            """),
-            {"booking_id": booking_id, "status": BookingStatus.SEARCHING},
+
+@app.post(
+    "/api/partners/{partner_id}/drivers",
+    response_model=Driver,
+    status_code=status.HTTP_201_CREATED,
+)
+async def add_driver_to_partner(
+    driver: DriverCreate,
+    partner_id: str = Path(..., description="The ID of the cab partner"),
+    db: Session = Depends(get_db),
+):
+    """
+    Registers a new driver for a partner, optionally assigned to one of its vehicles.
+    New drivers start offline.
+    """
+    check_query = "SELECT 1 FROM partners WHERE partner_id = :partner_id LIMIT 1"
+    if not db.execute(
+        text(check_query), {"partner_id": partner_id}
+    ).scalar_one_or_none():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Cab partner with ID {partner_id} not found",
         )
 
-        # Insert fare calculation record
+    if driver.vehicleId:
+        _check_driver_vehicle(db, partner_id, driver.vehicleId)
+    _check_driver_conflicts(db, driver.phone, driver.email, driver.licenseNumber)
+
+    driver_id = f"driver_{uuid.uuid4().hex[:12]}"
+    query = """
+    INSERT INTO drivers
+        (driver_id, partner_id, vehicle_id, first_name, last_name, phone, email,
+         license_number, status, created_at, updated_at)
+    VALUES
+        (:driver_id, :partner_id, :vehicle_id, :first_name, :last_name, :phone, :email,
+         :license_number, :status, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+    """
+    try:
         db.execute(
-            text("""
-                INSERT INTO fare_calculations (
-                    booking_id, base_fare, distance_charge, time_charge,
-                    surge_multiplier, tax_amount, total_amount, currency
-                ) VALUES (
-                    :booking_id, :base_fare, :distance_charge, :time_charge,
-                    :surge_multiplier, :tax_amount, :total_amount, :currency
-                )
-            """),
+            text(query),
             {
-                "booking_id": booking_id,
-                "base_fare": round(base_fare, 2),
-                "distance_charge": round(distance_charge, 2),
-                "time_charge": round(time_charge, 2),
-                "surge_multiplier": surge_multiplier,
-                "tax_amount": round(tax_amount, 2),
-                "total_amount": round(estimated_fare_total, 2),
-                "currency": currency,
+                "driver_id": driver_id,
+                "partner_id": partner_id,
+                "vehicle_id": driver.vehicleId,
+                "first_name": driver.firstName,
+                "last_name": driver.lastName,
+                "phone": driver.phone,
+                "email": driver.email,
+                "license_number": driver.licenseNumber,
+                "status": DriverStatus.OFFLINE.value,
             },
         )
-
-        # db.commit() is expected to be called externally after the request finishes successfully
-        # db.rollback() is expected to be called externally if an exception occurs
-
-    except Exception as e:
-        # If an error occurs during DB operations, the external handler should ideally rollback.
-        # Re-raising the exception ensures the external handler knows about the failure.
-        # Log the error here if desired.
-        # logger.error(f"Database error during booking creation: {e}")
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Error adding driver for partner %s", partner_id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"An error occurred while creating the booking: {e}",
-        ) from e
-
-    # In a real implementation, background tasks would start searching for drivers here.
+            detail="Failed to add driver due to a database error.",
+        )
 
-    return BookingResponse(
-        bookingId=booking_id,
-        status=BookingStatus.SEARCHING,
-        estimatedFare=FareInfo(
-            currency=currency,
-            amount=round(estimated_fare_total, 2),
-            breakdown={
-                "baseFare": round(base_fare, 2),
-                "distanceCharge": round(distance_charge, 2),
-                "timeCharge": round(time_charge, 2),
-                "surgeMultiplier": surge_multiplier,
-                "tax": round(tax_amount, 2),
-            },
-        ),
-        message="Searching for nearby drivers...",
-    )
+    state_sync.changed("driver", driver_id)
+    return _driver_from_row(_fetch_partner_driver(db, partner_id, driver_id))
 
 
-def parse_datetime(dt_value):
-    if isinstance(dt_value, datetime):
-        return dt_value
-    elif isinstance(dt_value, str):
-        # Handle potential 'Z' suffix and spaces instead of 'T'
-        dt_str = dt_value.replace("Z", "+00:00").replace(" ", "T")
-        try:
-            # Attempt parsing, potentially handling microseconds if present
-            return datetime.fromisoformat(dt_str)
-        except ValueError:
-            # Log or handle parsing errors if necessary
-            print(f"Warning: Could not parse datetime string: {dt_value}")
-            return None  # Or raise an error, or return original string
-    return None
+@app.get("/api/partners/{partner_id}/drivers", response_model=List[Driver])
+async def list_partner_drivers(
+    partner_id: str = Path(..., description="The ID of the cab partner"),
+    db: Session = Depends(get_read_db),
+    driver_status: Optional[DriverStatus] = Query(
+        None, alias="status", description="Filter drivers by status"
+    ),
+):
+    """
+    Retrieves all drivers of a partner, with optional status filtering.
+    """
+    partner_query = "SELECT 1 FROM partners WHERE partner_id = :partner_id LIMIT 1"
+    if not db.execute(
+        text(partner_query), {"partner_id": partner_id}
+    ).scalar_one_or_none():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Cab partner with ID {partner_id} not found",
+        )
 
+    query = "SELECT * FROM drivers WHERE partner_id = :partner_id"
+    params = {"partner_id": partner_id}
+    if driver_status:
+        query += " AND status = :status"
+        params["status"] = driver_status.value
+    query += " ORDER BY created_at DESC"
 
-@app.get("/api/bookings/{booking_id}", response_model=BookingDetail)
-async def get_booking_details(
-    booking_id: str = Path(..., description="The ID of the booking to retrieve"),
+    drivers_data = db.execute(text(query), params).mappings().all()
+    return [_driver_from_row(d) for d in drivers_data]
+
+
+@app.get("/api/partners/{partner_id}/drivers/{driver_id}", response_model=Driver)
+async def get_partner_driver(
+    partner_id: str = Path(..., description="The ID of the cab partner"),
+    driver_id: str = Path(..., description="The ID of the driver"),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Retrieves a single driver of a partner.
+    """
+    return _driver_from_row(_fetch_partner_driver(db, partner_id, driver_id))
+
+
+@app.put("/api/partners/{partner_id}/drivers/{driver_id}", response_model=Driver)
+async def update_partner_driver(
+    update_data: DriverUpdate,
+    partner_id: str = Path(..., description="The ID of the cab partner"),
+    driver_id: str = Path(..., description="The ID of the driver to update"),
     db: Session = Depends(get_db),
 ):
     """
-    Retrieve details of a specific booking.
+    Updates a driver's details, vehicle assignment or status.
+    Only updates fields provided in the request body.
+    """
+    existing_driver = _fetch_partner_driver(db, partner_id, driver_id)
+
+    if update_data.vehicleId and update_data.vehicleId != existing_driver["vehicle_id"]:
+        _check_driver_vehicle(db, partner_id, update_data.vehicleId, driver_id)
+    _check_driver_conflicts(
+        db,
+        update_data.phone if update_data.phone != existing_driver["phone"] else None,
+        update_data.email if update_data.email != existing_driver["email"] else None,
+        (
+            update_data.licenseNumber
+            if update_data.licenseNumber != existing_driver["license_number"]
+            else None
+        ),
+        driver_id,
+    )
 
-    This endpoint returns the current status and all available details of a booking,
-    including driver and vehicle information if assigned, and fare breakdown.
+    update_parts = []
+    params = {"driver_id": driver_id}
+    for field, column in (
+        ("firstName", "first_name"),
+        ("lastName", "last_name"),
+        ("phone", "phone"),
+        ("email", "email"),
+        ("licenseNumber", "license_number"),
+        ("vehicleId", "vehicle_id"),
+    ):
+        value = getattr(update_data, field)
+        if value is not None:
+            update_parts.append(f"{column} = :{column}")
+            params[column] = value
+    if update_data.status is not None:
+        update_parts.append("status = :status")
+        params["status"] = update_data.status.value
+
+    if not update_parts:
+        return _driver_from_row(existing_driver)
+
+    query = f"UPDATE drivers SET {', '.join(update_parts)} WHERE driver_id = :driver_id"
+    try:
+        db.execute(text(query), params)
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Error updating driver %s", driver_id)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to update driver due to a database error.",
+        )
+
+    state_sync.changed("driver", driver_id)
+    return _driver_from_row(_fetch_partner_driver(db, partner_id, driver_id))
+
+
+@app.delete(
+    "/api/partners/{partner_id}/drivers/{driver_id}",
+    response_model=MessageResponse,
+    status_code=status.HTTP_200_OK,
+)
+async def delete_partner_driver(
+    partner_id: str = Path(..., description="The ID of the cab partner"),
+    driver_id: str = Path(..., description="The ID of the driver to delete"),
+    db: Session = Depends(get_db),
+):
     """
-    # Fetch booking details along with fare calculation components
-    booking_result = db.execute(
-        text("""
-            SELECT
-                b.*,
-                fc.base_fare, fc.distance_charge, fc.time_charge,
-                fc.surge_multiplier, fc.tax_amount, fc.other_charges,
-                fc.total_amount AS calculated_total, fc.currency AS calculated_currency
-            FROM bookings b
-            LEFT JOIN fare_calculations fc ON b.booking_id = fc.booking_id
-            WHERE b.booking_id = :booking_id
+    Removes a driver from a partner.
+    Bookings keep their history; their driver_id is SET NULL by the schema.
+    """
+    _fetch_partner_driver(db, partner_id, driver_id)
+
+    try:
+        db.execute(
+            text("DELETE FROM drivers WHERE driver_id = :driver_id"),
+            {"driver_id": driver_id},
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Error deleting driver %s", driver_id)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to delete driver due to a database error or constraint issue.",
+        )
+
+    state_sync.changed("driver", driver_id)
+    return {
+        "partnerId": partner_id,
+        "message": f"Driver {driver_id} deleted successfully",
+    }
+
+
+def _set_driver_availability(
+    db: Session, partner_id: str, driver_id: str, new_status: DriverStatus
+) -> Driver:
+    driver = _fetch_partner_driver(db, partner_id, driver_id)
+
+    if driver["status"] == DriverStatus.ON_RIDE.value:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Driver {driver_id} is on a ride; finish or cancel it first",
+        )
+
+    if new_status == DriverStatus.ONLINE:
+        if not driver["vehicle_id"]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Driver {driver_id} has no vehicle assigned",
+            )
+        vehicle_status = db.execute(
+            text("SELECT status FROM vehicles WHERE vehicle_id = :vehicle_id"),
+            {"vehicle_id": driver["vehicle_id"]},
+        ).scalar_one_or_none()
+        if vehicle_status == "offline":
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Vehicle {driver['vehicle_id']} is offline",
+            )
+        # The expiry scheduler took them offline once; keep them there
+        for kind, owner_id in (
+            ("driver", driver_id),
+            ("vehicle", driver["vehicle_id"]),
+            ("partner", partner_id),
+        ):
+            document_type = expired_document_type(db, kind, owner_id, today_utc())
+            if document_type:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"The {kind}'s {document_type} document has expired",
+                )
+
+    if driver["status"] != new_status.value:
+        try:
+            db.execute(
+                text(
+                    "UPDATE drivers SET status = :status WHERE driver_id = :driver_id"
+                ),
+                {"status": new_status.value, "driver_id": driver_id},
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("Error changing status of driver %s", driver_id)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to update driver status due to a database error.",
+            )
+        state_sync.changed("driver", driver_id)
+
+    return _driver_from_row(_fetch_partner_driver(db, partner_id, driver_id))
+
+
+@app.post(
+    "/api/partners/{partner_id}/drivers/{driver_id}/online", response_model=Driver
+)
+async def driver_go_online(
+    partner_id: str = Path(..., description="The ID of the cab partner"),
+    driver_id: str = Path(..., description="The ID of the driver"),
+    db: Session = Depends(get_db),
+):
+    """
+    Marks a driver as online (available for matching).
+    The driver needs an assigned vehicle that is not offline, and none of
+    the driver's, vehicle's or partner's verified documents may have expired.
+    """
+    return _set_driver_availability(db, partner_id, driver_id, DriverStatus.ONLINE)
+
+
+@app.post(
+    "/api/partners/{partner_id}/drivers/{driver_id}/offline", response_model=Driver
+)
+async def driver_go_offline(
+    partner_id: str = Path(..., description="The ID of the cab partner"),
+    driver_id: str = Path(..., description="The ID of the driver"),
+    db: Session = Depends(get_db),
+):
+    """
+    Marks a driver as offline. Not allowed while the driver is on a ride.
+    """
+    return _set_driver_availability(db, partner_id, driver_id, DriverStatus.OFFLINE)
+
+
+@app.get("/api/drivers/supply", response_model=DriverSupplyResponse)
+async def get_driver_supply(
+    vehicleType: Optional[str] = Query(
+        None, description="Restrict counts to one vehicle type"
+    ),
+):
+    """
+    Driver supply per vehicle type and status, read from the in-memory
+    availability registry (no database access).
+    """
+    counts = driver_registry.supply_counts(vehicleType)
+    matchable = {
+        v_type: sum(by_status.get(s, 0) for s in MATCHABLE_STATUSES)
+        for v_type, by_status in counts.items()
+    }
+    return {"data": counts, "matchable": matchable}
+
+
+# ==================================
+# Document Endpoints
+# ==================================
+
+
+def _document_from_row(owner_type: DocumentOwnerType, d) -> Document:
+    kind = DOCUMENT_KINDS[owner_type.value]
+    return Document(
+        documentId=d["document_id"],
+        ownerType=owner_type,
+        ownerId=d[kind.owner_column],
+        documentType=d["document_type"],
+        documentNumber=d["document_number"],
+        documentUrl=d["document_url"],
+        expiryDate=d["expiry_date"],
+        verificationStatus=d["verification_status"],
+        createdAt=str(d["created_at"]),
+        updatedAt=str(d["updated_at"]),
+    )
+
+
+def _check_document_owner(
+    db: Session, owner_type: DocumentOwnerType, partner_id: str, owner_id: str
+):
+    if owner_type == DocumentOwnerType.PARTNER:
+        query = "SELECT 1 FROM partners WHERE partner_id = :partner_id LIMIT 1"
+        label = "Cab partner"
+    elif owner_type == DocumentOwnerType.VEHICLE:
+        query = """
+        SELECT 1 FROM vehicles
+        WHERE vehicle_id = :owner_id AND partner_id = :partner_id LIMIT 1
+        """
+        label = "Vehicle"
+    else:
+        query = """
+        SELECT 1 FROM drivers
+        WHERE driver_id = :owner_id AND partner_id = :partner_id LIMIT 1
+        """
+        label = "Driver"
+
+    if not db.execute(
+        text(query), {"partner_id": partner_id, "owner_id": owner_id}
+    ).scalar_one_or_none():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"{label} with ID {owner_id} not found",
+        )
+
+
+def _create_document(
+    db: Session,
+    owner_type: DocumentOwnerType,
+    partner_id: str,
+    owner_id: str,
+    document: DocumentCreate,
+) -> Document:
+    _check_document_owner(db, owner_type, partner_id, owner_id)
+    kind = DOCUMENT_KINDS[owner_type.value]
+    if document.documentType not in kind.document_types:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Document type must be one of: {', '.join(kind.document_types)}",
+        )
+
+    query = f"""
+    INSERT INTO {kind.table}
+        ({kind.owner_column}, document_type, document_number, document_url, expiry_date)
+    VALUES
+        (:owner_id, :document_type, :document_number, :document_url, :expiry_date)
+    RETURNING document_id
+    """
+    try:
+        document_id = db.execute(
+            text(query),
+            {
+                "owner_id": owner_id,
+                "document_type": document.documentType,
+                "document_number": document.documentNumber,
+                "document_url": document.documentUrl,
+                "expiry_date": normalize_expiry(document.expiryDate),
+            },
+        ).scalar_one()
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Error adding %s document for %s", owner_type.value, owner_id)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to add document due to a database error.",
+        )
+
+    created = (
+        db.execute(
+            text(f"SELECT * FROM {kind.table} WHERE document_id = :document_id"),
+            {"document_id": document_id},
+        )
+        .mappings()
+        .first()
+    )
+    return _document_from_row(owner_type, created)
+
+
+def _list_documents(
+    db: Session, owner_type: DocumentOwnerType, partner_id: str, owner_id: str
+) -> List[Document]:
+    _check_document_owner(db, owner_type, partner_id, owner_id)
+    kind = DOCUMENT_KINDS[owner_type.value]
+    documents = db.execute(
+        text(f"""
+            SELECT * FROM {kind.table}
+            WHERE {kind.owner_column} = :owner_id
+            ORDER BY created_at DESC
         """),
-        {"booking_id": booking_id},
-    ).fetchone()
+        {"owner_id": owner_id},
+    ).mappings()
+    return [_document_from_row(owner_type, d) for d in documents]
+
+
+@app.post(
+    "/api/partners/{partner_id}/documents",
+    response_model=Document,
+    status_code=status.HTTP_201_CREATED,
+)
+async def add_partner_document(
+    document: DocumentCreate,
+    partner_id: str = Path(..., description="The ID of the cab partner"),
+    db: Session = Depends(get_db),
+):
+    """
+    Uploads a partner compliance document (pending verification).
+    """
+    return _create_document(
+        db, DocumentOwnerType.PARTNER, partner_id, partner_id, document
+    )
+
+
+@app.get("/api/partners/{partner_id}/documents", response_model=List[Document])
+async def list_partner_documents(
+    partner_id: str = Path(..., description="The ID of the cab partner"),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Lists a partner's compliance documents.
+    """
+    return _list_documents(db, DocumentOwnerType.PARTNER, partner_id, partner_id)
+
+
+@app.post(
+    "/api/partners/{partner_id}/vehicles/{vehicle_id}/documents",
+    response_model=Document,
+    status_code=status.HTTP_201_CREATED,
+)
+async def add_vehicle_document(
+    document: DocumentCreate,
+    partner_id: str = Path(..., description="The ID of the cab partner"),
+    vehicle_id: str = Path(..., description="The ID of the vehicle"),
+    db: Session = Depends(get_db),
+):
+    """
+    Uploads a vehicle compliance document (pending verification).
+    """
+    return _create_document(
+        db, DocumentOwnerType.VEHICLE, partner_id, vehicle_id, document
+    )
+
+
+@app.get(
+    "/api/partners/{partner_id}/vehicles/{vehicle_id}/documents",
+    response_model=List[Document],
+)
+async def list_vehicle_documents(
+    partner_id: str = Path(..., description="The ID of the cab partner"),
+    vehicle_id: str = Path(..., description="The ID of the vehicle"),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Lists a vehicle's compliance documents.
+    """
+    return _list_documents(db, DocumentOwnerType.VEHICLE, partner_id, vehicle_id)
+
+
+@app.post(
+    "/api/partners/{partner_id}/drivers/{driver_id}/documents",
+    response_model=Document,
+    status_code=status.HTTP_201_CREATED,
+)
+async def add_driver_document(
+    document: DocumentCreate,
+    partner_id: str = Path(..., description="The ID of the cab partner"),
+    driver_id: str = Path(..., description="The ID of the driver"),
+    db: Session = Depends(get_db),
+):
+    """
+    Uploads a driver compliance document (pending verification).
+    """
+    return _create_document(
+        db, DocumentOwnerType.DRIVER, partner_id, driver_id, document
+    )
+
+
+@app.get(
+    "/api/partners/{partner_id}/drivers/{driver_id}/documents",
+    response_model=List[Document],
+)
+async def list_driver_documents(
+    partner_id: str = Path(..., description="The ID of the cab partner"),
+    driver_id: str = Path(..., description="The ID of the driver"),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Lists a driver's compliance documents.
+    """
+    return _list_documents(db, DocumentOwnerType.DRIVER, partner_id, driver_id)
+
+
+@app.put(
+    "/api/documents/{owner_type}/{document_id}/verification", response_model=Document
+)
+async def update_document_verification(
+    update_data: DocumentVerificationUpdate,
+    owner_type: DocumentOwnerType = Path(..., description="partner, vehicle or driver"),
+    document_id: int = Path(..., description="The ID of the document"),
+    db: Session = Depends(get_db),
+):
+    """
+    Verifies or rejects a document and reschedules the owner's expiry check
+    for that document type.
+    """
+    kind = DOCUMENT_KINDS[owner_type.value]
+    document = (
+        db.execute(
+            text(f"SELECT * FROM {kind.table} WHERE document_id = :document_id"),
+            {"document_id": document_id},
+        )
+        .mappings()
+        .first()
+    )
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Document {document_id} not found",
+        )
+
+    owner_id = document[kind.owner_column]
+    try:
+        db.execute(
+            text(f"""
+                UPDATE {kind.table} SET verification_status = :status
+                WHERE document_id = :document_id
+            """),
+            {"status": update_data.status.value, "document_id": document_id},
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Error updating verification of document %s", document_id)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to update document due to a database error.",
+        )
+
+    state_sync.changed(
+        "document", f"{owner_type.value}|{owner_id}|{document['document_type']}"
+    )
+    updated = (
+        db.execute(
+            text(f"SELECT * FROM {kind.table} WHERE document_id = :document_id"),
+            {"document_id": document_id},
+        )
+        .mappings()
+        .first()
+    )
+    return _document_from_row(owner_type, updated)
+
+
+@app.get("/api/documents/expiring", response_model=ExpiringDocumentsResponse)
+async def list_expiring_documents(
+    db: Session = Depends(get_read_db),
+    withinDays: int = Query(30, ge=0, le=365, description="Look-ahead window in days"),
+    ownerType: Optional[DocumentOwnerType] = Query(
+        None, description="Restrict to partner, vehicle or driver documents"
+    ),
+    verificationStatus: DocumentVerificationStatus = Query(
+        DocumentVerificationStatus.VERIFIED, description="Verification status"
+    ),
+    includeExpired: bool = Query(False, description="Also list already expired ones"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """
+    Lists documents expiring within the window, soonest first. Each table is
+    read with a range scan on its (verification_status, expiry_date) index.
+    """
+    today = today_utc()
+    params = {
+        "status": verificationStatus.value,
+        "until": (today + timedelta(days=withinDays)).isoformat(),
+        "limit": limit,
+    }
+    lower_bound = ""
+    if not includeExpired:
+        lower_bound = "AND expiry_date >= :today"
+        params["today"] = today.isoformat()
+
+    owner_types = [ownerType] if ownerType else list(DocumentOwnerType)
+    documents = []
+    for owner_type in owner_types:
+        kind = DOCUMENT_KINDS[owner_type.value]
+        rows = db.execute(
+            text(f"""
+                SELECT * FROM {kind.table}
+                WHERE verification_status = :status
+                  AND expiry_date <= :until {lower_bound}
+                ORDER BY expiry_date
+                LIMIT :limit
+            """),
+            params,
+        ).mappings()
+        documents.extend(_document_from_row(owner_type, d) for d in rows)
+
+    documents.sort(key=lambda d: d.expiryDate)
+    documents = documents[:limit]
+    return {"data": documents, "total": len(documents)}
+
+
+# ==================================
+# Service Area Endpoints
+# ==================================
+
+
+def _service_area_from_row(area) -> ServiceArea:
+    return ServiceArea(
+        areaId=area["area_id"],
+        partnerId=area["partner_id"],
+        city=area["city"],
+        region=area["region"],
+        country=area["country"],
+        active=bool(area["active"]),
+        latitude=area["center_latitude"],
+        longitude=area["center_longitude"],
+        radiusKm=area["radius_km"],
+    )
+
+
+# Longest range one stats request may cover, per granularity (days)
+STATS_MAX_RANGE_DAYS = {StatsGranularity.HOUR: 31, StatsGranularity.DAY: 366}
+
+
+def _stats_bucket(
+    period: str, totals: dict, fleet_minutes: float
+) -> PartnerStatsBucket:
+    finished = totals["trips_completed"] + totals["trips_cancelled"]
+    return PartnerStatsBucket(
+        period=period,
+        tripsCompleted=totals["trips_completed"],
+        tripsCancelled=totals["trips_cancelled"],
+        cancellationRate=(
+            round(totals["trips_cancelled"] / finished, 4) if finished else 0.0
+        ),
+        revenue=round(totals["revenue"], 2),
+        cancellationFees=round(totals["cancellation_fees"], 2),
+        rideMinutes=totals["ride_minutes"],
+        fleetUtilization=(
+            round(totals["ride_minutes"] / fleet_minutes, 4) if fleet_minutes else 0.0
+        ),
+    )
+
+
+@app.get("/api/partners/{partner_id}/stats", response_model=PartnerStatsResponse)
+async def get_partner_stats(
+    partner_id: str = Path(..., description="The ID of the cab partner"),
+    fromDate: Optional[date] = Query(
+        None, description="First day (UTC, default: 29 days before toDate)"
+    ),
+    toDate: Optional[date] = Query(None, description="Last day (UTC, default: today)"),
+    granularity: StatsGranularity = Query(
+        StatsGranularity.DAY, description="Bucket size"
+    ),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Trips, revenue, cancellation rate and fleet utilisation per hour or day.
+
+    Reads only the partner_stats rollup tables (one primary-key range scan)
+    plus the partner's vehicle count; buckets without finished trips are
+    omitted. Trips are bucketed by booking creation time, and utilisation is
+    ride minutes over the current fleet's available minutes.
+    """
+    to_date = toDate or today_utc()
+    from_date = fromDate or to_date - timedelta(days=29)
+    range_days = (to_date - from_date).days + 1
+    if range_days < 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="fromDate must not be after toDate",
+        )
+    if range_days > STATS_MAX_RANGE_DAYS[granularity]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{granularity.value} stats cover at most "
+            f"{STATS_MAX_RANGE_DAYS[granularity]} days",
+        )
+
+    check_query = "SELECT 1 FROM partners WHERE partner_id = :partner_id LIMIT 1"
+    if not db.execute(
+        text(check_query), {"partner_id": partner_id}
+    ).scalar_one_or_none():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Cab partner with ID {partner_id} not found",
+        )
+
+    fleet_size = db.execute(
+        text("SELECT COUNT(*) FROM vehicles WHERE partner_id = :partner_id"),
+        {"partner_id": partner_id},
+    ).scalar()
+
+    if granularity == StatsGranularity.HOUR:
+        table, bucket, bucket_minutes = "partner_stats_hourly", "hour", 60
+        lower = f"{from_date.isoformat()} 00:00:00"
+        upper = f"{(to_date + timedelta(days=1)).isoformat()} 00:00:00"
+    else:
+        table, bucket, bucket_minutes = "partner_stats_daily", "day", 24 * 60
+        lower = from_date.isoformat()
+        upper = (to_date + timedelta(days=1)).isoformat()
+    rows = (
+        db.execute(
+            text(f"""
+                SELECT {bucket} AS period, trips_completed, trips_cancelled,
+                       revenue, cancellation_fees, ride_minutes
+                FROM {table}
+                WHERE partner_id = :partner_id
+                  AND {bucket} >= :lower AND {bucket} < :upper
+                ORDER BY {bucket}
+            """),
+            {"partner_id": partner_id, "lower": lower, "upper": upper},
+        )
+        .mappings()
+        .all()
+    )
+
+    totals = dict.fromkeys(METRIC_COLUMNS, 0)
+    for row in rows:
+        for column in METRIC_COLUMNS:
+            totals[column] += row[column]
+
+    return PartnerStatsResponse(
+        partnerId=partner_id,
+        granularity=granularity,
+        fromDate=from_date.isoformat(),
+        toDate=to_date.isoformat(),
+        fleetSize=fleet_size,
+        totals=_stats_bucket(
+            f"{from_date.isoformat()}/{to_date.isoformat()}",
+            totals,
+            fleet_size * range_days * 24 * 60,
+        ),
+        buckets=[
+            _stats_bucket(str(row["period"]), row, fleet_size * bucket_minutes)
+            for row in rows
+        ],
+    )
+
+
+@app.get("/api/partners/{partner_id}/service-areas", response_model=List[ServiceArea])
+async def list_partner_service_areas(
+    partner_id: str = Path(..., description="The ID of the cab partner"),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Lists the cities/regions a partner operates in (served from the in-memory index).
+    """
+    check_query = "SELECT 1 FROM partners WHERE partner_id = :partner_id LIMIT 1"
+    if not db.execute(
+        text(check_query), {"partner_id": partner_id}
+    ).scalar_one_or_none():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Cab partner with ID {partner_id} not found",
+        )
+
+    return [
+        _service_area_from_row(area)
+        for area in service_area_index.areas_for_partner(partner_id)
+    ]
+
+
+@app.post(
+    "/api/partners/{partner_id}/service-areas",
+    response_model=ServiceArea,
+    status_code=status.HTTP_201_CREATED,
+)
+async def add_partner_service_area(
+    area: ServiceAreaCreate,
+    partner_id: str = Path(..., description="The ID of the cab partner"),
+    db: Session = Depends(get_db),
+):
+    """
+    Adds a service area to a partner and refreshes the coverage index.
+    A coverage circle (latitude, longitude, radiusKm) enables coordinate lookups.
+    """
+    check_query = "SELECT 1 FROM partners WHERE partner_id = :partner_id LIMIT 1"
+    if not db.execute(
+        text(check_query), {"partner_id": partner_id}
+    ).scalar_one_or_none():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Cab partner with ID {partner_id} not found",
+        )
+
+    circle = (area.latitude, area.longitude, area.radiusKm)
+    if any(v is not None for v in circle) and any(v is None for v in circle):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="latitude, longitude and radiusKm must be provided together",
+        )
+
+    # UNIQUE(partner_id, city, region, country) lets NULL regions through, so check explicitly
+    conflict_query = """
+    SELECT 1 FROM partner_service_areas
+    WHERE partner_id = :partner_id AND LOWER(city) = LOWER(:city)
+      AND region IS NOT DISTINCT FROM :region AND LOWER(country) = LOWER(:country)
+    LIMIT 1
+    """
+    params = {
+        "partner_id": partner_id,
+        "city": area.city.strip(),
+        "region": area.region.strip() if area.region else None,
+        "country": area.country.strip(),
+        "active": 1 if area.active else 0,
+        "latitude": area.latitude,
+        "longitude": area.longitude,
+        "radius_km": area.radiusKm,
+    }
+    if db.execute(text(conflict_query), params).scalar_one_or_none():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This service area is already registered for the partner.",
+        )
+
+    query = """
+    INSERT INTO partner_service_areas
+        (partner_id, city, region, country, active, center_latitude, center_longitude, radius_km)
+    VALUES
+        (:partner_id, :city, :region, :country, :active, :latitude, :longitude, :radius_km)
+    RETURNING area_id
+    """
+    try:
+        area_id = db.execute(text(query), params).scalar_one()
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This service area is already registered for the partner.",
+        )
+    except Exception:
+        db.rollback()
+        logger.exception("Error adding service area for partner %s", partner_id)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to add service area due to a database error.",
+        )
+
+    state_sync.changed("service_areas", partner_id)
+    created_query = "SELECT * FROM partner_service_areas WHERE area_id = :area_id"
+    created = db.execute(text(created_query), {"area_id": area_id}).mappings().first()
+    return _service_area_from_row(created)
+
+
+@app.delete(
+    "/api/partners/{partner_id}/service-areas/{area_id}",
+    response_model=MessageResponse,
+)
+async def delete_partner_service_area(
+    partner_id: str = Path(..., description="The ID of the cab partner"),
+    area_id: int = Path(..., description="The ID of the service area to remove"),
+    db: Session = Depends(get_db),
+):
+    """
+    Removes a service area from a partner and refreshes the coverage index.
+    """
+    try:
+        result = db.execute(
+            text("""DELETE FROM partner_service_areas
+                   WHERE area_id = :area_id AND partner_id = :partner_id"""),
+            {"area_id": area_id, "partner_id": partner_id},
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Error deleting service area %s", area_id)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to delete service area due to a database error.",
+        )
+
+    if result.rowcount == 0:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Service area {area_id} not found for partner {partner_id}",
+        )
+
+    state_sync.changed("service_areas", partner_id)
+    return {
+        "partnerId": partner_id,
+        "message": f"Service area {area_id} removed successfully",
+    }
+
+
+@app.get("/api/service-areas/coverage", response_model=CoverageResponse)
+async def lookup_service_coverage(
+    db: Session = Depends(get_read_db),
+    city: Optional[str] = Query(None, description="City name (case-insensitive)"),
+    region: Optional[str] = Query(None, description="Region/state name"),
+    country: Optional[str] = Query(None, description="Country name"),
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+):
+    """
+    Finds the active partners that serve a city/region/country or a coordinate.
+    Candidates come from the in-memory service-area index; the partners table is
+    only touched by primary key to filter out inactive partners.
+    """
+    if (latitude is None) != (longitude is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="latitude and longitude must be provided together",
+        )
+
+    if latitude is not None:
+        matches = service_area_index.lookup_point(latitude, longitude)
+        if city or region or country:
+            by_name = service_area_index.lookup(city, region, country)
+            matches = {pid: areas for pid, areas in matches.items() if pid in by_name}
+    elif city or region or country:
+        matches = service_area_index.lookup(city, region, country)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide city, region, country or latitude/longitude",
+        )
+
+    if not matches:
+        return {"data": [], "total": 0}
+
+    partners_query = text(
+        """SELECT partner_id, name, phone, email, address FROM partners
+           WHERE partner_id IN :partner_ids AND status = 'active'
+           ORDER BY name"""
+    ).bindparams(bindparam("partner_ids", expanding=True))
+    partners = (
+        db.execute(partners_query, {"partner_ids": list(matches)}).mappings().all()
+    )
+
+    data = [
+        CoveragePartner(
+            partnerId=p["partner_id"],
+            name=p["name"],
+            contact=ContactInfo(phone=p["phone"], email=p["email"]),
+            address=p["address"],
+            serviceAreas=[
+                _service_area_from_row(area) for area in matches[p["partner_id"]]
+            ],
+        )
+        for p in partners
+    ]
+    return {"data": data, "total": len(data)}
+
+
+# ==================================
+# Search Endpoints
+# ==================================
+
+
+@app.get("/api/search", response_model=SearchResponse)
+async def search(
+    q: str = Query(
+        ...,
+        min_length=1,
+        description="Search text; the last word is matched as a prefix",
+    ),
+    scope: SearchScope = Query(SearchScope.ALL, description="Which entities to search"),
+    limit: int = Query(10, ge=1, le=50, description="Maximum hits per entity type"),
+    prefix: bool = Query(True, description="Treat the last word as a prefix"),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Ranked full-text search over partners (name, address) and vehicles
+    (registration, make, model, type), served from the full-text indexes.
+    """
+    match = build_match_expression(q, prefix=prefix, dialect=db.get_bind().dialect.name)
+    if match is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Search text must contain at least one letter or digit",
+        )
+
+    partners = []
+    vehicles = []
+    if scope in (SearchScope.ALL, SearchScope.PARTNERS):
+        partners = [
+            PartnerSearchHit(
+                partnerId=row["partner_id"],
+                name=row["name"],
+                address=row["address"],
+                status=row["status"],
+                # bm25() is lower-is-better; expose a higher-is-better score
+                score=round(-row["score"], 4),
+            )
+            for row in search_partners(db, match, limit)
+        ]
+    if scope in (SearchScope.ALL, SearchScope.VEHICLES):
+        vehicles = [
+            VehicleSearchHit(
+                vehicleId=row["vehicle_id"],
+                partnerId=row["partner_id"],
+                type=row["type"],
+                registration=row["registration"],
+                status=row["status"],
+                make=row["make"],
+                model=row["model"],
+                score=round(-row["score"], 4),
+            )
+            for row in search_vehicles(db, match, limit)
+        ]
+
+    return SearchResponse(query=q, partners=partners, vehicles=vehicles)
+
+
+# ==================================
+# Fleet Analytics Endpoints
+# ==================================
+
+# Response field for each fleet_snapshot group dimension
+FLEET_GROUP_FIELDS = {"partner": "partnerId", "type": "vehicleType", "status": "status"}
+
+
+@app.get(
+    "/api/fleet/summary",
+    response_model=FleetSummaryResponse,
+    response_model_exclude_none=True,
+)
+async def fleet_summary(
+    group_by: str = Query(
+        "type,status",
+        alias="groupBy",
+        description="Comma-separated dimensions: partner, type, status",
+    ),
+    partner_id: Optional[str] = Query(None, alias="partnerId"),
+    vehicle_type: Optional[str] = Query(None, alias="vehicleType"),
+    vehicle_status: Optional[str] = Query(None, alias="status"),
+    limit: int = Query(100, ge=1, le=10000, description="Largest groups returned"),
+):
+    """
+    Vehicle counts grouped by partner, type and/or status, e.g. available
+    vehicles by type per partner with groupBy=partner,type&status=available.
+    Answered from the in-memory fleet snapshot, which trails vehicle writes
+    by at most FLEET_SNAPSHOT_INTERVAL seconds.
+    """
+    dimensions = [name.strip() for name in group_by.split(",") if name.strip()]
+    unknown = [name for name in dimensions if name not in GROUP_DIMENSIONS]
+    if unknown or len(set(dimensions)) != len(dimensions):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"groupBy takes distinct values from: {', '.join(GROUP_DIMENSIONS)}",
+        )
+
+    groups = fleet_snapshot.group_counts(
+        dimensions,
+        partner_id=partner_id,
+        vehicle_type=vehicle_type,
+        vehicle_status=vehicle_status,
+    )
+    refreshed_at = fleet_snapshot.refreshed_at
+    return FleetSummaryResponse(
+        groupBy=dimensions,
+        groups=[
+            FleetGroup(
+                count=count,
+                **{FLEET_GROUP_FIELDS[name]: value for name, value in values.items()},
+            )
+            for values, count in groups[:limit]
+        ],
+        totalGroups=len(groups),
+        totalVehicles=sum(count for _, count in groups),
+        refreshedAt=refreshed_at.isoformat() if refreshed_at else None,
+    )
+
+
+# ==================================
+# Fare Endpoints
+# ==================================
+
+# Routes accepted by one POST /api/fares
+MAX_FARE_ROUTES = 500
+
+
+def _fare_info(fare) -> FareInfo:
+    return FareInfo(
+        currency=CURRENCY, amount=round(fare.total, 2), breakdown=fare.breakdown()
+    )
+
+
+def _matchable_supply() -> Dict[str, int]:
+    """
+    Free drivers per vehicle type, from the in-memory registry.
+    """
+    return {
+        v_type: sum(by_status.get(s, 0) for s in MATCHABLE_STATUSES)
+        for v_type, by_status in driver_registry.supply_counts().items()
+        if v_type != "unassigned"
+    }
+
+
+@app.post("/api/fares/estimate", response_model=FareEstimateResponse)
+async def estimate_fare(request: FareEstimateRequest):
+    """
+    Estimated fare for one route, computed exactly as create_booking prices
+    it. With vehicleType, also how many drivers of that type are free.
+    """
+    fare = quote_route(
+        request.pickupLocation.latitude,
+        request.pickupLocation.longitude,
+        request.dropoffLocation.latitude,
+        request.dropoffLocation.longitude,
+    )
+    available_drivers = None
+    if request.vehicleType:
+        available_drivers = _matchable_supply().get(request.vehicleType, 0)
+    return FareEstimateResponse(
+        vehicleType=request.vehicleType,
+        distanceKm=round(fare.distance_km, 2),
+        estimatedDurationMin=fare.duration_min,
+        estimatedFare=_fare_info(fare),
+        availableDrivers=available_drivers,
+    )
+
+
+@app.post("/api/fares", response_model=FareOptionsResponse)
+async def get_fare_options(request: FareOptionsRequest):
+    """
+    Fare options per vehicle type in the fleet, for one route
+    (pickupLocation/dropoffLocation) or up to MAX_FARE_ROUTES in routes.
+
+    All routes are quoted in one pass and the vehicle types and free drivers
+    are read once from the in-memory registry, so a batch costs one request
+    and no database access instead of a call per route.
+    """
+    routes = list(request.routes or [])
+    if request.pickupLocation and request.dropoffLocation:
+        routes.insert(
+            0,
+            FareRoute(
+                pickupLocation=request.pickupLocation,
+                dropoffLocation=request.dropoffLocation,
+            ),
+        )
+    if not routes:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Pickup location and dropoff location, or routes, are required",
+        )
+    if len(routes) > MAX_FARE_ROUTES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_FARE_ROUTES} routes per request",
+        )
+
+    quotes = quote_routes(
+        (
+            route.pickupLocation.latitude,
+            route.pickupLocation.longitude,
+            route.dropoffLocation.latitude,
+            route.dropoffLocation.longitude,
+        )
+        for route in routes
+    )
+    supply = sorted(_matchable_supply().items())
+
+    data = []
+    for route, fare in zip(routes, quotes):
+        # The fare does not depend on the vehicle type (see fares.py)
+        fare_info = _fare_info(fare)
+        data.append(
+            RouteFareOptions(
+                pickupLocation=route.pickupLocation,
+                dropoffLocation=route.dropoffLocation,
+                distanceKm=round(fare.distance_km, 2),
+                estimatedDurationMin=fare.duration_min,
+                options=[
+                    FareOption(
+                        vehicleType=v_type,
+                        availableDrivers=available,
+                        estimatedFare=fare_info,
+                    )
+                    for v_type, available in supply
+                ],
+            )
+        )
+    return FareOptionsResponse(data=data)
+
+
+@app.post(
+    "/api/bookings", response_model=BookingResponse, status_code=status.HTTP_201_CREATED
+)
+async def create_booking(booking: BookingRequest, db: Session = Depends(get_db)):
+    """
+    Create a new cab booking request.
+
+    This endpoint accepts booking details including pickup and dropoff locations.
+    It creates a booking record and initiates the search for available drivers.
+    Checks for valid user and payment method. Calculates and stores an estimated fare.
+    NOTE: Commits before returning. The handler runs on the event loop, so an
+    uncommitted write would hold the database write lock while other requests
+    block on it.
+    """
+    # Generate a unique booking ID
+    booking_id = f"booking_{uuid.uuid4().hex[:12]}"  # Slightly longer ID
+
+    # Verify that the user exists and owns the payment method (cached, see
+    # payment_validation.py)
+    failure = payment_validation.check(db, booking.userId, booking.paymentMethodId)
+    if failure == USER_NOT_FOUND:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with ID {booking.userId} not found",
+        )
+    if failure == PAYMENT_METHOD_NOT_FOUND:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Payment method with ID {booking.paymentMethodId} not found or does not belong to user {booking.userId}",
+        )
+
+    # --- Fare Calculation Logic (see fares.py) ---
+    fare = quote_route(
+        booking.pickupLocation.latitude,
+        booking.pickupLocation.longitude,
+        booking.dropoffLocation.latitude,
+        booking.dropoffLocation.longitude,
+    )
+    currency = CURRENCY
+
+    # Perform database operations within the existing transaction scope
+    try:
+        # Insert the booking record
+        db.execute(
+            text("""
+                INSERT INTO bookings (
+                    booking_id, user_id, status,
+                    pickup_latitude, pickup_longitude, pickup_address,
+                    dropoff_latitude, dropoff_longitude, dropoff_address,
+                    vehicle_type, payment_method_id, estimated_fare_amount,
+                    estimated_fare_currency, estimated_distance, estimated_duration
+                ) VALUES (
+                    :booking_id, :user_id, :status,
+                    :pickup_latitude, :pickup_longitude, :pickup_address,
+                    :dropoff_latitude, :dropoff_longitude, :dropoff_address,
+                    :vehicle_type, :payment_method_id, :estimated_fare_amount,
+                    :estimated_fare_currency, :estimated_distance, :estimated_duration
+                )
+            """),
+            {
+                "booking_id": booking_id,
+                "user_id": booking.userId,
+                "status": BookingStatus.SEARCHING,
+                "pickup_latitude": booking.pickupLocation.latitude,
+                "pickup_longitude": booking.pickupLocation.longitude,
+                "pickup_address": booking.pickupLocation.address,
+                "dropoff_latitude": booking.dropoffLocation.latitude,
+                "dropoff_longitude": booking.dropoffLocation.longitude,
+                "dropoff_address": booking.dropoffLocation.address,
+                "vehicle_type": booking.vehicleType,
+                "payment_method_id": booking.paymentMethodId,
+                "estimated_fare_amount": round(fare.total, 2),
+                "estimated_fare_currency": currency,
+                "estimated_distance": round(fare.distance_km, 2),
+                "estimated_duration": fare.duration_min,
+            },
+        )
+
+        # Initial status in booking history, journaled at the commit, written behind
+        record_status_change(db, booking_id, BookingStatus.SEARCHING.value)
+
+        # Insert fare calculation record
+        db.execute(
+            text("""
+                INSERT INTO fare_calculations (
+                    booking_id, base_fare, distance_charge, time_charge,
+                    surge_multiplier, tax_amount, total_amount, currency
+                ) VALUES (
+                    :booking_id, :base_fare, :distance_charge, :time_charge,
+                    :surge_multiplier, :tax_amount, :total_amount, :currency
+                )
+            """),
+            {
+                "booking_id": booking_id,
+                "base_fare": round(fare.base_fare, 2),
+                "distance_charge": round(fare.distance_charge, 2),
+                "time_charge": round(fare.time_charge, 2),
+                "surge_multiplier": fare.surge_multiplier,
+                "tax_amount": round(fare.tax_amount, 2),
+                "total_amount": round(fare.total, 2),
+                "currency": currency,
+            },
+        )
+
+        db.commit()
+
+    except Exception as e:
+        db.rollback()
+        # Possibly a foreign key failure: the cached validation was stale
+        payment_validation.invalidate_user(booking.userId)
+        logger.exception("Database error during booking creation")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred while creating the booking: {e}",
+        ) from e
+
+    # In a real implementation, background tasks would start searching for drivers here.
+
+    return BookingResponse(
+        bookingId=booking_id,
+        status=BookingStatus.SEARCHING,
+        estimatedFare=FareInfo(
+            currency=currency,
+            amount=round(fare.total, 2),
+            breakdown=fare.breakdown(),
+        ),
+        message="Searching for nearby drivers...",
+    )
+
+
+def parse_datetime(dt_value):
+    if isinstance(dt_value, datetime):
+        return dt_value
+    elif isinstance(dt_value, str):
+        # Handle potential 'Z' suffix and spaces instead of 'T'
+        dt_str = dt_value.replace("Z", "+00:00").replace(" ", "T")
+        try:
+            # Attempt parsing, potentially handling microseconds if present
+            return datetime.fromisoformat(dt_str)
+        except ValueError:
+            logger.warning("Could not parse datetime string %r", dt_value)
+            return None  # Or raise an error, or return original string
+    return None
 
-    if not booking_result:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Booking with ID {booking_id} not found",
-        )
 
-    # Convert row to dictionary using ._mapping for reliability
-    # booking_data = dict(booking_result) <-- This caused the ValueError
-    if hasattr(booking_result, "_mapping"):
-        booking_data = dict(booking_result._mapping)
-    else:
-        # Fallback or raise error if _mapping is not available (should be for standard drivers)
-        raise TypeError(
-            "SQLAlchemy result object does not have a '_mapping' attribute."
-        )
+# Booking rows joined with their fare calculation components
+BOOKING_DETAIL_SELECT = """
+    SELECT
+        b.*,
+        fc.base_fare, fc.distance_charge, fc.time_charge,
+        fc.surge_multiplier, fc.tax_amount, fc.other_charges,
+        fc.total_amount AS calculated_total, fc.currency AS calculated_currency
+    FROM bookings b
+    LEFT JOIN fare_calculations fc ON b.booking_id = fc.booking_id
+"""
+
 
-    # Fetch driver details if assigned
-    driver_info = None
-    if booking_data.get("driver_id"):  # Use .get for safer access
-        driver_result = db.execute(
+def _booking_details_from_rows(
+    db: Session, bookings: List[dict]
+) -> List[BookingDetail]:
+    """
+    Builds BookingDetail responses for booking rows (joined with their
+    fare_calculations columns), fetching the assigned drivers and vehicles
+    with one query each.
+    """
+    driver_ids = {b["driver_id"] for b in bookings if b.get("driver_id")}
+    vehicle_ids = {b["vehicle_id"] for b in bookings if b.get("vehicle_id")}
+
+    # Fetch driver details for assigned drivers
+    drivers = {}
+    if driver_ids:
+        driver_rows = db.execute(
             text("""
                 SELECT driver_id, first_name, last_name, phone, average_rating
                 FROM drivers
-                WHERE driver_id = :driver_id
-            """),
-            {"driver_id": booking_data["driver_id"]},
-        ).fetchone()
-        if driver_result:
-            # Convert driver row to dictionary
-            if hasattr(driver_result, "_mapping"):
-                driver_dict = dict(driver_result._mapping)
-                driver_info = DriverInfo(
-                    driverId=driver_dict.get("driver_id"),
-                    name=f"{driver_dict.get('first_name', '')} {driver_dict.get('last_name', '')}".strip(),
-                    phone=driver_dict.get("phone"),
-                    # Handle potential None rating from DB
-                    rating=float(driver_dict.get("average_rating", 0.0) or 0.0),
-                )
-            else:
-                print("Warning: Could not convert driver result to dict.")
+                WHERE driver_id IN :driver_ids
+            """).bindparams(bindparam("driver_ids", expanding=True)),
+            {"driver_ids": list(driver_ids)},
+        ).mappings()
+        for driver_dict in driver_rows:
+            drivers[driver_dict["driver_id"]] = DriverInfo(
+                driverId=driver_dict.get("driver_id"),
+                name=f"{driver_dict.get('first_name', '')} {driver_dict.get('last_name', '')}".strip(),
+                phone=driver_dict.get("phone"),
+                # Handle potential None rating from DB
+                rating=float(driver_dict.get("average_rating", 0.0) or 0.0),
+            )
 
-    # Fetch vehicle details if assigned
-    vehicle_info = None
-    if booking_data.get("vehicle_id"):
-        vehicle_result = db.execute(
+    # Fetch vehicle details for assigned vehicles
+    vehicles = {}
+    if vehicle_ids:
+        vehicle_rows = db.execute(
             text("""
                 SELECT vehicle_id, make, model, color, registration
                 FROM vehicles
-                WHERE vehicle_id = :vehicle_id
-            """),
-            {"vehicle_id": booking_data["vehicle_id"]},
-        ).fetchone()
-        if vehicle_result:
-            # Convert vehicle row to dictionary
-            if hasattr(vehicle_result, "_mapping"):
-                vehicle_dict = dict(vehicle_result._mapping)
-                vehicle_info = VehicleInfo(
-                    vehicleId=vehicle_dict.get("vehicle_id"),
-                    make=vehicle_dict.get("make"),
-                    model=vehicle_dict.get("model"),
-                    color=vehicle_dict.get("color"),
-                    registration=vehicle_dict.get("registration"),
-                )
-            else:
-                print("Warning: Could not convert vehicle result to dict.")
+                WHERE vehicle_id IN :vehicle_ids
+            """).bindparams(bindparam("vehicle_ids", expanding=True)),
+            {"vehicle_ids": list(vehicle_ids)},
+        ).mappings()
+        for vehicle_dict in vehicle_rows:
+            vehicles[vehicle_dict["vehicle_id"]] = VehicleInfo(
+                vehicleId=vehicle_dict.get("vehicle_id"),
+                make=vehicle_dict.get("make"),
+                model=vehicle_dict.get("model"),
+                color=vehicle_dict.get("color"),
+                registration=vehicle_dict.get("registration"),
+            )
+
+    return [
+        _booking_detail_from_data(
+            booking_data,
+            drivers.get(booking_data.get("driver_id")),
+            vehicles.get(booking_data.get("vehicle_id")),
+        )
+        for booking_data in bookings
+    ]
 
+
+def _booking_detail_from_data(
+    booking_data: dict,
+    driver_info: Optional[DriverInfo],
+    vehicle_info: Optional[VehicleInfo],
+) -> BookingDetail:
     # Prepare estimated fare details
     estimated_fare = None
     if booking_data.get("estimated_fare_amount") is not None:
@@ -1090,9 +2739,16 @@ async def get_booking_details(
             eta=eta,
         )
     except Exception as e:
-        # Catch potential validation errors during Pydantic model creation
-        print(f"Error creating BookingDetail response model: {e}")
-        print(f"Data passed to model: {booking_data}")  # Log the data for debugging
+        # Catch potential validation errors during Pydantic model creation.
+        # Only the failing fields are logged: the row holds personal data
+        fields = []
+        if isinstance(e, ValidationError):
+            fields = [".".join(map(str, error["loc"])) for error in e.errors()]
+        logger.error(
+            "Error creating BookingDetail response model for %s",
+            booking_data.get("booking_id"),
+            extra={"errorType": type(e).__name__, "fields": fields},
+        )
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing booking data: {e}",
@@ -1101,7 +2757,261 @@ async def get_booking_details(
     return response_payload
 
 
-@app.post("/api/bookings/{booking_id}/cancel", response_model=CancelBookingResponse)
+# Bookings hold personal data: browsers may keep them but must revalidate,
+# shared caches must not store them
+BOOKING_CACHE_CONTROL = "private, no-cache"
+
+# The booking row and the driver/vehicle columns its detail renders
+BOOKING_VERSION_QUERY = """
+    SELECT b.*, d.first_name, d.last_name, d.phone, d.average_rating,
+           v.make, v.model, v.color, v.registration
+    FROM bookings b
+    LEFT JOIN drivers d ON d.driver_id = b.driver_id
+    LEFT JOIN vehicles v ON v.vehicle_id = b.vehicle_id
+    WHERE b.booking_id = :booking_id
+"""
+
+
+@app.get("/api/bookings/{booking_id}", response_model=BookingDetail)
+async def get_booking_details(
+    request: Request,
+    response: Response,
+    booking_id: str = Path(..., description="The ID of the booking to retrieve"),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Retrieve details of a specific booking.
+
+    This endpoint returns the current status and all available details of a booking,
+    including driver and vehicle information if assigned, and fare breakdown.
+    If-None-Match is answered with 304 after a single version lookup; archived
+    bookings never change, so their tag is the archive they live in.
+    """
+    version = (
+        db.execute(text(BOOKING_VERSION_QUERY), {"booking_id": booking_id})
+        .mappings()
+        .first()
+    )
+    if version is not None:
+        tag = etags.etag(*version.values())
+    else:
+        archive_name = None
+        if is_sqlite(db):
+            archive_name = db.execute(
+                text(
+                    "SELECT archive_name FROM booking_archive_index "
+                    "WHERE booking_id = :booking_id"
+                ),
+                {"booking_id": booking_id},
+            ).scalar()
+        if archive_name is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Booking with ID {booking_id} not found",
+            )
+        tag = etags.etag(booking_id, archive_name)
+
+    if etags.matches(request.headers.get("if-none-match"), tag):
+        return etags.not_modified(tag, BOOKING_CACHE_CONTROL)
+    etags.set_headers(response, tag, BOOKING_CACHE_CONTROL)
+    return _load_booking_detail(db, booking_id)
+
+
+def _load_booking_detail(db: Session, booking_id: str) -> BookingDetail:
+    # Fetch booking details along with fare calculation components
+    booking_query = BOOKING_DETAIL_SELECT + " WHERE b.booking_id = :booking_id"
+    booking_result = db.execute(
+        text(booking_query), {"booking_id": booking_id}
+    ).fetchone()
+
+    if booking_result:
+        # Convert row to dictionary using ._mapping for reliability
+        booking_data = dict(booking_result._mapping)
+    else:
+        # Finished bookings may have been moved to a monthly archive
+        booking_data = find_archived_booking(db, booking_id, booking_query)
+        if booking_data is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Booking with ID {booking_id} not found",
+            )
+
+    return _booking_details_from_rows(db, [booking_data])[0]
+
+
+HISTORY_QUERY = """
+    SELECT status, created_at FROM booking_status_history
+    WHERE booking_id = :booking_id
+    ORDER BY created_at, id
+"""
+
+
+@app.get("/api/bookings/{booking_id}/history", response_model=BookingTimelineResponse)
+async def get_booking_history(
+    booking_id: str = Path(..., description="The ID of the booking"),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Every status the booking went through, oldest first. Includes
+    transitions this worker has not written to the table yet.
+    """
+    rows = [
+        dict(row)
+        for row in db.execute(text(HISTORY_QUERY), {"booking_id": booking_id})
+        .mappings()
+        .all()
+    ]
+    if not rows:
+        exists = db.execute(
+            text("SELECT 1 FROM bookings WHERE booking_id = :booking_id"),
+            {"booking_id": booking_id},
+        ).first()
+        if not exists:
+            rows = find_archived_rows(db, booking_id, HISTORY_QUERY)
+            if rows is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Booking with ID {booking_id} not found",
+                )
+
+    seen = {(row["status"], str(row["created_at"])) for row in rows}
+    for entry in status_history.queued_for(booking_id):
+        if (entry["status"], entry["created_at"]) not in seen:
+            rows.append(entry)
+    rows.sort(key=lambda row: str(row["created_at"]))
+
+    return BookingTimelineResponse(
+        bookingId=booking_id,
+        events=[
+            BookingStatusEvent(status=row["status"], timestamp=str(row["created_at"]))
+            for row in rows
+        ],
+    )
+
+
+def _encode_booking_cursor(created_at, booking_id: str) -> str:
+    raw = json.dumps([str(created_at), booking_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_booking_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, booking_id = json.loads(base64.urlsafe_b64decode(padded))
+        return str(created_at), str(booking_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor",
+        )
+
+
+@app.get("/api/users/{user_id}/bookings", response_model=PaginatedBookings)
+async def list_user_bookings(
+    user_id: str = Path(..., description="The ID of the user"),
+    bookingStatus: Optional[BookingStatus] = Query(
+        None, alias="status", description="Only bookings with this status"
+    ),
+    fromDate: Optional[date] = Query(None, description="Created on or after (UTC)"),
+    toDate: Optional[date] = Query(None, description="Created on or before (UTC)"),
+    limit: int = Query(20, ge=1, le=100, description="Number of items per page"),
+    cursor: Optional[str] = Query(None, description="nextCursor of the previous page"),
+    includeArchived: bool = Query(
+        False, description="Also list bookings moved to the monthly archives"
+    ),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Lists a user's bookings, newest first, with keyset pagination.
+
+    The page of booking IDs comes from the covering index
+    idx_bookings_user_history, so filtering and paging never read the wide
+    booking rows; only the bookings on the returned page are fetched.
+    """
+    user_exists = db.execute(
+        text("SELECT 1 FROM users WHERE user_id = :user_id"), {"user_id": user_id}
+    ).scalar()
+    if not user_exists:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with ID {user_id} not found",
+        )
+
+    where_clauses = ["user_id = :user_id"]
+    params = {"user_id": user_id, "limit": limit + 1}
+    if bookingStatus:
+        where_clauses.append("status = :status")
+        params["status"] = bookingStatus.value
+    if fromDate:
+        where_clauses.append("created_at >= :from_date")
+        params["from_date"] = fromDate.isoformat()
+    if toDate:
+        where_clauses.append("created_at < :to_date")
+        params["to_date"] = (toDate + timedelta(days=1)).isoformat()
+    if cursor:
+        where_clauses.append(
+            "(created_at, booking_id) < (:cursor_created_at, :cursor_booking_id)"
+        )
+        params["cursor_created_at"], params["cursor_booking_id"] = (
+            _decode_booking_cursor(cursor)
+        )
+    where_sql = " AND ".join(where_clauses)
+
+    sources = [
+        f"SELECT booking_id, created_at, 0 AS archived FROM bookings WHERE {where_sql}"
+    ]
+    if includeArchived and is_sqlite(db):
+        sources.append(
+            "SELECT booking_id, created_at, 1 AS archived "
+            f"FROM booking_archive_index WHERE {where_sql}"
+        )
+    page_query = (
+        " UNION ALL ".join(sources)
+        + " ORDER BY created_at DESC, booking_id DESC LIMIT :limit"
+    )
+    page = db.execute(text(page_query), params).mappings().all()
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    # Only the bookings on this page are read in full
+    detail_query = BOOKING_DETAIL_SELECT + " WHERE b.booking_id = :booking_id"
+    bookings_by_id = {}
+    hot_ids = [row["booking_id"] for row in page if not row["archived"]]
+    if hot_ids:
+        rows = db.execute(
+            text(
+                BOOKING_DETAIL_SELECT + " WHERE b.booking_id IN :booking_ids"
+            ).bindparams(bindparam("booking_ids", expanding=True)),
+            {"booking_ids": hot_ids},
+        ).mappings()
+        bookings_by_id.update((row["booking_id"], dict(row)) for row in rows)
+    for row in page:
+        if row["archived"]:
+            archived = find_archived_booking(db, row["booking_id"], detail_query)
+            if archived:
+                bookings_by_id[row["booking_id"]] = archived
+
+    bookings = [
+        bookings_by_id[row["booking_id"]]
+        for row in page
+        if row["booking_id"] in bookings_by_id
+    ]
+    next_cursor = None
+    if has_more:
+        next_cursor = _encode_booking_cursor(
+            page[-1]["created_at"], page[-1]["booking_id"]
+        )
+
+    return {
+        "data": _booking_details_from_rows(db, bookings),
+        "pagination": {
+            "itemsPerPage": limit,
+            "hasMore": has_more,
+            "nextCursor": next_cursor,
+        },
+    }
+
+
 @app.post("/api/bookings/{booking_id}/cancel", response_model=CancelBookingResponse)
 async def cancel_booking(
     booking_id: str = Path(..., description="The ID of the booking to cancel"),
@@ -1116,7 +3026,7 @@ async def cancel_booking(
     Allows cancellation if the booking is not already completed or cancelled.
     Applies a cancellation fee based on the booking status at the time of cancellation
     (e.g., if CONFIRMED or DRIVER_ARRIVED). Updates driver/vehicle status if assigned.
-    NOTE: Assumes transaction commit/rollback is handled externally.
+    NOTE: Commits before returning (see create_booking).
     """
     cancellation_fee = None
     message = "Booking cancelled successfully."
@@ -1192,21 +3102,14 @@ async def cancel_booking(
             },
         )
 
-        # Add entry to booking status history
-        db.execute(
-            text("""
-                INSERT INTO booking_status_history (booking_id, status)
-                VALUES (:booking_id, :status)
-            """),
-            # Use Enum value here as well
-            {"booking_id": booking_id, "status": BookingStatus.CANCELLED.value},
-        )
+        # Add entry to booking status history (journaled at the commit)
+        record_status_change(db, booking_id, BookingStatus.CANCELLED.value)
 
         # If the booking had an assigned driver, make them available again
         driver_id = booking_data.get("driver_id")
         if driver_id:
             # Consider checking current driver status before updating
-            db.execute(
+            released = db.execute(
                 text("""
                     UPDATE drivers
                     SET status = 'available' -- Or appropriate status based on your logic
@@ -1214,6 +3117,8 @@ async def cancel_booking(
                 """),
                 {"driver_id": driver_id},
             )
+            if released.rowcount:
+                after_commit(db, lambda: state_sync.changed("driver", driver_id))
 
         # If the booking had an assigned vehicle, make it available again
         vehicle_id = booking_data.get("vehicle_id")
@@ -1228,13 +3133,11 @@ async def cancel_booking(
                 {"vehicle_id": vehicle_id},
             )
 
-        # Commit is expected to be handled externally
+        db.commit()
 
     except Exception as e:
-        # If an error occurs, the external handler should rollback.
-        # Re-raise the exception for the external handler.
-        # You might want to log the error here.
-        # logger.error(f"Database error during booking cancellation: {e}")
+        db.rollback()
+        logger.exception("Database error during booking cancellation")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An error occurred while cancelling the booking: {e}",
@@ -1248,7 +3151,6 @@ async def cancel_booking(
     )
 
 
-@app.put("/api/bookings/{booking_id}/destination", response_model=BookingDetail)
 @app.put("/api/bookings/{booking_id}/destination", response_model=BookingDetail)
 async def update_destination(
     booking_id: str = Path(..., description="The ID of the booking to update"),
@@ -1262,7 +3164,7 @@ async def update_destination(
     Recalculates the estimated fare based on the original pickup and the new destination.
     Updates the booking record and the associated fare calculation record.
     Returns the full updated booking details.
-    NOTE: Assumes transaction commit/rollback is handled externally.
+    NOTE: Commits before returning (see create_booking).
     """
     # Fetch current booking details
     booking_result = db.execute(
@@ -1311,34 +3213,8 @@ async def update_destination(
             detail="Booking is missing pickup location coordinates.",
         )
 
-    R = 6371  # Earth radius in km
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = (
-        math.sin(dlat / 2) ** 2
-        + math.cos(math.radians(lat1))
-        * math.cos(math.radians(lat2))
-        * math.sin(dlon / 2) ** 2
-    )
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    new_distance_km = R * c
-
-    # Use simple fare logic (same as create_booking for consistency)
-    # Fetch original components if needed for more complex logic
-    base_fare = 50.0  # Example: fetch from original fare_calculations if needed
-    distance_charge_per_km = 12.0
-    time_charge_per_min = 1.5
-    new_estimated_duration_min = int(new_distance_km * 2.5)
-
-    new_distance_charge = new_distance_km * distance_charge_per_km
-    new_time_charge = new_estimated_duration_min * time_charge_per_min
-    surge_multiplier = 1.0  # Fetch from original fare_calc if needed
-    tax_rate = 0.05  # Fetch from original fare_calc if needed
-
-    new_subtotal = base_fare + new_distance_charge + new_time_charge
-    new_estimated_fare_before_tax = new_subtotal * surge_multiplier
-    new_tax_amount = new_estimated_fare_before_tax * tax_rate
-    new_estimated_fare_total = new_estimated_fare_before_tax + new_tax_amount
+    # Same fare logic as create_booking (see fares.py)
+    fare = quote_route(lat1, lon1, lat2, lon2)
     currency = booking_data.get(
         "estimated_fare_currency", "INR"
     )  # Use original currency
@@ -1362,9 +3238,9 @@ async def update_destination(
                 "latitude": new_location.latitude,
                 "longitude": new_location.longitude,
                 "address": new_location.address,
-                "fare_amount": round(new_estimated_fare_total, 2),
-                "distance": round(new_distance_km, 2),
-                "duration": new_estimated_duration_min,
+                "fare_amount": round(fare.total, 2),
+                "distance": round(fare.distance_km, 2),
+                "duration": fare.duration_min,
                 "booking_id": booking_id,
             },
         )
@@ -1385,40 +3261,347 @@ async def update_destination(
             update_fare_calc_sql,
             {
                 "booking_id": booking_id,
-                "base_fare": round(base_fare, 2),
-                "distance_charge": round(new_distance_charge, 2),
-                "time_charge": round(new_time_charge, 2),
-                "tax_amount": round(new_tax_amount, 2),
-                "total_amount": round(new_estimated_fare_total, 2),
+                "base_fare": round(fare.base_fare, 2),
+                "distance_charge": round(fare.distance_charge, 2),
+                "time_charge": round(fare.time_charge, 2),
+                "tax_amount": round(fare.tax_amount, 2),
+                "total_amount": round(fare.total, 2),
             },
         )
+        db.commit()
 
     except Exception as e:
+        db.rollback()
+        logger.exception("Error updating destination for booking %s", booking_id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An error occurred while updating the destination: {e}",
         ) from e
 
-    updated_booking_details = await get_booking_details(booking_id=booking_id, db=db)
+    updated_booking_details = _load_booking_detail(db, booking_id)
     return updated_booking_details
 
 
+@app.post(
+    "/api/bookings/{booking_id}/review",
+    response_model=ReviewResponse,
+    status_code=status.HTTP_201_CREATED,
+)
+async def submit_review(
+    review: ReviewCreate,
+    booking_id: str = Path(..., description="The ID of the completed booking"),
+    db: Session = Depends(get_db),
+):
+    """
+    Submit the rider's review of the driver for a completed booking.
+
+    One review per booking. The driver's average_rating/total_reviews are
+    updated incrementally in the same transaction.
+    NOTE: Commits before returning (see create_booking).
+    """
+    booking = (
+        db.execute(
+            text("""
+                SELECT booking_id, user_id, driver_id, status
+                FROM bookings WHERE booking_id = :booking_id
+            """),
+            {"booking_id": booking_id},
+        )
+        .mappings()
+        .first()
+    )
+    if not booking:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Booking with ID {booking_id} not found",
+        )
+    if booking["user_id"] != review.userId:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the rider who made the booking can review it",
+        )
+    if booking["status"] != BookingStatus.COMPLETED.value:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cannot review a booking with status: {booking['status']}",
+        )
+    if not booking["driver_id"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Booking has no driver to review",
+        )
+
+    already_reviewed = db.execute(
+        text("SELECT 1 FROM reviews WHERE booking_id = :booking_id"),
+        {"booking_id": booking_id},
+    ).scalar()
+    if already_reviewed:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Booking {booking_id} has already been reviewed",
+        )
+
+    review_id = f"review_{uuid.uuid4().hex[:12]}"
+    try:
+        db.execute(
+            text("""
+                INSERT INTO reviews (review_id, booking_id, user_id, driver_id, rating, comment)
+                VALUES (:review_id, :booking_id, :user_id, :driver_id, :rating, :comment)
+            """),
+            {
+                "review_id": review_id,
+                "booking_id": booking_id,
+                "user_id": review.userId,
+                "driver_id": booking["driver_id"],
+                "rating": review.rating,
+                "comment": review.comment,
+            },
+        )
+        apply_review(db, booking["driver_id"], review.rating)
+        aggregates = (
+            db.execute(
+                text("""
+                    SELECT average_rating, total_reviews FROM drivers
+                    WHERE driver_id = :driver_id
+                """),
+                {"driver_id": booking["driver_id"]},
+            )
+            .mappings()
+            .first()
+        )
+        db.commit()
+    except IntegrityError:
+        # A concurrent request reviewed the booking first (UNIQUE booking_id)
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Booking {booking_id} has already been reviewed",
+        )
+    except Exception:
+        db.rollback()
+        logger.exception("Error saving review for booking %s", booking_id)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to save the review due to a database error.",
+        )
+
+    return ReviewResponse(
+        reviewId=review_id,
+        bookingId=booking_id,
+        driverId=booking["driver_id"],
+        rating=review.rating,
+        comment=review.comment,
+        driverRating=round(float(aggregates["average_rating"] or 0.0), 2),
+        driverTotalReviews=int(aggregates["total_reviews"] or 0),
+    )
+
+
+# ==================================
+# Batch Endpoints
+# ==================================
+
+# Sub-requests accepted by one POST /api/batch
+MAX_BATCH_REQUESTS = 25
+# Read endpoints a batch may call: partners (with their vehicles, drivers,
+# documents, ...) and bookings
+BATCH_PATH_PREFIXES = ("/api/partners/", "/api/bookings/")
+
+
+@app.post("/api/batch", response_model=BatchResponse)
+async def batch_requests(request: Request, batch: BatchRequest):
+    """
+    Runs several partner, vehicle and booking GETs in one round trip, e.g.
+    a booking, its partner and the partner's vehicles for one screen.
+    Sub-requests run one after another (see batch.py) and identical paths
+    are run once; each response carries its own status and body, in request
+    order.
+    """
+    if not batch.requests:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide at least one request",
+        )
+    if len(batch.requests) > MAX_BATCH_REQUESTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_REQUESTS} requests per batch",
+        )
+    for sub_request in batch.requests:
+        path = sub_request.path.partition("?")[0]
+        if not (path == "/api/partners" or path.startswith(BATCH_PATH_PREFIXES)):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Path not allowed in a batch: {sub_request.path}",
+            )
+
+    results = await run_batch(
+        request.app, request.scope, [r.path for r in batch.requests]
+    )
+    return BatchResponse(
+        responses=[
+            BatchSubResponse(id=r.id, path=r.path, status=status_code, body=body)
+            for r, (status_code, body) in zip(batch.requests, results)
+        ]
+    )
+
+
+@app.post("/api/admin/driver-ratings/recompute", response_model=RatingRecomputeResponse)
+def recompute_driver_rating_aggregates(
+    chunk_size: int = Query(5000, ge=100, le=100000, description="Rows per chunk"),
+):
+    """
+    Repairs drifted driver rating aggregates, one chunk of drivers at a time.
+    Runs in the threadpool so the event loop stays responsive.
+    """
+    return recompute_driver_ratings(engine, chunk_size=chunk_size)
+
+
+@app.post("/api/admin/bookings/archive", response_model=BookingArchiveResponse)
+def archive_finished_bookings(
+    older_than_days: int = Query(
+        90, ge=1, description="Archive completed/cancelled bookings older than this"
+    ),
+    batch_size: int = Query(1000, ge=10, le=10000, description="Bookings per batch"),
+    vacuum: bool = Query(False, description="Shrink the hot database afterwards"),
+):
+    """
+    Moves finished bookings with their status history and fare rows into
+    monthly archive databases. Runs in the threadpool like the rating job.
+    """
+    if not is_sqlite(engine):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Booking archival is only supported on the SQLite backend",
+        )
+    return archive_bookings(
+        engine, older_than_days=older_than_days, batch_size=batch_size, vacuum=vacuum
+    )
+
+
+@app.post("/api/admin/snapshots", response_model=SnapshotResponse)
+def snapshot_database(
+    method: SnapshotMethod = Query(
+        SnapshotMethod.BACKUP,
+        description="backup copies in short steps; vacuum writes a compacted copy",
+    ),
+):
+    """
+    Snapshots the live database into SNAPSHOT_DIR while writes go on; restore
+    and container seeding are in the snapshots.py CLI. Runs in the threadpool
+    like the rating job.
+    """
+    if not is_sqlite(engine):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Snapshots are only supported on the SQLite backend",
+        )
+    try:
+        return create_snapshot(engine.url.database, method=method.value)
+    except SnapshotError as e:
+        logger.error("Snapshot failed: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
+        )
+
+
+@app.post(
+    "/api/admin/partner-stats/rebuild", response_model=PartnerStatsRebuildResponse
+)
+def rebuild_partner_stat_rollups(
+    chunk_size: int = Query(5000, ge=100, le=100000, description="Rows per chunk"),
+):
+    """
+    Recomputes the partner dashboard rollups from the raw booking rows
+    (including archived ones). Runs in the threadpool like the rating job.
+    """
+    return rebuild_partner_stats(engine, chunk_size=chunk_size)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """
+    Request, SQL statement, pool and index metrics of this worker process.
+    """
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/api/admin/slow-queries", response_model=SlowQueryLogResponse)
+async def list_slow_queries():
+    """
+    Statements slower than SLOW_QUERY_MS in this worker, newest first, with
+    their query plans. Empty unless SLOW_QUERY_MS is set.
+    """
+    return SlowQueryLogResponse(
+        thresholdMs=profiling.SLOW_QUERY_MS, data=profiling.recent_slow_queries()
+    )
+
+
+@app.post("/api/admin/profile", response_class=Response)
+def profile_worker(
+    seconds: float = Query(10, gt=0, le=60, description="Sampling duration"),
+    interval_ms: float = Query(10, ge=1, le=1000, description="Sampling interval"),
+):
+    """
+    Samples every thread of this worker (event loop and threadpool) and
+    returns folded stacks for a flame graph. Requires PROFILING_ENABLED=1.
+    Runs in the threadpool, so the event loop keeps serving while sampled.
+    """
+    if not profiling.PROFILING_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Profiling is disabled; set PROFILING_ENABLED=1",
+        )
+    try:
+        stacks = profiling.sample_stacks(seconds, interval_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return Response(content=profiling.folded(stacks), media_type="text/plain")
+
+
 if __name__ == "__main__":
-    print("--- Starting FastAPI Application with SQLite Backend ---")
-    print(f"--- Database URL: {SQLALCHEMY_DATABASE_URL} ---")
-
-    db_file = SQLALCHEMY_DATABASE_URL.split("///./")[-1]
-    if not os.path.exists(db_file):
-        print(f"\nWARNING: Database file '{db_file}' not found.")
-        print("Please ensure you have created it using the SQLite schema script:")
-        print(f"  sqlite3 {db_file} < schema.sqlite.sql\n")
-    else:
-        print(f"--- Found database file: {db_file} ---")
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the Cab Management API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=WORKERS,
+        help="Worker processes sharing the database (default: $WEB_CONCURRENCY or 1)",
+    )
+    parser.add_argument(
+        "--reload", action="store_true", help="Auto-reload on code changes (dev only)"
+    )
+    args = parser.parse_args()
+
+    print(f"--- Starting FastAPI Application with {engine.dialect.name} Backend ---")
+    print(f"--- Database URL: {describe_url(SQLALCHEMY_DATABASE_URL)} ---")
+
+    if is_sqlite(engine):
+        db_file = SQLALCHEMY_DATABASE_URL.split("///./")[-1]
+        if not os.path.exists(db_file):
+            print(f"\nWARNING: Database file '{db_file}' not found.")
+            print("Please ensure you have created it using the SQLite schema script:")
+            print(f"  sqlite3 {db_file} < source.sql\n")
+        else:
+            print(f"--- Found database file: {db_file} ---")
+
+    if args.reload and args.workers > 1:
+        parser.error("--reload cannot be combined with --workers > 1")
+    # Workers read this to enable the cross-worker state sync
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    print(f"--- Workers: {args.workers} ---")
+
+    # Imported here: gunicorn workers and the benchmarks import the app
+    # without ever needing it
+    import uvicorn
 
     # Run the FastAPI application using Uvicorn
     uvicorn.run(
         "main:app",  # Points to the 'app' instance in the 'main.py' file
-        host="0.0.0.0",  # Listen on all available network interfaces
-        port=8000,  # Standard port for development
-        reload=True,  # Enable auto-reload for development convenience
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        reload=args.reload,
     )
@@ -0,0 +1,397 @@
+"""
+Prometheus metrics, served at /metrics in the text exposition format.
+
+    http_requests_total{method,route,status}
+    http_request_duration_seconds{method,route}        histogram
+    db_statement_duration_seconds{route,statement}     histogram
+    db_statement_errors_total{route,statement}
+    db_statement_cache_total{pool,result}              SQLAlchemy compiled cache
+    db_pool_checkout_wait_seconds{pool}                histogram
+    db_pool_connections{pool,state}                    gauge, read at scrape
+    in_memory_index_entries{index}                     gauge, read at scrape
+    log_records_dropped_total{reason}                  sampled / queue_full
+    http_requests_shed_total{reason}                   see admission.py
+    payment_validation_cache_total{result}             hit / miss
+
+Statements are timed by engine event hooks and labelled with the route that
+issued them ("background" outside requests) and a statement name: the
+statement's `statement_name` execution option if set, else derived from the
+SQL ("SELECT vehicles", "UPDATE drivers"). Recording is a bisect plus a short
+lock per observation, cheap enough to leave on in production.
+
+Values are per process; with several workers each scrape reaches one of them.
+"""
+
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+from sqlalchemy.pool import QueuePool
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; requests and statements share one layout (1 ms .. 10 s)
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, labels: tuple, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        for labels, value in values:
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            )
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...],
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = [
+                (labels, list(series)) for labels, series in self._series.items()
+            ]
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for labels, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                label_text = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {series[-1]}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """
+    A gauge whose values are read from a callback at scrape time.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...],
+        collect: Callable[[], Iterable[Tuple[tuple, float]]],
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+        ]
+        for labels, value in self.collect():
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            )
+        return lines
+
+
+http_requests = Counter(
+    "http_requests_total",
+    "HTTP requests by route and status",
+    ("method", "route", "status"),
+)
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route")
+)
+statement_duration = Histogram(
+    "db_statement_duration_seconds", "SQL statement latency", ("route", "statement")
+)
+statement_errors = Counter(
+    "db_statement_errors_total", "SQL statements that raised", ("route", "statement")
+)
+statement_cache = Counter(
+    "db_statement_cache_total",
+    "SQLAlchemy compiled statement cache lookups",
+    ("pool", "result"),
+)
+pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection",
+    ("pool",),
+)
+log_records_dropped = Counter(
+    "log_records_dropped_total",
+    "Log records dropped by sampling or a full log queue",
+    ("reason",),
+)
+
+requests_shed = Counter(
+    "http_requests_shed_total",
+    "Requests rejected by rate limiting or write admission control",
+    ("reason",),
+)
+
+validation_cache = Counter(
+    "payment_validation_cache_total",
+    "Booking user and payment method validations by cache result",
+    ("result",),
+)
+
+_engines: Dict[str, object] = {}
+_indexes: Dict[str, Callable[[], int]] = {}
+
+
+def _pool_connections():
+    for name, engine in list(_engines.items()):
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            yield (name, "checked_out"), pool.checkedout()
+            yield (name, "idle"), pool.checkedin()
+            yield (name, "overflow"), max(pool.overflow(), 0)
+
+
+def _index_entries():
+    for name, size in list(_indexes.items()):
+        yield (name,), size()
+
+
+pool_connections = Gauge(
+    "db_pool_connections",
+    "Pooled connections by state",
+    ("pool", "state"),
+    _pool_connections,
+)
+index_entries = Gauge(
+    "in_memory_index_entries",
+    "Entries in the in-process indexes",
+    ("index",),
+    _index_entries,
+)
+
+REGISTRY = (
+    http_requests,
+    http_request_duration,
+    statement_duration,
+    statement_errors,
+    statement_cache,
+    pool_checkout_wait,
+    pool_connections,
+    index_entries,
+    log_records_dropped,
+    requests_shed,
+    validation_cache,
+)
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def register_index(name: str, size: Callable[[], int]):
+    """
+    Reports size() as in_memory_index_entries{index=name} at scrape time.
+    """
+    _indexes[name] = size
+
+
+# --- Request context ---
+
+# ASGI scope of the request being served; the router adds the matched route
+# to it, so statements can be attributed to the route template
+_request_scope: ContextVar[Optional[dict]] = ContextVar("request_scope", default=None)
+
+
+def current_route() -> str:
+    """
+    Route template of the request being served, or "background".
+    """
+    return route_label(_request_scope.get())
+
+
+def route_label(scope: Optional[dict]) -> str:
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+async def record_request(request, call_next):
+    """
+    HTTP middleware: times the request and labels it with its route template.
+    """
+    token = _request_scope.set(request.scope)
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        _request_scope.reset(token)
+        route = route_label(request.scope)
+        http_request_duration.observe((request.method, route), elapsed)
+        http_requests.inc((request.method, route, str(status_code)))
+
+
+# --- SQL statements ---
+
+_TABLE_PATTERNS = {
+    "SELECT": re.compile(r"\bFROM\s+([\w.]+)", re.IGNORECASE),
+    "DELETE": re.compile(r"\bFROM\s+([\w.]+)", re.IGNORECASE),
+    "INSERT": re.compile(r"\bINTO\s+([\w.]+)", re.IGNORECASE),
+    "UPDATE": re.compile(r"^\s*UPDATE\s+(?:OR\s+\w+\s+)?([\w.]+)", re.IGNORECASE),
+    "PRAGMA": re.compile(r"^\s*PRAGMA\s+([\w.]+)", re.IGNORECASE),
+}
+
+
+@lru_cache(maxsize=4096)
+def statement_name(statement: str) -> str:
+    """
+    A low-cardinality name for a SQL string, e.g. "SELECT partners".
+    """
+    words = statement.split(None, 1)
+    if not words:
+        return "EMPTY"
+    verb = words[0].upper()
+    pattern = _TABLE_PATTERNS.get(verb)
+    match = pattern.search(statement) if pattern else None
+    return f"{verb} {match.group(1)}" if match else verb
+
+
+def _label(context, statement: str) -> tuple:
+    name = None
+    if context is not None:
+        name = context.execution_options.get("statement_name")
+    return current_route(), name or statement_name(statement)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is not None:
+        statement_duration.observe(
+            _label(context, statement), time.perf_counter() - started
+        )
+
+
+def _handle_error(exception_context):
+    statement = exception_context.statement
+    if statement:
+        statement_errors.inc(_label(exception_context.execution_context, statement))
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waited for a connection.
+    The pool's logging_name (set by instrument_engine) is the pool label.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout_wait.observe(
+                (self._orig_logging_name or "default",),
+                time.perf_counter() - started,
+            )
+
+
+def instrument_engine(engine, name: str):
+    """
+    Times every statement run through engine and reports its pool under name.
+    """
+    _engines[name] = engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+    def _count_cache_lookup(conn, clauseelement, multiparams, params, options, result):
+        cache_hit = getattr(result.context, "cache_hit", None)
+        if cache_hit is CACHE_HIT:
+            statement_cache.inc((name, "hit"))
+        elif cache_hit is CACHE_MISS:
+            statement_cache.inc((name, "miss"))
+
+    event.listen(engine, "after_execute", _count_cache_lookup)
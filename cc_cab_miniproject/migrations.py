@@ -0,0 +1,265 @@
+"""
+Idempotent schema upgrades for databases created from an older source.sql.
+
+source.sql remains the bootstrap script for fresh databases; everything here
+must be safe to run on every startup against both old and new files.
+"""
+
+from sqlalchemy import text
+
+from archive import ARCHIVE_INDEX_TABLE
+from database import is_sqlite
+from documents import DOCUMENT_KINDS, normalize_stored_expiry_dates
+from etags import FLEET_VERSION_TABLE, FLEET_VERSION_TRIGGERS
+from partner_stats import (
+    ROLLUP_TABLE_DDL,
+    ROLLUP_TABLES,
+    ROLLUP_TRIGGER,
+    rebuild_partner_stats,
+)
+from payment_validation import CHANGE_TRIGGERS, CHANGES_INDEX, CHANGES_TABLE
+
+
+def _column_exists(conn, table: str, column: str) -> bool:
+    rows = conn.execute(text(f"PRAGMA table_info({table})")).mappings().all()
+    return any(row["name"] == column for row in rows)
+
+
+def _add_column(conn, table: str, column: str, ddl: str):
+    if not _column_exists(conn, table, column):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _object_exists(conn, name: str) -> bool:
+    query = "SELECT 1 FROM sqlite_master WHERE name = :name LIMIT 1"
+    return conn.execute(text(query), {"name": name}).scalar() is not None
+
+
+# Full-text search over partners and vehicles. External-content FTS5 tables
+# keyed by the content table's rowid, kept in sync by triggers so that every
+# write path (including ON DELETE CASCADE) updates the index.
+FTS_TABLES = {
+    "partners_fts": """
+        CREATE VIRTUAL TABLE partners_fts USING fts5(
+            name, address,
+            content='partners', content_rowid='rowid', prefix='2 3'
+        )
+    """,
+    "vehicles_fts": """
+        CREATE VIRTUAL TABLE vehicles_fts USING fts5(
+            registration, make, model, type,
+            content='vehicles', content_rowid='rowid', prefix='2 3'
+        )
+    """,
+}
+
+FTS_TRIGGERS = {
+    "trigger_partners_fts_insert": """
+        CREATE TRIGGER trigger_partners_fts_insert AFTER INSERT ON partners
+        BEGIN
+            INSERT INTO partners_fts(rowid, name, address)
+            VALUES (NEW.rowid, NEW.name, NEW.address);
+        END
+    """,
+    "trigger_partners_fts_delete": """
+        CREATE TRIGGER trigger_partners_fts_delete AFTER DELETE ON partners
+        BEGIN
+            INSERT INTO partners_fts(partners_fts, rowid, name, address)
+            VALUES ('delete', OLD.rowid, OLD.name, OLD.address);
+        END
+    """,
+    "trigger_partners_fts_update": """
+        CREATE TRIGGER trigger_partners_fts_update AFTER UPDATE OF name, address ON partners
+        BEGIN
+            INSERT INTO partners_fts(partners_fts, rowid, name, address)
+            VALUES ('delete', OLD.rowid, OLD.name, OLD.address);
+            INSERT INTO partners_fts(rowid, name, address)
+            VALUES (NEW.rowid, NEW.name, NEW.address);
+        END
+    """,
+    "trigger_vehicles_fts_insert": """
+        CREATE TRIGGER trigger_vehicles_fts_insert AFTER INSERT ON vehicles
+        BEGIN
+            INSERT INTO vehicles_fts(rowid, registration, make, model, type)
+            VALUES (NEW.rowid, NEW.registration, NEW.make, NEW.model, NEW.type);
+        END
+    """,
+    "trigger_vehicles_fts_delete": """
+        CREATE TRIGGER trigger_vehicles_fts_delete AFTER DELETE ON vehicles
+        BEGIN
+            INSERT INTO vehicles_fts(vehicles_fts, rowid, registration, make, model, type)
+            VALUES ('delete', OLD.rowid, OLD.registration, OLD.make, OLD.model, OLD.type);
+        END
+    """,
+    "trigger_vehicles_fts_update": """
+        CREATE TRIGGER trigger_vehicles_fts_update
+        AFTER UPDATE OF registration, make, model, type ON vehicles
+        BEGIN
+            INSERT INTO vehicles_fts(vehicles_fts, rowid, registration, make, model, type)
+            VALUES ('delete', OLD.rowid, OLD.registration, OLD.make, OLD.model, OLD.type);
+            INSERT INTO vehicles_fts(rowid, registration, make, model, type)
+            VALUES (NEW.rowid, NEW.registration, NEW.make, NEW.model, NEW.type);
+        END
+    """,
+}
+
+
+STATE_EVENTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS state_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        topic TEXT NOT NULL,
+        key TEXT NOT NULL,
+        origin TEXT NOT NULL,
+        created_at REAL NOT NULL
+    )
+"""
+
+
+def rebuild_search_index(conn):
+    """
+    Repopulates the FTS tables from partners/vehicles (e.g. after a VACUUM,
+    which may renumber rowids of tables without an INTEGER PRIMARY KEY).
+    """
+    for table in FTS_TABLES:
+        conn.execute(text(f"INSERT INTO {table}({table}) VALUES ('rebuild')"))
+
+
+def upgrade_schema(engine):
+    """
+    Brings an existing data.db up to the current source.sql layout.
+
+    Every worker runs this on startup; BEGIN IMMEDIATE takes the SQLite write
+    lock up front so concurrent workers apply the upgrade one at a time.
+    PostgreSQL databases are created from source_postgres.sql, which is kept
+    at the current layout, so there is nothing to upgrade there.
+    """
+    if not is_sqlite(engine):
+        return
+    with engine.connect() as conn:
+        # WAL lets readers in other workers proceed while one worker writes.
+        # The mode is persistent and cannot be changed inside a transaction.
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        created_rollups = _upgrade(conn)
+        conn.commit()
+    if created_rollups:
+        # Reads through its own connections, so only after the upgrade commits
+        rebuild_partner_stats(engine)
+
+
+def _upgrade(conn):
+    # Service-area coverage (optional circle around a city centre)
+    _add_column(conn, "partner_service_areas", "center_latitude", "REAL")
+    _add_column(conn, "partner_service_areas", "center_longitude", "REAL")
+    _add_column(conn, "partner_service_areas", "radius_km", "REAL")
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS idx_service_areas_city "
+            "ON partner_service_areas(city COLLATE NOCASE, active)"
+        )
+    )
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS idx_service_areas_partner_id "
+            "ON partner_service_areas(partner_id)"
+        )
+    )
+
+    # Full-text search tables; populate them once when first created
+    created_fts = False
+    for name, ddl in FTS_TABLES.items():
+        if not _object_exists(conn, name):
+            conn.execute(text(ddl))
+            created_fts = True
+    for name, ddl in FTS_TRIGGERS.items():
+        if not _object_exists(conn, name):
+            conn.execute(text(ddl))
+    if created_fts:
+        rebuild_search_index(conn)
+
+    # Document expiry: ISO dates plus (verification_status, expiry_date) indexes
+    normalize_stored_expiry_dates(conn)
+    for kind in DOCUMENT_KINDS.values():
+        conn.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS idx_{kind.table}_expiry "
+                f"ON {kind.table}(verification_status, expiry_date)"
+            )
+        )
+
+    # Where archive.py moved each finished booking
+    conn.execute(text(ARCHIVE_INDEX_TABLE))
+
+    # Covering indexes for a user's ride history; they also serve every
+    # lookup the plain user_id indexes did
+    for table in ("bookings", "booking_archive_index"):
+        conn.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_user_history "
+                f"ON {table}(user_id, created_at DESC, status, booking_id)"
+            )
+        )
+    conn.execute(text("DROP INDEX IF EXISTS idx_bookings_user_id"))
+    conn.execute(text("DROP INDEX IF EXISTS idx_booking_archive_index_user_id"))
+
+    # A booking's status timeline, and replay of journaled history rows
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS idx_booking_status_history_booking_id "
+            "ON booking_status_history(booking_id, created_at)"
+        )
+    )
+
+    # A booking's fare rows: read by booking detail, the rollup trigger and
+    # the rollup rebuild, which holds the write lock while it scans
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS idx_fare_calculations_booking_id "
+            "ON fare_calculations(booking_id)"
+        )
+    )
+
+    # Partner dashboard rollups, maintained by a trigger on bookings.status;
+    # populated from the existing bookings when first created
+    created_rollups = not _object_exists(conn, "partner_stats_hourly")
+    for table, (bucket, bucket_type) in ROLLUP_TABLES.items():
+        conn.execute(
+            text(
+                ROLLUP_TABLE_DDL.format(
+                    table=table, bucket=bucket, bucket_type=bucket_type
+                )
+            )
+        )
+    if not _object_exists(conn, "trigger_bookings_partner_stats"):
+        conn.execute(text(ROLLUP_TRIGGER))
+
+    # Per-partner fleet version for partner ETags, bumped by vehicle triggers
+    conn.execute(text(FLEET_VERSION_TABLE))
+    for name, ddl in FLEET_VERSION_TRIGGERS.items():
+        if not _object_exists(conn, name):
+            conn.execute(text(ddl))
+
+    # Booking validation: covering (payment method, owner) lookup, and the
+    # trigger-fed feed of users whose cached validations to drop
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS idx_payment_methods_id_user "
+            "ON payment_methods(payment_method_id, user_id)"
+        )
+    )
+    conn.execute(text(CHANGES_TABLE))
+    conn.execute(text(CHANGES_INDEX))
+    for name, ddl in CHANGE_TRIGGERS.items():
+        if not _object_exists(conn, name):
+            conn.execute(text(ddl))
+
+    # Change feed that keeps in-process state coherent across workers
+    conn.execute(text(STATE_EVENTS_TABLE))
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS idx_state_events_created_at "
+            "ON state_events(created_at)"
+        )
+    )
+
+    return created_rollups
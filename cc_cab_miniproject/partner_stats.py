@@ -0,0 +1,261 @@
+"""
+Pre-aggregated partner dashboard metrics.
+
+partner_stats_hourly / partner_stats_daily hold, per partner and per hour/day
+of booking creation, the finished trips, revenue (fare_calculations.total_amount),
+cancellations and ride minutes. A trigger on bookings.status folds every
+booking that reaches completed/cancelled into both tables, so dashboards read a
+handful of rollup rows instead of grouping the bookings table. Bookings are
+attributed to the partner of their assigned driver; cancellations before a
+driver was assigned are not a partner's.
+
+The rebuild below recomputes both tables from the raw rows (including bookings
+moved to the monthly archives) to repair drift or backfill a new database:
+
+    python partner_stats.py --chunk-size 5000
+"""
+
+import argparse
+import os
+from collections import defaultdict
+
+from sqlalchemy import text
+
+from archive import archive_engine, archive_path
+from database import is_sqlite
+
+# Rollup tables, keyed by partner and bucket start
+ROLLUP_TABLES = {
+    "partner_stats_hourly": ("hour", "TIMESTAMP"),
+    "partner_stats_daily": ("day", "DATE"),
+}
+
+ROLLUP_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        partner_id TEXT NOT NULL,
+        {bucket} {bucket_type} NOT NULL,
+        trips_completed INTEGER NOT NULL DEFAULT 0,
+        trips_cancelled INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        cancellation_fees REAL NOT NULL DEFAULT 0,
+        ride_minutes INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (partner_id, {bucket})
+    )
+"""
+
+METRIC_COLUMNS = (
+    "trips_completed",
+    "trips_cancelled",
+    "revenue",
+    "cancellation_fees",
+    "ride_minutes",
+)
+
+# SQLite expressions for the bucket a booking falls into
+BUCKET_EXPRESSIONS = {
+    "hour": "strftime('%Y-%m-%d %H:00:00', NEW.created_at)",
+    "day": "date(NEW.created_at)",
+}
+
+_TRIGGER_UPSERT = """
+        INSERT INTO {table} (partner_id, {bucket}, {columns})
+        SELECT d.partner_id, {bucket_expression},
+               NEW.status = 'completed',
+               NEW.status = 'cancelled',
+               CASE WHEN NEW.status = 'completed' THEN (
+                   SELECT COALESCE(SUM(total_amount), 0) FROM fare_calculations
+                   WHERE booking_id = NEW.booking_id
+               ) ELSE 0 END,
+               CASE WHEN NEW.status = 'cancelled'
+                    THEN COALESCE(NEW.cancellation_fee_amount, 0) ELSE 0 END,
+               CASE WHEN NEW.status = 'completed'
+                    THEN COALESCE(NEW.actual_duration, NEW.estimated_duration, 0)
+                    ELSE 0 END
+        FROM drivers d
+        WHERE d.driver_id = NEW.driver_id
+        ON CONFLICT (partner_id, {bucket}) DO UPDATE SET
+            {increments};"""
+
+ROLLUP_TRIGGER = """
+    CREATE TRIGGER trigger_bookings_partner_stats
+    AFTER UPDATE OF status ON bookings
+    WHEN NEW.status IN ('completed', 'cancelled')
+         AND OLD.status NOT IN ('completed', 'cancelled')
+         AND NEW.driver_id IS NOT NULL AND NEW.created_at IS NOT NULL
+    BEGIN{upserts}
+    END
+""".format(
+    upserts="".join(
+        _TRIGGER_UPSERT.format(
+            table=table,
+            bucket=bucket,
+            bucket_expression=BUCKET_EXPRESSIONS[bucket],
+            columns=", ".join(METRIC_COLUMNS),
+            increments=",\n            ".join(
+                f"{column} = {column} + excluded.{column}" for column in METRIC_COLUMNS
+            ),
+        )
+        for table, (bucket, _) in ROLLUP_TABLES.items()
+    )
+)
+
+# Finished bookings with what the trigger would have added for them
+FINISHED_BOOKINGS_QUERY = """
+    SELECT b.booking_id, b.driver_id, b.status, b.created_at,
+           b.cancellation_fee_amount,
+           COALESCE(b.actual_duration, b.estimated_duration, 0) AS ride_minutes,
+           (SELECT COALESCE(SUM(fc.total_amount), 0) FROM fare_calculations fc
+            WHERE fc.booking_id = b.booking_id) AS revenue
+    FROM bookings b
+    WHERE b.booking_id > :last_booking_id
+      AND b.status IN ('completed', 'cancelled')
+      AND b.driver_id IS NOT NULL AND b.created_at IS NOT NULL
+    ORDER BY b.booking_id
+    LIMIT :chunk_size
+"""
+
+
+def _hour_bucket(created_at) -> str:
+    # Both SQLite strings and datetimes render as 'YYYY-MM-DD HH:MM:SS...'
+    return str(created_at)[:13] + ":00:00"
+
+
+def _scan_finished_bookings(conn, chunk_size: int):
+    """
+    Yields finished bookings in booking_id keyset chunks.
+    """
+    last_booking_id = ""
+    while True:
+        rows = (
+            conn.execute(
+                text(FINISHED_BOOKINGS_QUERY),
+                {"last_booking_id": last_booking_id, "chunk_size": chunk_size},
+            )
+            .mappings()
+            .all()
+        )
+        if not rows:
+            return
+        yield rows
+        last_booking_id = rows[-1]["booking_id"]
+
+
+# Lock order matches a booking transition (bookings, then the rollups its
+# trigger writes), so the rebuild and a transition cannot deadlock
+POSTGRES_REBUILD_LOCKS = (
+    "LOCK TABLE bookings IN SHARE MODE",
+    "LOCK TABLE partner_stats_hourly, partner_stats_daily IN SHARE ROW EXCLUSIVE MODE",
+)
+
+
+def _lock_for_rebuild(conn):
+    """
+    Keeps booking transitions (and so the trigger) from committing until the
+    rebuild does: otherwise an increment committed after its booking was
+    scanned would be wiped by the replace.
+    """
+    if is_sqlite(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    else:
+        for statement in POSTGRES_REBUILD_LOCKS:
+            conn.execute(text(statement))
+
+
+def rebuild_partner_stats(engine, chunk_size: int = 5000) -> dict:
+    """
+    Recomputes both rollup tables from bookings and fare_calculations.
+
+    Bookings (hot and archived) are streamed in keyset chunks and summed per
+    partner and hour in memory, so memory grows with partners x active hours,
+    not with bookings. Scan and replace run in one transaction that holds
+    the write lock from the start, so booking transitions wait for the
+    rebuild rather than being lost to it.
+    """
+    columns = ", ".join(METRIC_COLUMNS)
+    placeholders = ", ".join(f":{column}" for column in METRIC_COLUMNS)
+    hourly = defaultdict(lambda: dict.fromkeys(METRIC_COLUMNS, 0))
+    bookings_scanned = 0
+    with engine.connect() as conn:
+        _lock_for_rebuild(conn)
+        partners = dict(
+            conn.execute(text("SELECT driver_id, partner_id FROM drivers")).all()
+        )
+        archive_names = []
+        if is_sqlite(engine):
+            archive_names = [
+                name
+                for (name,) in conn.execute(
+                    text("SELECT DISTINCT archive_name FROM booking_archive_index")
+                )
+                if os.path.exists(archive_path(name))
+            ]
+
+        # Archived bookings are finished, so no trigger changes them
+        scans = [_scan_finished_bookings(conn, chunk_size)]
+        archive_conns = [archive_engine(name).connect() for name in archive_names]
+        scans.extend(
+            _scan_finished_bookings(archive_conn, chunk_size)
+            for archive_conn in archive_conns
+        )
+        try:
+            for scan in scans:
+                for rows in scan:
+                    for row in rows:
+                        partner_id = partners.get(row["driver_id"])
+                        if partner_id is None:
+                            continue
+                        bucket = hourly[(partner_id, _hour_bucket(row["created_at"]))]
+                        if row["status"] == "completed":
+                            bucket["trips_completed"] += 1
+                            bucket["revenue"] += row["revenue"] or 0
+                            bucket["ride_minutes"] += row["ride_minutes"] or 0
+                        else:
+                            bucket["trips_cancelled"] += 1
+                            bucket["cancellation_fees"] += (
+                                row["cancellation_fee_amount"] or 0
+                            )
+                    bookings_scanned += len(rows)
+        finally:
+            for archive_conn in archive_conns:
+                archive_conn.close()
+
+        daily = defaultdict(lambda: dict.fromkeys(METRIC_COLUMNS, 0))
+        for (partner_id, hour), hour_totals in hourly.items():
+            day = daily[(partner_id, hour[:10])]
+            for column in METRIC_COLUMNS:
+                day[column] += hour_totals[column]
+
+        for (table, (bucket, _)), buckets in zip(
+            ROLLUP_TABLES.items(), (hourly, daily)
+        ):
+            conn.execute(text(f"DELETE FROM {table}"))
+            if buckets:
+                conn.execute(
+                    text(
+                        f"INSERT INTO {table} (partner_id, {bucket}, {columns}) "
+                        f"VALUES (:partner_id, :bucket, {placeholders})"
+                    ),
+                    [
+                        {"partner_id": partner_id, "bucket": key, **totals}
+                        for (partner_id, key), totals in buckets.items()
+                    ],
+                )
+        conn.commit()
+
+    return {
+        "bookingsScanned": bookings_scanned,
+        "hourlyRows": len(hourly),
+        "dailyRows": len(daily),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rebuild partner dashboard rollups from the bookings tables"
+    )
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    from main import engine
+
+    print(rebuild_partner_stats(engine, chunk_size=args.chunk_size))
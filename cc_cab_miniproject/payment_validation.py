@@ -0,0 +1,239 @@
+"""
+Cache of booking validation: does the user exist, and is the payment method
+theirs.
+
+create_booking used to look both up on every request, though the answer for
+a rider and their card rarely changes. Answers are cached per (user_id,
+payment_method_id): a valid pair for VALIDATION_CACHE_TTL seconds, a
+failure for VALIDATION_NEGATIVE_TTL seconds (negative caching: a client
+retrying with a bad card does not reach the database either, and a user
+created meanwhile gets through quickly). A miss checks both in one query.
+
+Users and payment methods are written by other services, not this API, so
+invalidation comes from the database. Triggers on users and payment_methods
+record each change in payment_validation_changes: one row per affected
+user, stamped with the next value of a change sequence. Every
+VALIDATION_CACHE_INTERVAL seconds each worker reads the rows past the last
+sequence it saw and drops those users' cached pairs. Code that writes these
+tables can call invalidate_user / invalidate_payment_method after its commit
+to drop them at once.
+
+A valid pair gone stale before the next poll cannot create a bad booking
+for a deleted user or payment method: the bookings foreign keys reject the
+insert. The TTL bounds anything else, such as a poll on PostgreSQL skipping
+a sequence value whose transaction committed late.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+import metrics
+
+logger = logging.getLogger("cab.payment_validation")
+
+VALIDATION_CACHE_TTL = float(os.getenv("VALIDATION_CACHE_TTL", "300"))
+VALIDATION_NEGATIVE_TTL = float(os.getenv("VALIDATION_NEGATIVE_TTL", "5"))
+VALIDATION_CACHE_INTERVAL = float(os.getenv("VALIDATION_CACHE_INTERVAL", "1.0"))
+# Pairs kept; the least recently used are evicted past this
+VALIDATION_CACHE_SIZE = 100_000
+
+# Failures check() reports
+USER_NOT_FOUND = "user"
+PAYMENT_METHOD_NOT_FOUND = "payment_method"
+
+VALIDATION_QUERY = """
+    SELECT
+        EXISTS (SELECT 1 FROM users WHERE user_id = :user_id) AS user_exists,
+        EXISTS (
+            SELECT 1 FROM payment_methods
+            WHERE payment_method_id = :payment_method_id AND user_id = :user_id
+        ) AS payment_method_matches
+"""
+CHANGES_QUERY = """
+    SELECT user_id, change_seq FROM payment_validation_changes
+    WHERE change_seq > :seen
+    ORDER BY change_seq
+"""
+LAST_CHANGE_QUERY = "SELECT MAX(change_seq) FROM payment_validation_changes"
+
+CHANGES_TABLE = """
+    CREATE TABLE IF NOT EXISTS payment_validation_changes (
+        user_id TEXT PRIMARY KEY,
+        change_seq INTEGER NOT NULL
+    )
+"""
+CHANGES_INDEX = """
+    CREATE INDEX IF NOT EXISTS idx_payment_validation_changes_seq
+    ON payment_validation_changes(change_seq)
+"""
+
+# SQLite has one writer at a time, so MAX + 1 always grows in commit order
+_RECORD_CHANGE = """
+            INSERT INTO payment_validation_changes (user_id, change_seq)
+            SELECT {row}.user_id, COALESCE(MAX(change_seq), 0) + 1
+            FROM payment_validation_changes WHERE true
+            ON CONFLICT (user_id) DO UPDATE SET change_seq = excluded.change_seq;"""
+
+CHANGE_TRIGGERS = {
+    "trigger_users_validation_insert": f"""
+        CREATE TRIGGER trigger_users_validation_insert
+        AFTER INSERT ON users
+        BEGIN{_RECORD_CHANGE.format(row="NEW")}
+        END
+    """,
+    "trigger_users_validation_update": f"""
+        CREATE TRIGGER trigger_users_validation_update
+        AFTER UPDATE OF user_id ON users
+        BEGIN{_RECORD_CHANGE.format(row="OLD")}{_RECORD_CHANGE.format(row="NEW")}
+        END
+    """,
+    "trigger_users_validation_delete": f"""
+        CREATE TRIGGER trigger_users_validation_delete
+        AFTER DELETE ON users
+        BEGIN{_RECORD_CHANGE.format(row="OLD")}
+        END
+    """,
+    "trigger_payment_methods_validation_insert": f"""
+        CREATE TRIGGER trigger_payment_methods_validation_insert
+        AFTER INSERT ON payment_methods
+        BEGIN{_RECORD_CHANGE.format(row="NEW")}
+        END
+    """,
+    "trigger_payment_methods_validation_update": f"""
+        CREATE TRIGGER trigger_payment_methods_validation_update
+        AFTER UPDATE OF payment_method_id, user_id ON payment_methods
+        BEGIN{_RECORD_CHANGE.format(row="OLD")}{_RECORD_CHANGE.format(row="NEW")}
+        END
+    """,
+    "trigger_payment_methods_validation_delete": f"""
+        CREATE TRIGGER trigger_payment_methods_validation_delete
+        AFTER DELETE ON payment_methods
+        BEGIN{_RECORD_CHANGE.format(row="OLD")}
+        END
+    """,
+}
+
+
+class PaymentValidationCache:
+    def __init__(self, max_entries: int = VALIDATION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # (user_id, payment_method_id) -> (failure or None, expires at);
+        # insertion order doubles as LRU order
+        self._entries: Dict[Tuple[str, str], Tuple[Optional[str], float]] = {}
+        self._by_user: Dict[str, Set[Tuple[str, str]]] = defaultdict(set)
+        # Bumped by every invalidation, so a lookup that raced one is not cached
+        self._generation = 0
+        self._last_seq = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def check(self, db, user_id: str, payment_method_id: str) -> Optional[str]:
+        """
+        None if the user exists and owns the payment method, else
+        USER_NOT_FOUND or PAYMENT_METHOD_NOT_FOUND.
+        """
+        key = (user_id, payment_method_id)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.pop(key, None)
+            if cached is not None and cached[1] > now:
+                self._entries[key] = cached
+                metrics.validation_cache.inc(("hit",))
+                return cached[0]
+            if cached is not None:
+                self._by_user[user_id].discard(key)
+            generation = self._generation
+        metrics.validation_cache.inc(("miss",))
+
+        row = db.execute(
+            text(VALIDATION_QUERY),
+            {"user_id": user_id, "payment_method_id": payment_method_id},
+        ).one()
+        if not row.user_exists:
+            failure = USER_NOT_FOUND
+        elif not row.payment_method_matches:
+            failure = PAYMENT_METHOD_NOT_FOUND
+        else:
+            failure = None
+        ttl = VALIDATION_CACHE_TTL if failure is None else VALIDATION_NEGATIVE_TTL
+
+        with self._lock:
+            if generation == self._generation:
+                if len(self._entries) >= self.max_entries:
+                    self._remove(next(iter(self._entries)))
+                self._entries[key] = (failure, now + ttl)
+                self._by_user[user_id].add(key)
+        return failure
+
+    def _remove(self, key: Tuple[str, str]):
+        self._entries.pop(key, None)
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+    # --- Invalidation hooks ---
+
+    def invalidate_user(self, user_id: str):
+        with self._lock:
+            self._generation += 1
+            for key in self._by_user.pop(user_id, ()):
+                self._entries.pop(key, None)
+
+    def invalidate_payment_method(self, payment_method_id: str):
+        with self._lock:
+            self._generation += 1
+            for key in [k for k in self._entries if k[1] == payment_method_id]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_user.clear()
+
+    # --- Change feed ---
+
+    def load(self, conn):
+        """
+        Starts following the change feed from its current end.
+        """
+        last_seq = conn.execute(text(LAST_CHANGE_QUERY)).scalar() or 0
+        self.clear()
+        self._last_seq = last_seq
+
+    def refresh(self, conn) -> int:
+        """
+        Drops the pairs of users changed since the last call; returns how
+        many users changed.
+        """
+        changes = conn.execute(text(CHANGES_QUERY), {"seen": self._last_seq}).all()
+        for user_id, change_seq in changes:
+            self.invalidate_user(user_id)
+            self._last_seq = max(self._last_seq, change_seq)
+        return len(changes)
+
+    async def run(self, engine):
+        while True:
+            await asyncio.sleep(VALIDATION_CACHE_INTERVAL)
+            try:
+                await asyncio.to_thread(self._refresh_with, engine)
+            except Exception:
+                logger.exception("Payment validation refresh failed; will retry")
+
+    def _refresh_with(self, engine):
+        with engine.connect() as conn:
+            self.refresh(conn)
+
+
+payment_validation = PaymentValidationCache()
@@ -0,0 +1,190 @@
+"""
+Opt-in diagnostics: a slow-query log and an on-demand sampling profiler.
+
+SLOW_QUERY_MS=50 logs every statement slower than 50 ms (logger
+"cab.slow_query") with the issuing route, the parameter shape (types only,
+never values) and its query plan (EXPLAIN QUERY PLAN on SQLite, EXPLAIN on
+PostgreSQL). The most recent entries are kept for /api/admin/slow-queries.
+Unset, no hooks are installed at all.
+
+PROFILING_ENABLED=1 enables /api/admin/profile, which samples the stacks of
+every thread in the worker for a few seconds and returns them in the folded
+format read by flamegraph.pl, speedscope and inferno:
+
+    curl -X POST 'localhost:8000/api/admin/profile?seconds=10' > api.folded
+    flamegraph.pl api.folded > api.svg
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+import metrics
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0")) or None
+# Slow statements kept in memory for the admin endpoint
+SLOW_QUERY_LOG_SIZE = 200
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED") == "1"
+
+logger = logging.getLogger("cab.slow_query")
+
+_slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+# Statements EXPLAIN accepts
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+def _shape(parameters) -> str:
+    if isinstance(parameters, dict):
+        return (
+            "{"
+            + ", ".join(
+                f"{key}: {type(value).__name__}" for key, value in parameters.items()
+            )
+            + "}"
+        )
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+def parameters_shape(parameters, executemany: bool) -> str:
+    """
+    Parameter types without their values, e.g. "{booking_id: str}".
+    """
+    if executemany:
+        rows = list(parameters)
+        return f"{len(rows)} x {_shape(rows[0])}" if rows else "0 rows"
+    return _shape(parameters)
+
+
+def _query_plan(
+    cursor, statement: str, parameters, dialect: str
+) -> Optional[List[str]]:
+    if statement.split(None, 1)[0].upper() not in _EXPLAINABLE:
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+    # A separate cursor: the caller has not fetched the statement's rows yet
+    explain_cursor = cursor.connection.cursor()
+    try:
+        explain_cursor.execute(prefix + statement, parameters)
+        rows = explain_cursor.fetchall()
+    except Exception as exc:
+        return [f"unavailable: {exc}"]
+    finally:
+        explain_cursor.close()
+    # SQLite: (id, parent, notused, detail); PostgreSQL: one text column
+    return [str(row[-1]) for row in rows]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._slow_query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_slow_query_started", None)
+    if started is None:
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms < SLOW_QUERY_MS:
+        return
+    plan = None
+    if not executemany:
+        plan = _query_plan(cursor, statement, parameters, conn.dialect.name)
+    entry = {
+        "at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "durationMs": round(elapsed_ms, 2),
+        "route": metrics.current_route(),
+        "statement": " ".join(statement.split()),
+        "parameters": parameters_shape(parameters, executemany),
+        "plan": plan,
+    }
+    _slow_queries.append(entry)
+    logger.warning(
+        "slow query %.1f ms on %s: %s params=%s plan=%s",
+        elapsed_ms,
+        entry["route"],
+        entry["statement"],
+        entry["parameters"],
+        plan,
+    )
+
+
+def instrument_engine(engine):
+    """
+    Installs the slow-query hooks on engine when SLOW_QUERY_MS is set.
+    """
+    if SLOW_QUERY_MS is None:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def recent_slow_queries() -> List[dict]:
+    """
+    Logged slow statements, newest first.
+    """
+    return list(reversed(_slow_queries))
+
+
+# --- Sampling profiler ---
+
+_profile_lock = threading.Lock()
+
+# Leaf frames of threads that are waiting rather than working
+_IDLE_MODULES = ("selectors.py", "threading.py", "queue.py")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    # ';' separates frames in the folded format
+    filename = os.path.basename(code.co_filename).replace(";", "_")
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds: float, interval: float = 0.01) -> Counter:
+    """
+    Samples the stack of every other thread each interval for seconds;
+    returns folded stacks ("thread;outer;...;inner") with sample counts.
+    Idle threads (event loop in select, pool threads waiting for work) are
+    skipped. Raises RuntimeError if another profile is running.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+    try:
+        own_thread = threading.get_ident()
+        thread_names: Dict[int, str] = {}
+        stacks = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                if os.path.basename(frame.f_code.co_filename) in _IDLE_MODULES:
+                    continue
+                if thread_id not in thread_names:
+                    thread_names.update(
+                        (thread.ident, thread.name) for thread in threading.enumerate()
+                    )
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                stacks[";".join(reversed(stack))] += 1
+            time.sleep(interval)
+        return stacks
+    finally:
+        _profile_lock.release()
+
+
+def folded(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
@@ -0,0 +1,135 @@
+"""
+Driver rating aggregates (drivers.average_rating / drivers.total_reviews).
+
+New reviews update the aggregates incrementally with a running mean, so a
+review costs one UPDATE regardless of how many reviews a driver has. The
+batch job below rebuilds the aggregates from the reviews table to repair any
+drift (manual edits, deleted reviews, imports).
+
+    python ratings.py --chunk-size 5000
+"""
+
+import argparse
+
+from sqlalchemy import text
+
+from database import is_sqlite
+
+# Running mean: new_avg = (avg * n + rating) / (n + 1). SQLite evaluates every
+# SET expression against the pre-update row, so both columns see the old n.
+APPLY_REVIEW_QUERY = """
+    UPDATE drivers
+    SET average_rating = (COALESCE(average_rating, 0) * COALESCE(total_reviews, 0) + :rating)
+                         / (COALESCE(total_reviews, 0) + 1),
+        total_reviews = COALESCE(total_reviews, 0) + 1
+    WHERE driver_id = :driver_id
+"""
+
+# Allowed difference between the stored and recomputed mean
+TOLERANCE = 1e-6
+
+
+def apply_review(db, driver_id: str, rating: int):
+    """
+    Folds one new review into the driver's aggregates (O(1)).
+    """
+    db.execute(text(APPLY_REVIEW_QUERY), {"driver_id": driver_id, "rating": rating})
+
+
+def recompute_driver_ratings(engine, chunk_size: int = 5000) -> dict:
+    """
+    Rebuilds every driver's aggregates from the reviews table.
+
+    Drivers are walked in primary-key keyset chunks. Each chunk is totalled
+    from its reviews (via idx_reviews_driver_id) and repaired in one write
+    transaction that holds the chunk's driver rows, so a review submitted
+    meanwhile is either already in the totals or applied on top of the
+    repaired values, never overwritten. SQLite takes its write lock up front
+    (BEGIN IMMEDIATE); PostgreSQL locks the chunk's rows (FOR UPDATE) before
+    totalling. Only drivers whose stored values drifted are written back.
+    """
+    sqlite = is_sqlite(engine)
+    drivers_query = """
+        SELECT driver_id, average_rating, total_reviews FROM drivers
+        WHERE driver_id > :last_driver_id
+        ORDER BY driver_id
+        LIMIT :chunk_size
+    """ + ("" if sqlite else " FOR UPDATE")
+    # The chunk's key range rather than an IN list, which could exceed
+    # SQLite's bound-parameter limit at large chunk sizes
+    totals_query = """
+        SELECT driver_id, SUM(rating), COUNT(*) FROM reviews
+        WHERE driver_id > :last_driver_id AND driver_id <= :chunk_last_id
+        GROUP BY driver_id
+    """
+
+    reviews_scanned = 0
+    drivers_scanned = 0
+    drivers_repaired = 0
+    last_driver_id = ""
+    with engine.connect() as conn:
+        while True:
+            if sqlite:
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                text(drivers_query),
+                {"last_driver_id": last_driver_id, "chunk_size": chunk_size},
+            ).all()
+            if not rows:
+                conn.rollback()
+                break
+            totals = {
+                driver_id: (rating_sum, count)
+                for driver_id, rating_sum, count in conn.execute(
+                    text(totals_query),
+                    {"last_driver_id": last_driver_id, "chunk_last_id": rows[-1][0]},
+                ).all()
+            }
+
+            repairs = []
+            for driver_id, average_rating, total_reviews in rows:
+                rating_sum, count = totals.get(driver_id, (0, 0))
+                expected = rating_sum / count if count else 0.0
+                if (total_reviews or 0) != count or abs(
+                    (average_rating or 0.0) - expected
+                ) > TOLERANCE:
+                    repairs.append(
+                        {
+                            "driver_id": driver_id,
+                            "average_rating": expected,
+                            "total_reviews": count,
+                        }
+                    )
+            if repairs:
+                conn.execute(
+                    text("""
+                        UPDATE drivers
+                        SET average_rating = :average_rating,
+                            total_reviews = :total_reviews
+                        WHERE driver_id = :driver_id
+                    """),
+                    repairs,
+                )
+            conn.commit()
+            reviews_scanned += sum(count for _, count in totals.values())
+            drivers_scanned += len(rows)
+            drivers_repaired += len(repairs)
+            last_driver_id = rows[-1][0]
+
+    return {
+        "reviewsScanned": reviews_scanned,
+        "driversScanned": drivers_scanned,
+        "driversRepaired": drivers_repaired,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Recompute driver rating aggregates from the reviews table"
+    )
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    from main import engine
+
+    print(recompute_driver_ratings(engine, chunk_size=args.chunk_size))
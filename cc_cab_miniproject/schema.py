@@ -1,3 +1,4 @@
+from datetime import date
 from enum import Enum
 from typing import Any, Dict, List, Optional
 
@@ -157,3 +158,334 @@ class CancelBookingResponse(BaseModel):
 class PaginatedBookings(BaseModel):
     data: List[BookingDetail]
     pagination: Dict[str, Any]
+
+
+class BookingStatusEvent(BaseModel):
+    status: BookingStatus
+    timestamp: str
+
+
+class BookingTimelineResponse(BaseModel):
+    bookingId: str
+    events: List[BookingStatusEvent]
+
+
+class FareEstimateRequest(BaseModel):
+    pickupLocation: Location
+    dropoffLocation: Location
+    vehicleType: Optional[str] = None
+
+
+class FareEstimateResponse(BaseModel):
+    vehicleType: Optional[str] = None
+    distanceKm: float
+    estimatedDurationMin: int
+    estimatedFare: FareInfo
+    availableDrivers: Optional[int] = None
+
+
+class FareRoute(BaseModel):
+    pickupLocation: Location
+    dropoffLocation: Location
+
+
+class FareOptionsRequest(BaseModel):
+    # One route as the BookMyTrip proxy sends it, and/or many in routes
+    pickupLocation: Optional[Location] = None
+    dropoffLocation: Optional[Location] = None
+    routes: Optional[List[FareRoute]] = None
+
+
+class FareOption(BaseModel):
+    vehicleType: str
+    availableDrivers: int
+    estimatedFare: FareInfo
+
+
+class RouteFareOptions(BaseModel):
+    pickupLocation: Location
+    dropoffLocation: Location
+    distanceKm: float
+    estimatedDurationMin: int
+    options: List[FareOption]
+
+
+class FareOptionsResponse(BaseModel):
+    data: List[RouteFareOptions]
+
+
+class FleetGroup(BaseModel):
+    partnerId: Optional[str] = None
+    vehicleType: Optional[str] = None
+    status: Optional[str] = None
+    count: int
+
+
+class FleetSummaryResponse(BaseModel):
+    groupBy: List[str]
+    groups: List[FleetGroup]
+    totalGroups: int
+    totalVehicles: int
+    refreshedAt: Optional[str] = None
+
+
+class ServiceAreaCreate(BaseModel):
+    city: str
+    region: Optional[str] = None
+    country: str
+    active: bool = True
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    radiusKm: Optional[float] = Field(None, gt=0)
+
+
+class ServiceArea(BaseModel):
+    areaId: int
+    partnerId: str
+    city: str
+    region: Optional[str] = None
+    country: str
+    active: bool
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    radiusKm: Optional[float] = None
+
+
+class CoveragePartner(BaseModel):
+    partnerId: str
+    name: str
+    contact: ContactInfo
+    address: Optional[str] = None
+    serviceAreas: List[ServiceArea] = []
+
+
+class CoverageResponse(BaseModel):
+    data: List[CoveragePartner]
+    total: int
+
+
+class SearchScope(str, Enum):
+    ALL = "all"
+    PARTNERS = "partners"
+    VEHICLES = "vehicles"
+
+
+class PartnerSearchHit(BaseModel):
+    partnerId: str
+    name: str
+    address: Optional[str] = None
+    status: str
+    score: float
+
+
+class VehicleSearchHit(BaseModel):
+    vehicleId: str
+    partnerId: str
+    type: str
+    registration: str
+    status: str
+    make: Optional[str] = None
+    model: Optional[str] = None
+    score: float
+
+
+class SearchResponse(BaseModel):
+    query: str
+    partners: List[PartnerSearchHit] = []
+    vehicles: List[VehicleSearchHit] = []
+
+
+class DriverStatus(str, Enum):
+    ONLINE = "online"
+    OFFLINE = "offline"
+    ON_RIDE = "on_ride"
+    ON_BREAK = "on_break"
+    AVAILABLE = "available"
+
+
+class DriverCreate(BaseModel):
+    firstName: str
+    lastName: str
+    phone: str
+    email: Optional[str] = None
+    licenseNumber: str
+    vehicleId: Optional[str] = None
+
+
+class DriverUpdate(BaseModel):
+    firstName: Optional[str] = None
+    lastName: Optional[str] = None
+    phone: Optional[str] = None
+    email: Optional[str] = None
+    licenseNumber: Optional[str] = None
+    vehicleId: Optional[str] = None
+    status: Optional[DriverStatus] = None
+
+
+class Driver(BaseModel):
+    driverId: str
+    partnerId: str
+    vehicleId: Optional[str] = None
+    firstName: str
+    lastName: str
+    phone: str
+    email: Optional[str] = None
+    licenseNumber: str
+    rating: float = 0.0
+    totalReviews: int = 0
+    status: DriverStatus
+    createdAt: str
+    updatedAt: str
+
+
+class DriverSupplyResponse(BaseModel):
+    data: Dict[str, Dict[str, int]]
+    matchable: Dict[str, int]
+
+
+class ReviewCreate(BaseModel):
+    userId: str
+    rating: int = Field(..., ge=1, le=5)
+    comment: Optional[str] = None
+
+
+class ReviewResponse(BaseModel):
+    reviewId: str
+    bookingId: str
+    driverId: str
+    rating: int
+    comment: Optional[str] = None
+    driverRating: float
+    driverTotalReviews: int
+
+
+class RatingRecomputeResponse(BaseModel):
+    reviewsScanned: int
+    driversScanned: int
+    driversRepaired: int
+
+
+class BookingArchiveResponse(BaseModel):
+    bookingsArchived: int
+    archives: List[str]
+    cutoff: str
+
+
+class SnapshotMethod(str, Enum):
+    BACKUP = "backup"
+    VACUUM = "vacuum"
+
+
+class SnapshotResponse(BaseModel):
+    path: str
+    method: SnapshotMethod
+    sizeBytes: int
+    restarts: int
+    durationMs: float
+
+
+class StatsGranularity(str, Enum):
+    HOUR = "hour"
+    DAY = "day"
+
+
+class PartnerStatsBucket(BaseModel):
+    period: str
+    tripsCompleted: int
+    tripsCancelled: int
+    cancellationRate: float
+    revenue: float
+    cancellationFees: float
+    rideMinutes: int
+    fleetUtilization: float
+
+
+class PartnerStatsResponse(BaseModel):
+    partnerId: str
+    granularity: StatsGranularity
+    fromDate: str
+    toDate: str
+    fleetSize: int
+    totals: PartnerStatsBucket
+    buckets: List[PartnerStatsBucket]
+
+
+class PartnerStatsRebuildResponse(BaseModel):
+    bookingsScanned: int
+    hourlyRows: int
+    dailyRows: int
+
+
+class SlowQuery(BaseModel):
+    at: str
+    durationMs: float
+    route: str
+    statement: str
+    parameters: str
+    plan: Optional[List[str]] = None
+
+
+class SlowQueryLogResponse(BaseModel):
+    thresholdMs: Optional[float] = None
+    data: List[SlowQuery]
+
+
+class DocumentOwnerType(str, Enum):
+    PARTNER = "partner"
+    VEHICLE = "vehicle"
+    DRIVER = "driver"
+
+
+class DocumentVerificationStatus(str, Enum):
+    PENDING = "pending"
+    VERIFIED = "verified"
+    REJECTED = "rejected"
+
+
+class DocumentCreate(BaseModel):
+    documentType: str
+    documentNumber: Optional[str] = None
+    documentUrl: Optional[str] = None
+    expiryDate: Optional[date] = None
+
+
+class DocumentVerificationUpdate(BaseModel):
+    status: DocumentVerificationStatus
+
+
+class Document(BaseModel):
+    documentId: int
+    ownerType: DocumentOwnerType
+    ownerId: str
+    documentType: str
+    documentNumber: Optional[str] = None
+    documentUrl: Optional[str] = None
+    expiryDate: Optional[str] = None
+    verificationStatus: DocumentVerificationStatus
+    createdAt: str
+    updatedAt: str
+
+
+class ExpiringDocumentsResponse(BaseModel):
+    data: List[Document]
+    total: int
+
+
+class BatchSubRequest(BaseModel):
+    id: Optional[str] = None
+    path: str
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest]
+
+
+class BatchSubResponse(BaseModel):
+    id: Optional[str] = None
+    path: str
+    status: int
+    body: Any = None
+
+
+class BatchResponse(BaseModel):
+    responses: List[BatchSubResponse]
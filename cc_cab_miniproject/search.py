@@ -0,0 +1,94 @@
+"""
+Ranked full-text search over partners and vehicles.
+
+SQLite uses FTS5 tables kept in sync by triggers (created by migrations.py);
+PostgreSQL uses weighted tsvector columns with GIN indexes (source_postgres.sql).
+Both query paths return a lower-is-better score.
+"""
+
+import re
+from typing import List, Optional
+
+from sqlalchemy import text
+
+from database import is_sqlite
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# bm25() column weights: a hit on the name/registration outranks one on address/make
+PARTNER_SEARCH_QUERY = """
+    SELECT p.partner_id, p.name, p.address, p.status,
+           bm25(partners_fts, 10.0, 1.0) AS score
+    FROM partners_fts
+    JOIN partners p ON p.rowid = partners_fts.rowid
+    WHERE partners_fts MATCH :match
+    ORDER BY score
+    LIMIT :limit
+"""
+
+VEHICLE_SEARCH_QUERY = """
+    SELECT v.vehicle_id, v.partner_id, v.type, v.make, v.model,
+           v.registration, v.status,
+           bm25(vehicles_fts, 10.0, 3.0, 3.0, 1.0) AS score
+    FROM vehicles_fts
+    JOIN vehicles v ON v.rowid = vehicles_fts.rowid
+    WHERE vehicles_fts MATCH :match
+    ORDER BY score
+    LIMIT :limit
+"""
+
+# Column weights live in the generated search_vector columns (A > B > C)
+PG_PARTNER_SEARCH_QUERY = """
+    SELECT partner_id, name, address, status,
+           -ts_rank(search_vector, to_tsquery('simple', :match)) AS score
+    FROM partners
+    WHERE search_vector @@ to_tsquery('simple', :match)
+    ORDER BY score
+    LIMIT :limit
+"""
+
+PG_VEHICLE_SEARCH_QUERY = """
+    SELECT vehicle_id, partner_id, type, make, model, registration, status,
+           -ts_rank(search_vector, to_tsquery('simple', :match)) AS score
+    FROM vehicles
+    WHERE search_vector @@ to_tsquery('simple', :match)
+    ORDER BY score
+    LIMIT :limit
+"""
+
+
+def build_match_expression(
+    query: str, prefix: bool = True, dialect: str = "sqlite"
+) -> Optional[str]:
+    """
+    Turns free text into a safe FTS5 MATCH expression (or a PostgreSQL
+    tsquery for dialect="postgresql").
+
+    Every word becomes a quoted term (so user input can't inject FTS syntax)
+    and all terms must match. With prefix=True the last term is a prefix
+    query, which suits search-as-you-type ("toyo" -> "Toyota").
+    """
+    tokens = _TOKEN_RE.findall(query)
+    if not tokens:
+        return None
+    if dialect == "postgresql":
+        terms = [f"'{token.lower()}'" for token in tokens]
+        if prefix:
+            terms[-1] += ":*"
+        return " & ".join(terms)
+    terms = [f'"{token}"' for token in tokens]
+    if prefix:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_partners(db, match: str, limit: int) -> List[dict]:
+    query = PARTNER_SEARCH_QUERY if is_sqlite(db) else PG_PARTNER_SEARCH_QUERY
+    rows = db.execute(text(query), {"match": match, "limit": limit})
+    return [dict(row) for row in rows.mappings()]
+
+
+def search_vehicles(db, match: str, limit: int) -> List[dict]:
+    query = VEHICLE_SEARCH_QUERY if is_sqlite(db) else PG_VEHICLE_SEARCH_QUERY
+    rows = db.execute(text(query), {"match": match, "limit": limit})
+    return [dict(row) for row in rows.mappings()]
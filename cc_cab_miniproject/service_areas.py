@@ -0,0 +1,219 @@
+"""
+In-memory inverted index over the partner_service_areas table.
+
+Answers "which partners serve city X" and "which partners cover this
+coordinate" without scanning partners.address. The index is loaded once at
+startup and refreshed per partner by the endpoints that write service areas.
+"""
+
+import math
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import text
+
+from geo import haversine_km
+
+# Size of a coordinate grid cell in degrees (~55 km at the equator)
+GRID_DEGREES = 0.5
+
+AREA_COLUMNS = """
+    area_id, partner_id, city, region, country, active,
+    center_latitude, center_longitude, radius_km
+"""
+
+
+def normalize(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    value = value.strip().casefold()
+    return value or None
+
+
+def _cell(latitude: float, longitude: float):
+    return (math.floor(latitude / GRID_DEGREES), math.floor(longitude / GRID_DEGREES))
+
+
+class ServiceAreaIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._areas: Dict[int, dict] = {}
+        self._by_partner: Dict[str, Set[int]] = defaultdict(set)
+        self._by_city: Dict[str, Set[int]] = defaultdict(set)
+        self._by_region: Dict[str, Set[int]] = defaultdict(set)
+        self._by_country: Dict[str, Set[int]] = defaultdict(set)
+        self._grid: Dict[tuple, Set[int]] = defaultdict(set)
+
+    # --- Maintenance ---
+
+    def load(self, conn):
+        """
+        Rebuilds the whole index from the database.
+        """
+        rows = conn.execute(
+            text(f"SELECT {AREA_COLUMNS} FROM partner_service_areas")
+        ).mappings()
+        with self._lock:
+            self._areas.clear()
+            for mapping in (
+                self._by_partner,
+                self._by_city,
+                self._by_region,
+                self._by_country,
+                self._grid,
+            ):
+                mapping.clear()
+            for row in rows:
+                self._add(dict(row))
+
+    def refresh_partner(self, conn, partner_id: str):
+        """
+        Re-reads the service areas of one partner after a write.
+        """
+        rows = conn.execute(
+            text(
+                f"SELECT {AREA_COLUMNS} FROM partner_service_areas "
+                "WHERE partner_id = :partner_id"
+            ),
+            {"partner_id": partner_id},
+        ).mappings()
+        with self._lock:
+            self._remove_partner(partner_id)
+            for row in rows:
+                self._add(dict(row))
+
+    def remove_partner(self, partner_id: str):
+        with self._lock:
+            self._remove_partner(partner_id)
+
+    def _add(self, area: dict):
+        area_id = area["area_id"]
+        self._areas[area_id] = area
+        self._by_partner[area["partner_id"]].add(area_id)
+        for mapping, key in (
+            (self._by_city, normalize(area["city"])),
+            (self._by_region, normalize(area["region"])),
+            (self._by_country, normalize(area["country"])),
+        ):
+            if key:
+                mapping[key].add(area_id)
+        for cell in self._cells_for(area):
+            self._grid[cell].add(area_id)
+
+    def _remove_partner(self, partner_id: str):
+        for area_id in self._by_partner.pop(partner_id, set()):
+            area = self._areas.pop(area_id)
+            for mapping, key in (
+                (self._by_city, normalize(area["city"])),
+                (self._by_region, normalize(area["region"])),
+                (self._by_country, normalize(area["country"])),
+            ):
+                if key and key in mapping:
+                    mapping[key].discard(area_id)
+                    if not mapping[key]:
+                        del mapping[key]
+            for cell in self._cells_for(area):
+                self._grid[cell].discard(area_id)
+                if not self._grid[cell]:
+                    del self._grid[cell]
+
+    @staticmethod
+    def _cells_for(area: dict):
+        lat = area.get("center_latitude")
+        lon = area.get("center_longitude")
+        radius = area.get("radius_km")
+        if lat is None or lon is None or not radius:
+            return []
+        # Bounding box of the coverage circle, expressed in grid cells
+        dlat = radius / 111.0
+        dlon = radius / max(111.0 * math.cos(math.radians(lat)), 1e-6)
+        lat_lo, lon_lo = _cell(lat - dlat, lon - dlon)
+        lat_hi, lon_hi = _cell(lat + dlat, lon + dlon)
+        return [
+            (i, j) for i in range(lat_lo, lat_hi + 1) for j in range(lon_lo, lon_hi + 1)
+        ]
+
+    # --- Lookups ---
+
+    def lookup(
+        self,
+        city: Optional[str] = None,
+        region: Optional[str] = None,
+        country: Optional[str] = None,
+    ) -> Dict[str, List[dict]]:
+        """
+        Returns active areas matching every given component, grouped by partner.
+        """
+        with self._lock:
+            candidates = None
+            for mapping, key in (
+                (self._by_city, normalize(city)),
+                (self._by_region, normalize(region)),
+                (self._by_country, normalize(country)),
+            ):
+                if key is None:
+                    continue
+                ids = mapping.get(key, set())
+                candidates = set(ids) if candidates is None else candidates & ids
+            if candidates is None:
+                return {}
+            return self._group_active(candidates)
+
+    def lookup_point(self, latitude: float, longitude: float) -> Dict[str, List[dict]]:
+        """
+        Returns active areas whose coverage circle contains the coordinate.
+        """
+        with self._lock:
+            matches = set()
+            for area_id in self._grid.get(_cell(latitude, longitude), ()):
+                area = self._areas[area_id]
+                distance = haversine_km(
+                    latitude,
+                    longitude,
+                    area["center_latitude"],
+                    area["center_longitude"],
+                )
+                if distance <= area["radius_km"]:
+                    matches.add(area_id)
+            return self._group_active(matches)
+
+    def partners_matching(self, term: str) -> Set[str]:
+        """
+        Partner IDs with an active area whose city, region or country equals term.
+        """
+        key = normalize(term)
+        if key is None:
+            return set()
+        with self._lock:
+            area_ids = (
+                self._by_city.get(key, set())
+                | self._by_region.get(key, set())
+                | self._by_country.get(key, set())
+            )
+            return {
+                self._areas[area_id]["partner_id"]
+                for area_id in area_ids
+                if self._areas[area_id]["active"]
+            }
+
+    def __len__(self) -> int:
+        return len(self._areas)
+
+    def areas_for_partner(self, partner_id: str) -> List[dict]:
+        with self._lock:
+            return [
+                self._areas[area_id]
+                for area_id in sorted(self._by_partner.get(partner_id, ()))
+            ]
+
+    def _group_active(self, area_ids) -> Dict[str, List[dict]]:
+        grouped: Dict[str, List[dict]] = defaultdict(list)
+        for area_id in sorted(area_ids):
+            area = self._areas[area_id]
+            if area["active"]:
+                grouped[area["partner_id"]].append(area)
+        return dict(grouped)
+
+
+service_area_index = ServiceAreaIndex()
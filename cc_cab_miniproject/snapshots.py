@@ -0,0 +1,316 @@
+"""
+Online snapshots of the SQLite database, restore, and seeding a fresh
+container from the newest snapshot.
+
+A snapshot is taken while the API serves traffic, with SQLite's backup API
+(the default) or VACUUM INTO, into SNAPSHOT_DIR/data-<UTC time>.db. The
+backup API copies SNAPSHOT_PAGES_PER_STEP pages per step, each step in its
+own short read transaction, pausing SNAPSHOT_STEP_PAUSE seconds in between.
+In WAL mode writers never wait for readers, but a long read transaction
+keeps checkpoints from recycling the WAL, which then grows for as long as
+the copy runs; steps bound that. A write between two steps restarts the
+copy, so after MAX_BACKUP_RESTARTS restarts the rest is copied in one step.
+VACUUM INTO always copies in one read transaction, but writes a compacted
+file; as after any VACUUM, the FTS tables are rebuilt in the copy.
+
+Every snapshot is written under a temporary name, checked with PRAGMA
+quick_check and then renamed, so a half-written or corrupt file is never
+picked as the newest. The SNAPSHOT_KEEP newest are kept.
+
+Restore copies a snapshot next to the database in RESTORE_CHUNK_BYTES
+chunks with copy_file_range, so the data stays in the kernel (btrfs and XFS
+share the blocks instead of copying them; other filesystems fall back to
+read/write), checks the copy and renames it over data.db. Only restore with
+the API stopped: running workers keep the old file open.
+
+    python snapshots.py snapshot --method vacuum
+    python snapshots.py list
+    python snapshots.py restore            # the newest snapshot
+    python snapshots.py seed --fallback seed/data.db
+
+`seed` is for container start: it restores the newest snapshot only when
+data.db does not exist yet, so a restarted container keeps its own data.
+Only the standard library is imported, so it adds almost nothing to startup.
+"""
+
+import argparse
+import errno
+import glob
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "5"))
+SNAPSHOT_PAGES_PER_STEP = int(os.getenv("SNAPSHOT_PAGES_PER_STEP", "1024"))
+SNAPSHOT_STEP_PAUSE = float(os.getenv("SNAPSHOT_STEP_PAUSE", "0.005"))
+RESTORE_CHUNK_BYTES = int(os.getenv("RESTORE_CHUNK_BYTES", str(8 * 1024 * 1024)))
+
+MAX_BACKUP_RESTARTS = 3
+SNAPSHOT_METHODS = ("backup", "vacuum")
+SNAPSHOT_PATTERN = "data-*.db"
+
+# Kept in step with migrations.FTS_TABLES, without importing SQLAlchemy
+FTS_TABLES = ("partners_fts", "vehicles_fts")
+
+# copy_file_range errors meaning "not between these files"
+_NO_KERNEL_COPY = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP}
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class _Restarted(Exception):
+    pass
+
+
+def sqlite_path(url: str) -> str:
+    """
+    The file of a sqlite:/// DATABASE_URL.
+    """
+    if not url.startswith("sqlite:///"):
+        raise SnapshotError(
+            f"Snapshots need a SQLite database, not {url.split(':')[0]}"
+        )
+    return url[len("sqlite:///") :].split("?", 1)[0]
+
+
+def list_snapshots(directory: str = SNAPSHOT_DIR) -> List[str]:
+    """
+    Snapshot files, oldest first (the names sort by time).
+    """
+    return sorted(glob.glob(os.path.join(directory, SNAPSHOT_PATTERN)))
+
+
+def latest_snapshot(directory: str = SNAPSHOT_DIR) -> Optional[str]:
+    snapshots = list_snapshots(directory)
+    return snapshots[-1] if snapshots else None
+
+
+def _backup(source, path: str, pages: int, pause: float) -> int:
+    """
+    Copies source into path in steps; returns how often writes restarted it.
+    """
+    restarts = 0
+    while restarts <= MAX_BACKUP_RESTARTS:
+        last_remaining = []
+
+        def progress(status, remaining, total):
+            # Another connection wrote: the copy started over
+            if last_remaining and remaining >= last_remaining[0]:
+                raise _Restarted
+            last_remaining[:] = [remaining]
+            if remaining and pause:
+                time.sleep(pause)
+
+        target = sqlite3.connect(path)
+        try:
+            source.backup(target, pages=pages, progress=progress)
+            return restarts
+        except _Restarted:
+            restarts += 1
+        finally:
+            target.close()
+    # Too busy to finish in steps: copy the rest within one read transaction
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+    return restarts
+
+
+def _check(path: str, rebuild_fts: bool = False):
+    """
+    Makes path a self-contained rollback-journal file and verifies it.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        if rebuild_fts:
+            for table in FTS_TABLES:
+                exists = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = ?", (table,)
+                ).fetchone()
+                if exists:
+                    conn.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+            conn.commit()
+        # A snapshot is one file; WAL would leave -wal/-shm files beside it
+        conn.execute("PRAGMA journal_mode=DELETE")
+        result = conn.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        conn.close()
+    if result != "ok":
+        raise SnapshotError(f"{path} failed quick_check: {result}")
+
+
+def _fsync_directory(directory: str):
+    fd = os.open(directory or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def create_snapshot(
+    db_path: str,
+    directory: str = SNAPSHOT_DIR,
+    method: str = "backup",
+    pages: int = SNAPSHOT_PAGES_PER_STEP,
+    pause: float = SNAPSHOT_STEP_PAUSE,
+    keep: int = SNAPSHOT_KEEP,
+) -> dict:
+    """
+    Snapshots the live database at db_path into directory.
+    """
+    if method not in SNAPSHOT_METHODS:
+        raise SnapshotError(f"Unknown snapshot method {method!r}")
+    started = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    name = datetime.now(timezone.utc).strftime("data-%Y%m%dT%H%M%S%fZ.db")
+    path = os.path.join(directory, name)
+    partial = path + ".partial"
+
+    source = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    restarts = 0
+    try:
+        if method == "vacuum":
+            source.execute("VACUUM INTO ?", (partial,))
+        else:
+            restarts = _backup(source, partial, pages, pause)
+        _check(partial, rebuild_fts=method == "vacuum")
+    except BaseException:
+        if os.path.exists(partial):
+            os.unlink(partial)
+        raise
+    finally:
+        source.close()
+    with open(partial, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(partial, path)
+    _fsync_directory(directory)
+
+    for old in list_snapshots(directory)[:-keep] if keep > 0 else []:
+        os.unlink(old)
+    return {
+        "path": path,
+        "method": method,
+        "sizeBytes": os.path.getsize(path),
+        "restarts": restarts,
+        "durationMs": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def copy_file(source: str, target: str, chunk_size: int = RESTORE_CHUNK_BYTES) -> int:
+    """
+    Copies source to target chunk_size bytes at a time without passing the
+    data through Python where the kernel can; returns the bytes copied.
+    """
+    kernel_copy = getattr(os, "copy_file_range", None)
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        in_fd, out_fd = src.fileno(), dst.fileno()
+        size = os.fstat(in_fd).st_size
+        copied = 0
+        while copied < size:
+            count = min(chunk_size, size - copied)
+            written = 0
+            if kernel_copy is not None:
+                try:
+                    written = kernel_copy(in_fd, out_fd, count)
+                except OSError as e:
+                    if e.errno not in _NO_KERNEL_COPY:
+                        raise
+                    kernel_copy = None
+            if not written:
+                # Both calls use and advance the file positions, so this
+                # carries on where the kernel copy stopped
+                written = os.write(out_fd, os.read(in_fd, count))
+            if not written:
+                break
+            copied += written
+        os.fsync(out_fd)
+    return copied
+
+
+def restore_snapshot(
+    snapshot_path: str, db_path: str, chunk_size: int = RESTORE_CHUNK_BYTES
+) -> dict:
+    """
+    Replaces the database at db_path with a copy of snapshot_path.
+    """
+    started = time.perf_counter()
+    partial = db_path + ".restore"
+    try:
+        copied = copy_file(snapshot_path, partial, chunk_size)
+        _check(partial)
+    except BaseException:
+        if os.path.exists(partial):
+            os.unlink(partial)
+        raise
+    # The old file's WAL would be replayed into the new one
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.unlink(db_path + suffix)
+    os.replace(partial, db_path)
+    _fsync_directory(os.path.dirname(db_path))
+    return {
+        "snapshot": snapshot_path,
+        "path": db_path,
+        "sizeBytes": copied,
+        "durationMs": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def seed(
+    db_path: str, directory: str = SNAPSHOT_DIR, fallback: Optional[str] = None
+) -> Optional[dict]:
+    """
+    Restores the newest snapshot (else fallback) when db_path is missing.
+    """
+    if os.path.exists(db_path):
+        return None
+    source = latest_snapshot(directory) or fallback
+    if source is None or not os.path.exists(source):
+        return None
+    return restore_snapshot(source, db_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Snapshot, restore or seed the SQLite database"
+    )
+    parser.add_argument(
+        "--db",
+        default=None,
+        help="Database file (default: from $DATABASE_URL, else data.db)",
+    )
+    parser.add_argument("--dir", default=SNAPSHOT_DIR, help="Snapshot directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    snapshot_parser = commands.add_parser("snapshot", help="Snapshot the live database")
+    snapshot_parser.add_argument("--method", choices=SNAPSHOT_METHODS, default="backup")
+    commands.add_parser("list", help="List snapshots, oldest first")
+    restore_parser = commands.add_parser(
+        "restore", help="Replace the database (stop the API first)"
+    )
+    restore_parser.add_argument("snapshot", nargs="?", help="Default: the newest")
+    seed_parser = commands.add_parser(
+        "seed", help="Restore the newest snapshot if the database does not exist"
+    )
+    seed_parser.add_argument("--fallback", help="Used when there is no snapshot")
+    args = parser.parse_args()
+
+    db_path = args.db or sqlite_path(os.getenv("DATABASE_URL", "sqlite:///./data.db"))
+    if args.command == "snapshot":
+        print(create_snapshot(db_path, args.dir, method=args.method))
+    elif args.command == "list":
+        for path in list_snapshots(args.dir):
+            print(f"{path}\t{os.path.getsize(path)}")
+    elif args.command == "restore":
+        snapshot = args.snapshot or latest_snapshot(args.dir)
+        if snapshot is None:
+            parser.exit(1, f"No snapshots in {args.dir}\n")
+        print(restore_snapshot(snapshot, db_path))
+    else:
+        print(seed(db_path, args.dir, args.fallback) or f"{db_path}: left as is")
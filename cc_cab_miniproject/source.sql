@@ -130,6 +130,9 @@ CREATE TABLE partner_service_areas (
     region TEXT,
     country TEXT NOT NULL,
     active INTEGER NOT NULL DEFAULT 1 CHECK (active IN (0, 1)),
+    center_latitude REAL,
+    center_longitude REAL,
+    radius_km REAL,
 
     CONSTRAINT fk_service_areas_partner_id FOREIGN KEY (partner_id)
         REFERENCES partners(partner_id) ON DELETE CASCADE ON UPDATE CASCADE,
@@ -143,7 +146,7 @@ CREATE TABLE partner_documents (
     document_type TEXT NOT NULL CHECK (document_type IN ('business_license', 'insurance', 'tax_certificate', 'other')),
     document_number TEXT,
     document_url TEXT,
-    expiry_date TEXT,
+    expiry_date TEXT, -- ISO 'YYYY-MM-DD', valid through that day
     verification_status TEXT NOT NULL DEFAULT 'pending' CHECK (verification_status IN ('pending', 'verified', 'rejected')),
     created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
@@ -167,7 +170,7 @@ CREATE TABLE vehicle_documents (
     document_type TEXT NOT NULL CHECK (document_type IN ('registration', 'insurance', 'fitness_certificate', 'permit', 'other')),
     document_number TEXT,
     document_url TEXT,
-    expiry_date TEXT,
+    expiry_date TEXT, -- ISO 'YYYY-MM-DD', valid through that day
     verification_status TEXT NOT NULL DEFAULT 'pending' CHECK (verification_status IN ('pending', 'verified', 'rejected')),
     created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
@@ -191,7 +194,7 @@ CREATE TABLE driver_documents (
     document_type TEXT NOT NULL CHECK (document_type IN ('driving_license', 'identity', 'background_check', 'other')),
     document_number TEXT,
     document_url TEXT,
-    expiry_date TEXT,
+    expiry_date TEXT, -- ISO 'YYYY-MM-DD', valid through that day
     verification_status TEXT NOT NULL DEFAULT 'pending' CHECK (verification_status IN ('pending', 'verified', 'rejected')),
     created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
@@ -332,12 +335,270 @@ CREATE INDEX idx_vehicles_status ON vehicles(status);
 CREATE INDEX idx_drivers_status ON drivers(status);
 CREATE INDEX idx_partners_name ON partners(name);
 CREATE INDEX idx_vehicles_type ON vehicles(type);
-CREATE INDEX idx_bookings_user_id ON bookings(user_id);
+-- Covering index for a user's ride history (also serves user_id lookups)
+CREATE INDEX idx_bookings_user_history ON bookings(user_id, created_at DESC, status, booking_id);
 CREATE INDEX idx_bookings_driver_id ON bookings(driver_id);
 CREATE INDEX idx_bookings_status ON bookings(status);
+CREATE INDEX idx_booking_status_history_booking_id ON booking_status_history(booking_id, created_at);
+CREATE INDEX idx_fare_calculations_booking_id ON fare_calculations(booking_id);
 CREATE INDEX idx_reviews_driver_id ON reviews(driver_id);
 CREATE INDEX idx_driver_locations_driver_id ON driver_locations(driver_id);
 CREATE INDEX idx_vehicles_partner_id ON vehicles(partner_id);
+-- Covering index for booking validation (payment method belongs to user)
+CREATE INDEX idx_payment_methods_id_user ON payment_methods(payment_method_id, user_id);
+CREATE INDEX idx_service_areas_city ON partner_service_areas(city COLLATE NOCASE, active);
+CREATE INDEX idx_service_areas_partner_id ON partner_service_areas(partner_id);
+CREATE INDEX idx_partner_documents_expiry ON partner_documents(verification_status, expiry_date);
+CREATE INDEX idx_vehicle_documents_expiry ON vehicle_documents(verification_status, expiry_date);
+CREATE INDEX idx_driver_documents_expiry ON driver_documents(verification_status, expiry_date);
+
+-- Full-text search (external-content FTS5 tables kept in sync by triggers)
+CREATE VIRTUAL TABLE partners_fts USING fts5(
+    name, address,
+    content='partners', content_rowid='rowid', prefix='2 3'
+);
+
+CREATE VIRTUAL TABLE vehicles_fts USING fts5(
+    registration, make, model, type,
+    content='vehicles', content_rowid='rowid', prefix='2 3'
+);
+
+CREATE TRIGGER trigger_partners_fts_insert AFTER INSERT ON partners
+BEGIN
+    INSERT INTO partners_fts(rowid, name, address)
+    VALUES (NEW.rowid, NEW.name, NEW.address);
+END;
+
+CREATE TRIGGER trigger_partners_fts_delete AFTER DELETE ON partners
+BEGIN
+    INSERT INTO partners_fts(partners_fts, rowid, name, address)
+    VALUES ('delete', OLD.rowid, OLD.name, OLD.address);
+END;
+
+CREATE TRIGGER trigger_partners_fts_update AFTER UPDATE OF name, address ON partners
+BEGIN
+    INSERT INTO partners_fts(partners_fts, rowid, name, address)
+    VALUES ('delete', OLD.rowid, OLD.name, OLD.address);
+    INSERT INTO partners_fts(rowid, name, address)
+    VALUES (NEW.rowid, NEW.name, NEW.address);
+END;
+
+CREATE TRIGGER trigger_vehicles_fts_insert AFTER INSERT ON vehicles
+BEGIN
+    INSERT INTO vehicles_fts(rowid, registration, make, model, type)
+    VALUES (NEW.rowid, NEW.registration, NEW.make, NEW.model, NEW.type);
+END;
+
+CREATE TRIGGER trigger_vehicles_fts_delete AFTER DELETE ON vehicles
+BEGIN
+    INSERT INTO vehicles_fts(vehicles_fts, rowid, registration, make, model, type)
+    VALUES ('delete', OLD.rowid, OLD.registration, OLD.make, OLD.model, OLD.type);
+END;
+
+CREATE TRIGGER trigger_vehicles_fts_update
+AFTER UPDATE OF registration, make, model, type ON vehicles
+BEGIN
+    INSERT INTO vehicles_fts(vehicles_fts, rowid, registration, make, model, type)
+    VALUES ('delete', OLD.rowid, OLD.registration, OLD.make, OLD.model, OLD.type);
+    INSERT INTO vehicles_fts(rowid, registration, make, model, type)
+    VALUES (NEW.rowid, NEW.registration, NEW.make, NEW.model, NEW.type);
+END;
+
+-- Where archive.py moved each finished booking (archive/bookings_YYYY_MM.db)
+CREATE TABLE booking_archive_index (
+    booking_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TIMESTAMP,
+    archive_name TEXT NOT NULL
+);
+CREATE INDEX idx_booking_archive_index_user_history ON booking_archive_index(user_id, created_at DESC, status, booking_id);
+
+-- Change feed that keeps in-process state coherent across API workers
+CREATE TABLE state_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic TEXT NOT NULL,
+    key TEXT NOT NULL,
+    origin TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX idx_state_events_created_at ON state_events(created_at);
+
+-- Partner dashboard rollups per partner and hour/day of booking creation
+-- (maintained by the trigger below; see partner_stats.py)
+CREATE TABLE partner_stats_hourly (
+    partner_id TEXT NOT NULL,
+    hour TIMESTAMP NOT NULL,
+    trips_completed INTEGER NOT NULL DEFAULT 0,
+    trips_cancelled INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    cancellation_fees REAL NOT NULL DEFAULT 0,
+    ride_minutes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (partner_id, hour)
+);
+CREATE TABLE partner_stats_daily (
+    partner_id TEXT NOT NULL,
+    day DATE NOT NULL,
+    trips_completed INTEGER NOT NULL DEFAULT 0,
+    trips_cancelled INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    cancellation_fees REAL NOT NULL DEFAULT 0,
+    ride_minutes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (partner_id, day)
+);
+
+CREATE TRIGGER trigger_bookings_partner_stats
+AFTER UPDATE OF status ON bookings
+WHEN NEW.status IN ('completed', 'cancelled')
+     AND OLD.status NOT IN ('completed', 'cancelled')
+     AND NEW.driver_id IS NOT NULL AND NEW.created_at IS NOT NULL
+BEGIN
+    INSERT INTO partner_stats_hourly (partner_id, hour, trips_completed, trips_cancelled, revenue, cancellation_fees, ride_minutes)
+    SELECT d.partner_id, strftime('%Y-%m-%d %H:00:00', NEW.created_at),
+           NEW.status = 'completed',
+           NEW.status = 'cancelled',
+           CASE WHEN NEW.status = 'completed' THEN (
+               SELECT COALESCE(SUM(total_amount), 0) FROM fare_calculations
+               WHERE booking_id = NEW.booking_id
+           ) ELSE 0 END,
+           CASE WHEN NEW.status = 'cancelled'
+                THEN COALESCE(NEW.cancellation_fee_amount, 0) ELSE 0 END,
+           CASE WHEN NEW.status = 'completed'
+                THEN COALESCE(NEW.actual_duration, NEW.estimated_duration, 0)
+                ELSE 0 END
+    FROM drivers d
+    WHERE d.driver_id = NEW.driver_id
+    ON CONFLICT (partner_id, hour) DO UPDATE SET
+        trips_completed = trips_completed + excluded.trips_completed,
+        trips_cancelled = trips_cancelled + excluded.trips_cancelled,
+        revenue = revenue + excluded.revenue,
+        cancellation_fees = cancellation_fees + excluded.cancellation_fees,
+        ride_minutes = ride_minutes + excluded.ride_minutes;
+    INSERT INTO partner_stats_daily (partner_id, day, trips_completed, trips_cancelled, revenue, cancellation_fees, ride_minutes)
+    SELECT d.partner_id, date(NEW.created_at),
+           NEW.status = 'completed',
+           NEW.status = 'cancelled',
+           CASE WHEN NEW.status = 'completed' THEN (
+               SELECT COALESCE(SUM(total_amount), 0) FROM fare_calculations
+               WHERE booking_id = NEW.booking_id
+           ) ELSE 0 END,
+           CASE WHEN NEW.status = 'cancelled'
+                THEN COALESCE(NEW.cancellation_fee_amount, 0) ELSE 0 END,
+           CASE WHEN NEW.status = 'completed'
+                THEN COALESCE(NEW.actual_duration, NEW.estimated_duration, 0)
+                ELSE 0 END
+    FROM drivers d
+    WHERE d.driver_id = NEW.driver_id
+    ON CONFLICT (partner_id, day) DO UPDATE SET
+        trips_completed = trips_completed + excluded.trips_completed,
+        trips_cancelled = trips_cancelled + excluded.trips_cancelled,
+        revenue = revenue + excluded.revenue,
+        cancellation_fees = cancellation_fees + excluded.cancellation_fees,
+        ride_minutes = ride_minutes + excluded.ride_minutes;
+END;
+
+-- Per-partner fleet version for partner ETags (see etags.py)
+CREATE TABLE partner_fleet_versions (
+    partner_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER trigger_vehicles_fleet_version_insert
+AFTER INSERT ON vehicles
+BEGIN
+    INSERT INTO partner_fleet_versions (partner_id, version)
+    VALUES (NEW.partner_id, 1)
+    ON CONFLICT (partner_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER trigger_vehicles_fleet_version_update
+AFTER UPDATE ON vehicles
+BEGIN
+    INSERT INTO partner_fleet_versions (partner_id, version)
+    VALUES (OLD.partner_id, 1)
+    ON CONFLICT (partner_id) DO UPDATE SET version = version + 1;
+    INSERT INTO partner_fleet_versions (partner_id, version)
+    SELECT NEW.partner_id, 1 WHERE NEW.partner_id <> OLD.partner_id
+    ON CONFLICT (partner_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER trigger_vehicles_fleet_version_delete
+AFTER DELETE ON vehicles
+BEGIN
+    INSERT INTO partner_fleet_versions (partner_id, version)
+    VALUES (OLD.partner_id, 1)
+    ON CONFLICT (partner_id) DO UPDATE SET version = version + 1;
+END;
+
+-- Users whose booking validations changed, for payment_validation.py
+CREATE TABLE payment_validation_changes (
+    user_id TEXT PRIMARY KEY,
+    change_seq INTEGER NOT NULL
+);
+
+CREATE INDEX idx_payment_validation_changes_seq ON payment_validation_changes(change_seq);
+
+CREATE TRIGGER trigger_users_validation_insert
+AFTER INSERT ON users
+BEGIN
+    INSERT INTO payment_validation_changes (user_id, change_seq)
+    SELECT NEW.user_id, COALESCE(MAX(change_seq), 0) + 1
+    FROM payment_validation_changes WHERE true
+    ON CONFLICT (user_id) DO UPDATE SET change_seq = excluded.change_seq;
+END;
+
+CREATE TRIGGER trigger_users_validation_update
+AFTER UPDATE OF user_id ON users
+BEGIN
+    INSERT INTO payment_validation_changes (user_id, change_seq)
+    SELECT OLD.user_id, COALESCE(MAX(change_seq), 0) + 1
+    FROM payment_validation_changes WHERE true
+    ON CONFLICT (user_id) DO UPDATE SET change_seq = excluded.change_seq;
+    INSERT INTO payment_validation_changes (user_id, change_seq)
+    SELECT NEW.user_id, COALESCE(MAX(change_seq), 0) + 1
+    FROM payment_validation_changes WHERE true
+    ON CONFLICT (user_id) DO UPDATE SET change_seq = excluded.change_seq;
+END;
+
+CREATE TRIGGER trigger_users_validation_delete
+AFTER DELETE ON users
+BEGIN
+    INSERT INTO payment_validation_changes (user_id, change_seq)
+    SELECT OLD.user_id, COALESCE(MAX(change_seq), 0) + 1
+    FROM payment_validation_changes WHERE true
+    ON CONFLICT (user_id) DO UPDATE SET change_seq = excluded.change_seq;
+END;
+
+CREATE TRIGGER trigger_payment_methods_validation_insert
+AFTER INSERT ON payment_methods
+BEGIN
+    INSERT INTO payment_validation_changes (user_id, change_seq)
+    SELECT NEW.user_id, COALESCE(MAX(change_seq), 0) + 1
+    FROM payment_validation_changes WHERE true
+    ON CONFLICT (user_id) DO UPDATE SET change_seq = excluded.change_seq;
+END;
+
+CREATE TRIGGER trigger_payment_methods_validation_update
+AFTER UPDATE OF payment_method_id, user_id ON payment_methods
+BEGIN
+    INSERT INTO payment_validation_changes (user_id, change_seq)
+    SELECT OLD.user_id, COALESCE(MAX(change_seq), 0) + 1
+    FROM payment_validation_changes WHERE true
+    ON CONFLICT (user_id) DO UPDATE SET change_seq = excluded.change_seq;
+    INSERT INTO payment_validation_changes (user_id, change_seq)
+    SELECT NEW.user_id, COALESCE(MAX(change_seq), 0) + 1
+    FROM payment_validation_changes WHERE true
+    ON CONFLICT (user_id) DO UPDATE SET change_seq = excluded.change_seq;
+END;
+
+CREATE TRIGGER trigger_payment_methods_validation_delete
+AFTER DELETE ON payment_methods
+BEGIN
+    INSERT INTO payment_validation_changes (user_id, change_seq)
+    SELECT OLD.user_id, COALESCE(MAX(change_seq), 0) + 1
+    FROM payment_validation_changes WHERE true
+    ON CONFLICT (user_id) DO UPDATE SET change_seq = excluded.change_seq;
+END;
 
 -- Create view for active partners with vehicle counts
 CREATE VIEW view_active_partners_summary AS
@@ -489,3 +750,29 @@ INSERT INTO reviews (review_id, booking_id, user_id, driver_id, rating, comment)
 -- Sample data insertion - Fare Calculations
 INSERT INTO fare_calculations (booking_id, base_fare, distance_charge, time_charge, surge_multiplier, tax_amount, total_amount) VALUES
 ('booking456', 50.00, 90.75, 28.00, 1.0, 12.00, 180.75);
+
+-- Sample data insertion - Partner stats rollups (sample rows bypass the trigger)
+INSERT INTO partner_stats_hourly (partner_id, hour, trips_completed, trips_cancelled, revenue, cancellation_fees, ride_minutes)
+SELECT d.partner_id, strftime('%Y-%m-%d %H:00:00', b.created_at),
+       SUM(b.status = 'completed'), SUM(b.status = 'cancelled'),
+       SUM(CASE WHEN b.status = 'completed' THEN COALESCE(fc.total_amount, 0) ELSE 0 END),
+       SUM(CASE WHEN b.status = 'cancelled' THEN COALESCE(b.cancellation_fee_amount, 0) ELSE 0 END),
+       SUM(CASE WHEN b.status = 'completed' THEN COALESCE(b.actual_duration, b.estimated_duration, 0) ELSE 0 END)
+FROM bookings b
+JOIN drivers d ON d.driver_id = b.driver_id
+LEFT JOIN (SELECT booking_id, SUM(total_amount) AS total_amount FROM fare_calculations GROUP BY booking_id) fc
+    ON fc.booking_id = b.booking_id
+WHERE b.status IN ('completed', 'cancelled') AND b.created_at IS NOT NULL
+GROUP BY 1, 2;
+INSERT INTO partner_stats_daily (partner_id, day, trips_completed, trips_cancelled, revenue, cancellation_fees, ride_minutes)
+SELECT d.partner_id, date(b.created_at),
+       SUM(b.status = 'completed'), SUM(b.status = 'cancelled'),
+       SUM(CASE WHEN b.status = 'completed' THEN COALESCE(fc.total_amount, 0) ELSE 0 END),
+       SUM(CASE WHEN b.status = 'cancelled' THEN COALESCE(b.cancellation_fee_amount, 0) ELSE 0 END),
+       SUM(CASE WHEN b.status = 'completed' THEN COALESCE(b.actual_duration, b.estimated_duration, 0) ELSE 0 END)
+FROM bookings b
+JOIN drivers d ON d.driver_id = b.driver_id
+LEFT JOIN (SELECT booking_id, SUM(total_amount) AS total_amount FROM fare_calculations GROUP BY booking_id) fc
+    ON fc.booking_id = b.booking_id
+WHERE b.status IN ('completed', 'cancelled') AND b.created_at IS NOT NULL
+GROUP BY 1, 2;
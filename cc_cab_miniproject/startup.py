@@ -0,0 +1,223 @@
+"""
+Startup timing and warm-up, for fast cold starts.
+
+Every startup logs one "Startup finished" line (logger "cab.startup") with
+the time of each phase: importing the app, migrating the schema, loading
+the in-memory indexes, warming up. With STARTUP_PROFILE=1 it also lists the
+STARTUP_PROFILE_TOP slowest imports, each with its cumulative time and the
+part not spent in other timed imports. The same measurements, from the
+shell:
+
+    PYTHONPROFILEIMPORTTIME=1 python -c "import main" 2> imports.txt
+
+Warm-up moves to startup what a fresh process would otherwise do on its
+first requests: importing anyio's event loop backend (done on first use)
+and, on SQLite, reading the pages of the hot tables' indexes, which a new
+container finds on a cold disk cache. Each index is read once with
+COUNT(*) ... INDEXED BY, hottest tables first, until
+STARTUP_WARMUP_SECONDS have passed (checked between indexes). PostgreSQL
+keeps its buffer cache across app restarts, so it gets no index warm-up.
+
+STARTUP_WARMUP=blocking (the default) finishes the warm-up before the
+worker accepts requests, =background runs it alongside the first requests
+(sooner to serve on a large database, but they compete with it for the
+CPU), =off skips it. benchmarks/bench_startup.py reports the time to the
+first successful request for each.
+"""
+
+import builtins
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Imported first by main.py, so only the standard library at module level:
+# anything else would be imported before the import timer starts
+
+logger = logging.getLogger("cab.startup")
+
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE") == "1"
+STARTUP_PROFILE_TOP = int(os.getenv("STARTUP_PROFILE_TOP", "15"))
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "blocking")
+STARTUP_WARMUP_SECONDS = float(os.getenv("STARTUP_WARMUP_SECONDS", "5"))
+
+# Tables whose indexes the request paths walk, hottest first
+HOT_TABLES = (
+    "bookings",
+    "booking_status_history",
+    "users",
+    "payment_methods",
+    "partners",
+    "vehicles",
+    "drivers",
+)
+
+INDEXES_QUERY = "SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'"
+
+_imported_at = time.perf_counter()
+
+
+def _process_age() -> Optional[float]:
+    """
+    Seconds since this process started (Linux), so the report includes the
+    interpreter's own startup; None elsewhere.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesised command name; starttime is 22nd
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ImportTimer:
+    """
+    Times first imports by wrapping builtins.__import__. Imports made with
+    importlib.import_module are counted in the import that made them.
+    """
+
+    def __init__(self):
+        self.times: Dict[str, Tuple[float, float]] = {}
+        self._original = None
+        # Time spent in the nested first imports of each import in progress
+        self._nested: List[List[float]] = []
+
+    def start(self):
+        if self._original is None:
+            self._original = builtins.__import__
+            builtins.__import__ = self._import
+
+    def stop(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._original(name, globals, locals, fromlist, level)
+        nested = [0.0]
+        self._nested.append(nested)
+        started = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._nested.pop()
+            if self._nested:
+                self._nested[-1][0] += elapsed
+            self.times[name] = (elapsed, elapsed - nested[0])
+
+    def slowest(self, count: int) -> List[dict]:
+        ranked = sorted(self.times.items(), key=lambda item: -item[1][0])
+        return [
+            {
+                "module": name,
+                "cumulativeMs": round(cumulative * 1000, 1),
+                "selfMs": round(own * 1000, 1),
+            }
+            for name, (cumulative, own) in ranked[:count]
+        ]
+
+
+class StartupTimer:
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.imports = ImportTimer()
+
+    def profile_imports(self):
+        """
+        Starts timing imports when STARTUP_PROFILE=1; call before importing.
+        """
+        if STARTUP_PROFILE:
+            self.imports.start()
+
+    def imported(self):
+        """
+        Marks the end of the app's imports.
+        """
+        self.phases.setdefault("import", time.perf_counter() - _imported_at)
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started
+
+    def report(self):
+        self.imports.stop()
+        age = _process_age()
+        extra = {
+            "phasesMs": {
+                name: round(seconds * 1000, 1) for name, seconds in self.phases.items()
+            },
+            "processAgeMs": round(age * 1000) if age is not None else None,
+        }
+        if self.imports.times:
+            extra["slowestImports"] = self.imports.slowest(STARTUP_PROFILE_TOP)
+        logger.info("Startup finished", extra=extra)
+
+
+startup_timer = StartupTimer()
+
+
+def hot_indexes(conn) -> List[Tuple[str, str]]:
+    """
+    (table, index) for every index of HOT_TABLES, hottest table first.
+    """
+    from sqlalchemy import text
+
+    rank = {table: position for position, table in enumerate(HOT_TABLES)}
+    indexes = [
+        (table, name)
+        for name, table in conn.execute(text(INDEXES_QUERY)).all()
+        if table in rank
+    ]
+    return sorted(indexes, key=lambda entry: rank[entry[0]])
+
+
+def touch_hot_indexes(engine, budget: float = STARTUP_WARMUP_SECONDS) -> int:
+    """
+    Reads the hot indexes into the OS page cache; returns how many.
+    """
+    from sqlalchemy import text
+
+    deadline = time.monotonic() + budget
+    touched = 0
+    with engine.connect() as conn:
+        for table, index in hot_indexes(conn):
+            if time.monotonic() >= deadline:
+                break
+            conn.execute(
+                text(f'SELECT COUNT(*) FROM "{table}" INDEXED BY "{index}"')
+            ).scalar()
+            touched += 1
+    return touched
+
+
+async def warm_up(engine):
+    """
+    Runs the warm-up, then logs the startup report. A failed warm-up only
+    leaves the first requests slower, so it is logged, never raised.
+    """
+    import asyncio
+
+    import anyio
+
+    try:
+        with startup_timer.phase("warmup"):
+            # Also starts anyio's worker thread pool
+            await anyio.to_thread.run_sync(lambda: None)
+            if engine.dialect.name == "sqlite":
+                touched = await asyncio.to_thread(touch_hot_indexes, engine)
+                logger.debug("Warmed up %s indexes", touched)
+    except Exception:
+        logger.exception("Startup warm-up failed")
+    finally:
+        startup_timer.report()
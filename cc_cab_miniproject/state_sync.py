@@ -0,0 +1,126 @@
+"""
+Keeps in-process indexes and registries coherent across uvicorn workers.
+
+Each worker holds its own copy of the service-area index, driver registry
+and expiry heap. After a committed write, the handler calls
+StateSync.changed(topic, key): the change is applied locally right away and,
+in multi-worker mode, appended to the state_events table in the shared
+data.db. That table acts as a small local broker: every worker polls it by
+primary key and re-applies changes published by the others.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Callable, Dict
+
+from sqlalchemy import text
+
+logger = logging.getLogger("cab.state_sync")
+
+# Seconds between polls of state_events
+POLL_INTERVAL = float(os.getenv("STATE_SYNC_INTERVAL", "0.5"))
+# Events older than this are pruned; a worker lagging further does a full reload
+RETENTION_SECONDS = 600
+BATCH_SIZE = 500
+
+
+class StateSync:
+    def __init__(self):
+        self.enabled = False
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._handlers: Dict[str, Callable] = {}
+        self._reload: Callable = None
+        self._engine = None
+        self._last_id = 0
+        self._last_prune = 0.0
+
+    def configure(self, engine, enabled: bool, reload: Callable):
+        """
+        reload(conn) rebuilds every in-process structure from the database.
+        """
+        self._engine = engine
+        self.enabled = enabled
+        self._reload = reload
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    def subscribe(self, topic: str, handler: Callable):
+        """
+        handler(conn, key) re-reads whatever the key identifies.
+        """
+        self._handlers[topic] = handler
+
+    def changed(self, topic: str, key: str):
+        """
+        Applies a committed change locally and publishes it to other workers.
+        """
+        with self._engine.connect() as conn:
+            self._handlers[topic](conn, key)
+        if self.enabled:
+            with self._engine.begin() as conn:
+                conn.execute(
+                    text("""
+                        INSERT INTO state_events (topic, key, origin, created_at)
+                        VALUES (:topic, :key, :origin, :created_at)
+                    """),
+                    {
+                        "topic": topic,
+                        "key": key,
+                        "origin": self.origin,
+                        "created_at": time.time(),
+                    },
+                )
+
+    def prime(self, conn):
+        """
+        Starts consuming after the newest event (state was just loaded).
+        """
+        self._last_id = (
+            conn.execute(text("SELECT MAX(id) FROM state_events")).scalar() or 0
+        )
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            try:
+                await asyncio.to_thread(self.poll)
+            except Exception as e:
+                logger.warning("State sync poll failed: %s", e)
+
+    def poll(self):
+        with self._engine.connect() as conn:
+            oldest = conn.execute(text("SELECT MIN(id) FROM state_events")).scalar()
+            if oldest is not None and oldest > self._last_id + 1:
+                # Missed events were pruned; rebuild instead of replaying
+                self._reload(conn)
+                self.prime(conn)
+            while True:
+                rows = conn.execute(
+                    text("""
+                        SELECT id, topic, key, origin FROM state_events
+                        WHERE id > :last_id
+                        ORDER BY id
+                        LIMIT :batch_size
+                    """),
+                    {"last_id": self._last_id, "batch_size": BATCH_SIZE},
+                ).all()
+                for event_id, topic, key, origin in rows:
+                    if origin != self.origin and topic in self._handlers:
+                        self._handlers[topic](conn, key)
+                    self._last_id = event_id
+                if len(rows) < BATCH_SIZE:
+                    break
+            conn.commit()
+
+        if time.time() - self._last_prune > RETENTION_SECONDS / 10:
+            self._last_prune = time.time()
+            with self._engine.begin() as conn:
+                conn.execute(
+                    text("DELETE FROM state_events WHERE created_at < :cutoff"),
+                    {"cutoff": time.time() - RETENTION_SECONDS},
+                )
+
+
+state_sync = StateSync()
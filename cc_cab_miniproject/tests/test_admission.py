@@ -0,0 +1,49 @@
+import asyncio
+
+from admission import Rejected, WriteAdmission
+
+
+def _permits(admission: WriteAdmission) -> int:
+    return admission._semaphore._value
+
+
+def test_queue_timeout_rejects_without_leaking():
+    async def scenario():
+        admission = WriteAdmission(max_running=1, queue_timeout=0.05)
+        await admission.acquire()
+        try:
+            await admission.acquire()
+        except Rejected as rejected:
+            assert rejected.reason == "queue_timeout"
+        else:
+            raise AssertionError("second acquire was admitted")
+        assert admission.waiting == 0
+        admission.release(0.01)
+        await asyncio.sleep(0)
+        assert _permits(admission) == 1
+        await admission.acquire()
+        assert admission.running == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_returns_a_granted_permit():
+    async def scenario():
+        admission = WriteAdmission(max_running=1, queue_timeout=5)
+        await admission.acquire()
+        waiter = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0.01)
+        # The permit goes to the waiter, which is cancelled (the client went
+        # away) before it resumes
+        admission.release(0.01)
+        waiter.cancel()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            pass
+        for _ in range(3):
+            await asyncio.sleep(0)
+        assert admission.running == 0
+        assert _permits(admission) == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,63 @@
+from conftest import BOOKING
+
+
+def test_create_booking_quotes_fare(client, booking):
+    detail = client.get(f"/api/bookings/{booking}")
+    assert detail.status_code == 200
+    body = detail.json()
+    assert body["status"] == "searching"
+    assert body["estimatedFare"]["amount"] > 0
+
+
+def test_create_booking_validates_user_and_payment_method(client):
+    response = client.post("/api/bookings", json=dict(BOOKING, userId="nobody"))
+    assert response.status_code == 404
+    assert "User with ID nobody" in response.json()["detail"]
+
+    response = client.post("/api/bookings", json=dict(BOOKING, paymentMethodId="pay456"))
+    assert response.status_code == 404
+    assert "does not belong to user user123" in response.json()["detail"]
+
+
+def test_cancel_releases_driver(client, sql, booking, driver, vehicle):
+    sql(
+        "UPDATE bookings SET status = 'confirmed', driver_id = :driver_id, "
+        "vehicle_id = :vehicle_id WHERE booking_id = :booking_id",
+        driver_id=driver,
+        vehicle_id=vehicle,
+        booking_id=booking,
+    )
+    sql("UPDATE drivers SET status = 'on_ride' WHERE driver_id = :id", id=driver)
+
+    response = client.post(f"/api/bookings/{booking}/cancel", json={"reason": "test"})
+    assert response.status_code == 200, response.text
+    assert response.json()["status"] == "cancelled"
+    assert response.json()["cancellationFee"] is not None
+
+    rows = sql("SELECT status FROM drivers WHERE driver_id = :id", id=driver)
+    assert rows[0]["status"] == "available"
+    again = client.post(f"/api/bookings/{booking}/cancel")
+    assert again.status_code == 400
+
+
+def test_update_destination_requotes_fare(client, sql, booking):
+    sql("UPDATE bookings SET status = 'confirmed' WHERE booking_id = :id", id=booking)
+    before = client.get(f"/api/bookings/{booking}").json()["estimatedFare"]["amount"]
+
+    response = client.put(
+        f"/api/bookings/{booking}/destination",
+        json={"latitude": 18.70, "longitude": 74.10, "address": "Far away"},
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["dropoffLocation"]["address"] == "Far away"
+    assert body["estimatedFare"]["amount"] > before
+
+
+def test_update_destination_rejects_finished_booking(client, booking):
+    client.post(f"/api/bookings/{booking}/cancel")
+    response = client.put(
+        f"/api/bookings/{booking}/destination",
+        json={"latitude": 18.70, "longitude": 74.10, "address": "Far away"},
+    )
+    assert response.status_code == 400
@@ -0,0 +1,91 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+import documents
+from documents import ExpiryScheduler
+
+TODAY = date(2026, 6, 15)
+
+
+def test_pop_due_returns_expired_documents_only():
+    scheduler = ExpiryScheduler()
+    scheduler.set_expiry("driver", "d1", "identity", "2026-06-14")
+    scheduler.set_expiry("driver", "d2", "identity", "2026-06-15")
+
+    assert scheduler.pop_due(TODAY) == [("driver", "d1", "identity", "2026-06-14")]
+    assert scheduler.pop_due(TODAY) == []
+    # Valid through its expiry date
+    assert scheduler.next_expiry() == "2026-06-15"
+
+
+def test_renewal_supersedes_expiry():
+    scheduler = ExpiryScheduler()
+    scheduler.set_expiry("vehicle", "v1", "insurance", "2026-06-01")
+    scheduler.set_expiry("vehicle", "v1", "insurance", "2027-06-01")
+
+    assert scheduler.pop_due(TODAY) == []
+    assert len(scheduler) == 1
+
+
+def test_rejection_stops_tracking():
+    scheduler = ExpiryScheduler()
+    scheduler.set_expiry("partner", "p1", "insurance", "2026-06-01")
+    scheduler.set_expiry("partner", "p1", "insurance", None)
+
+    assert scheduler.pop_due(TODAY) == []
+    assert len(scheduler) == 0
+
+
+def test_owner_on_ride_is_retried_until_renewed():
+    scheduler = ExpiryScheduler()
+    scheduler.set_expiry("driver", "d1", "identity", "2026-06-01")
+    due = scheduler.pop_due(TODAY)
+
+    scheduler.retry_after_ride(due)
+    assert scheduler.pop_due(TODAY) == due
+
+    scheduler.retry_after_ride(due)
+    scheduler.set_expiry("driver", "d1", "identity", "2027-06-01")
+    assert scheduler.pop_due(TODAY) == []
+
+
+def test_renewal_while_expiring_is_not_retried():
+    scheduler = ExpiryScheduler()
+    scheduler.set_expiry("driver", "d1", "identity", "2026-06-01")
+    due = scheduler.pop_due(TODAY)
+    # Renewed while _expire ran in its thread
+    scheduler.set_expiry("driver", "d1", "identity", "2027-06-01")
+
+    scheduler.retry_after_ride(due)
+    assert scheduler.pop_due(TODAY) == []
+
+
+class _LockedEngine:
+    def __init__(self):
+        self.attempts = 0
+
+    def begin(self):
+        self.attempts += 1
+        raise RuntimeError("database is locked")
+
+
+def test_failed_expiry_is_retried(monkeypatch):
+    monkeypatch.setattr(documents, "RIDE_RETRY_SECONDS", 0.01)
+    monkeypatch.setattr(documents, "today_utc", lambda: TODAY)
+    scheduler = ExpiryScheduler()
+    scheduler.set_expiry("driver", "d1", "identity", "2026-06-01")
+    engine = _LockedEngine()
+
+    async def run_briefly():
+        task = asyncio.create_task(scheduler.run(engine, on_expired=lambda ids: None))
+        await asyncio.sleep(0.1)
+        assert not task.done()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run_briefly())
+    assert engine.attempts > 1
+    assert scheduler.pop_due(TODAY) == [("driver", "d1", "identity", "2026-06-01")]
@@ -0,0 +1,70 @@
+from conftest import new_id
+
+
+def test_driver_crud(client, partner, driver, vehicle):
+    url = f"/api/partners/{partner}/drivers/{driver}"
+    fetched = client.get(url)
+    assert fetched.status_code == 200
+    assert fetched.json()["vehicleId"] == vehicle
+    assert fetched.json()["status"] == "offline"
+
+    listed = client.get(f"/api/partners/{partner}/drivers")
+    assert [d["driverId"] for d in listed.json()] == [driver]
+
+    updated = client.put(url, json={"firstName": "Renamed"})
+    assert updated.status_code == 200, updated.text
+    assert updated.json()["firstName"] == "Renamed"
+    assert updated.json()["lastName"] == "Driver"
+
+    deleted = client.delete(url)
+    assert deleted.status_code == 200
+    assert client.get(url).status_code == 404
+
+
+def test_driver_conflicts(client, partner, driver):
+    phone = client.get(f"/api/partners/{partner}/drivers/{driver}").json()["phone"]
+    response = client.post(
+        f"/api/partners/{partner}/drivers",
+        json={
+            "firstName": "Other",
+            "lastName": "Driver",
+            "phone": phone,
+            "licenseNumber": new_id("LIC"),
+        },
+    )
+    assert response.status_code == 409
+
+    # A driver of another partner
+    response = client.get(f"/api/partners/partner123/drivers/{driver}")
+    assert response.status_code == 404
+
+
+def test_driver_online_offline(client, sql, partner, driver):
+    url = f"/api/partners/{partner}/drivers/{driver}"
+    online = client.post(f"{url}/online")
+    assert online.status_code == 200, online.text
+    assert online.json()["status"] == "online"
+
+    sql("UPDATE drivers SET status = 'on_ride' WHERE driver_id = :id", id=driver)
+    assert client.post(f"{url}/offline").status_code == 409
+
+    sql("UPDATE drivers SET status = 'online' WHERE driver_id = :id", id=driver)
+    offline = client.post(f"{url}/offline")
+    assert offline.status_code == 200
+    assert offline.json()["status"] == "offline"
+
+
+def test_driver_without_vehicle_cannot_go_online(client, partner):
+    created = client.post(
+        f"/api/partners/{partner}/drivers",
+        json={
+            "firstName": "No",
+            "lastName": "Vehicle",
+            "phone": new_id("phone"),
+            "licenseNumber": new_id("LIC"),
+        },
+    )
+    assert created.status_code == 201, created.text
+    driver = created.json()["driverId"]
+    response = client.post(f"/api/partners/{partner}/drivers/{driver}/online")
+    assert response.status_code == 400
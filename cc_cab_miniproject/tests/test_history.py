@@ -0,0 +1,112 @@
+import json
+import os
+import uuid
+
+from history import StatusHistoryWriter, history_entry, status_history
+
+
+def _history_rows(sql, booking):
+    return sql(
+        "SELECT status FROM booking_status_history WHERE booking_id = :id "
+        "ORDER BY created_at",
+        id=booking,
+    )
+
+
+def test_timeline_includes_queued_and_flushed_rows(client, sql, booking):
+    client.post(f"/api/bookings/{booking}/cancel")
+    timeline = client.get(f"/api/bookings/{booking}/history")
+    assert timeline.status_code == 200, timeline.text
+    statuses = [event["status"] for event in timeline.json()["events"]]
+    assert statuses == ["searching", "cancelled"]
+
+    status_history.flush()
+    rows = _history_rows(sql, booking)
+    assert [row["status"] for row in rows] == ["searching", "cancelled"]
+
+
+def test_orphaned_segments_are_replayed_once(engine, sql, booking, tmp_path):
+    status_history.flush()
+    flushed = sql(
+        "SELECT booking_id, status, created_at FROM booking_status_history "
+        "WHERE booking_id = :id",
+        id=booking,
+    )[0]
+    # The cancel committed, but its row was only journaled
+    lost = history_entry(booking, "cancelled")
+    sql("UPDATE bookings SET status = 'cancelled' WHERE booking_id = :id", id=booking)
+    # A dead worker's segment: one row its last flush committed, one it
+    # never flushed, and a line torn by the crash
+    _write_segment(tmp_path, [_journaled(flushed), lost], torn=True)
+
+    writer = StatusHistoryWriter()
+    assert writer.configure(engine, str(tmp_path)) == 2
+    writer.close()
+
+    assert [row["status"] for row in _history_rows(sql, booking)] == [
+        "searching",
+        "cancelled",
+    ]
+    assert os.listdir(tmp_path) == []
+
+
+def test_replay_skips_rows_that_never_committed(engine, sql, booking, tmp_path):
+    status_history.flush()
+    rolled_back = history_entry(booking, "cancelled")
+    # A crash between journal write and commit: the booking was not cancelled
+    in_doubt = history_entry(booking, "cancelled")
+    _write_segment(tmp_path, [rolled_back, dict(rolled_back, discarded=True)])
+    _write_segment(tmp_path, [in_doubt])
+
+    writer = StatusHistoryWriter()
+    writer.configure(engine, str(tmp_path))
+    writer.close()
+    assert [row["status"] for row in _history_rows(sql, booking)] == ["searching"]
+
+    # Once cancelled, only the row that was not discarded is replayed
+    sql("UPDATE bookings SET status = 'cancelled' WHERE booking_id = :id", id=booking)
+    _write_segment(tmp_path, [rolled_back, dict(rolled_back, discarded=True)])
+    _write_segment(tmp_path, [in_doubt])
+    writer = StatusHistoryWriter()
+    writer.configure(engine, str(tmp_path))
+    writer.close()
+    rows = sql(
+        "SELECT created_at FROM booking_status_history "
+        "WHERE booking_id = :id AND status = 'cancelled'",
+        id=booking,
+    )
+    assert [_journaled(dict(row, booking_id=booking, status="cancelled")) for row in rows] == [in_doubt]
+
+
+def test_failed_journal_write_fails_the_transition(client, sql, booking, monkeypatch):
+    def journal(entries):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(status_history, "journal", journal)
+    response = client.post(f"/api/bookings/{booking}/cancel")
+    assert response.status_code == 500
+    rows = sql("SELECT status FROM bookings WHERE booking_id = :id", id=booking)
+    assert rows[0]["status"] == "searching"
+
+    monkeypatch.undo()
+    assert client.post(f"/api/bookings/{booking}/cancel").status_code == 200
+    status_history.flush()
+    assert [row["status"] for row in _history_rows(sql, booking)] == [
+        "searching",
+        "cancelled",
+    ]
+
+
+def _write_segment(directory, entries, torn=False):
+    with open(directory / f"12345-{uuid.uuid4().hex[:12]}.jsonl", "w") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+        if torn:
+            f.write('{"booking_id": "')
+
+
+def _journaled(row) -> dict:
+    created_at = row["created_at"]
+    if not isinstance(created_at, str):
+        created_at = created_at.strftime("%Y-%m-%d %H:%M:%S.%f")
+    return {"booking_id": row["booking_id"], "status": row["status"], "created_at": created_at}
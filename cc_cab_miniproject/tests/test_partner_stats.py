@@ -0,0 +1,65 @@
+from conftest import BOOKING
+
+
+def _assign(sql, booking, driver, vehicle):
+    sql(
+        "UPDATE bookings SET status = 'confirmed', driver_id = :driver_id, "
+        "vehicle_id = :vehicle_id WHERE booking_id = :booking_id",
+        driver_id=driver,
+        vehicle_id=vehicle,
+        booking_id=booking,
+    )
+
+
+def _totals(client, partner):
+    response = client.get(f"/api/partners/{partner}/stats")
+    assert response.status_code == 200, response.text
+    return response.json()["totals"]
+
+
+def test_finished_bookings_are_rolled_up(client, sql, partner, driver, vehicle):
+    assert _totals(client, partner)["tripsCompleted"] == 0
+
+    completed = client.post("/api/bookings", json=BOOKING).json()["bookingId"]
+    _assign(sql, completed, driver, vehicle)
+    sql(
+        "UPDATE bookings SET status = 'completed', actual_duration = 25 "
+        "WHERE booking_id = :id",
+        id=completed,
+    )
+    fare = sql(
+        "SELECT SUM(total_amount) AS total FROM fare_calculations "
+        "WHERE booking_id = :id",
+        id=completed,
+    )[0]["total"]
+
+    cancelled = client.post("/api/bookings", json=BOOKING).json()["bookingId"]
+    _assign(sql, cancelled, driver, vehicle)
+    fee = client.post(f"/api/bookings/{cancelled}/cancel").json()["cancellationFee"]
+
+    totals = _totals(client, partner)
+    assert totals["tripsCompleted"] == 1
+    assert totals["tripsCancelled"] == 1
+    assert totals["rideMinutes"] == 25
+    assert totals["revenue"] == round(fare or 0, 2)
+    assert totals["cancellationFees"] == (fee["amount"] if fee else 0)
+
+    # A second update of a finished booking is not counted again
+    sql("UPDATE bookings SET status = 'completed' WHERE booking_id = :id", id=completed)
+    assert _totals(client, partner)["tripsCompleted"] == 1
+
+
+def test_rebuild_matches_trigger_totals(client, sql, partner, driver, vehicle):
+    booking = client.post("/api/bookings", json=BOOKING).json()["bookingId"]
+    _assign(sql, booking, driver, vehicle)
+    sql(
+        "UPDATE bookings SET status = 'completed', actual_duration = 12 "
+        "WHERE booking_id = :id",
+        id=booking,
+    )
+    live = _totals(client, partner)
+
+    response = client.post("/api/admin/partner-stats/rebuild")
+    assert response.status_code == 200, response.text
+    assert response.json()["bookingsScanned"] >= 1
+    assert _totals(client, partner) == live